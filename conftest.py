@@ -6,6 +6,7 @@ import httpretty
 import pytest
 
 import dnstwister
+import dnstwister.tools.fuzz_cache
 
 
 # Add dnstwister to import path
@@ -28,6 +29,13 @@ def webapp():
     return testapp
 
 
+@pytest.fixture(autouse=True)
+def clear_fuzz_cache():
+    """Tests swap out the fuzzer, so never share fuzz results between them.
+    """
+    dnstwister.tools.fuzz_cache.CACHE.clear()
+
+
 @pytest.yield_fixture
 def f_httpretty():
     """httpretty doesn't work with pytest fixtures in python 2..."""
@@ -1,4 +1,5 @@
 """The analysis API endpoint."""
+import itertools
 import json
 import urlparse
 
@@ -9,7 +10,11 @@ from flask import current_app
 
 from dnstwister.api.checks import parked
 from dnstwister.api.checks import safebrowsing
+from dnstwister import dnstwist
+from dnstwister import repository
 from dnstwister import tools
+from dnstwister.tools import resolution_cache
+from dnstwister.tools import resolver
 import dnstwister.auth as auth
 
 
@@ -18,6 +23,12 @@ app = flask.Blueprint('api', __name__)
 
 ENDPOINTS = ('parked_score', 'resolve_ip', 'fuzz')
 
+DEFAULT_FUZZ_PAGE_SIZE = 100
+MAX_FUZZ_PAGE_SIZE = 1000
+
+# The most domains that may be resolved in one batch request.
+MAX_IP_BATCH_SIZE = 200
+
 
 @app.route('/')
 @auth.login_required
@@ -126,7 +137,7 @@ def safebrowsing_check(hexdomain):
 @app.route('/ip/<hexdomain>')
 @auth.login_required
 def resolve_ip(hexdomain):
-    """Resolves Domains to IPs."""
+    """Resolves Domains to IPs, and their AAAA, MX and NS records."""
     domain = tools.parse_domain(hexdomain)
     if domain is None:
         flask.abort(
@@ -134,11 +145,100 @@ def resolve_ip(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
 
-    ip_addr, error = tools.resolve(domain)
+    _, result = next(tools.resolve_many([domain]))
 
     payload = standard_api_values(domain, skip='resolve_ip')
-    payload['ip'] = ip_addr
-    payload['error'] = error
+    payload.update(resolution_values(result))
+    return flask.jsonify(payload)
+
+
+@app.route('/ip/batch', methods=['POST'])
+@auth.login_required
+def resolve_ip_batch():
+    """Resolves a JSON list of up to MAX_IP_BATCH_SIZE hex-encoded domains,
+    streaming a line of JSON per domain as each resolution completes.
+    """
+    hexdomains = flask.request.get_json(silent=True)
+    if not isinstance(hexdomains, list):
+        flask.abort(400, 'Expected a JSON list of hex-encoded domains.')
+    if len(hexdomains) > MAX_IP_BATCH_SIZE:
+        flask.abort(
+            400,
+            'At most {} domains may be resolved at once.'.format(
+                MAX_IP_BATCH_SIZE
+            )
+        )
+
+    hexdomains_by_domain = {}
+    for hexdomain in hexdomains:
+        domain = None
+        if isinstance(hexdomain, basestring):
+            domain = tools.parse_domain(hexdomain)
+        if domain is None:
+            flask.abort(
+                400,
+                'Malformed domain or domain not represented in hexadecimal '
+                'format.'
+            )
+        hexdomains_by_domain.setdefault(domain, hexdomain)
+
+    def generate():
+        for (domain, result) in tools.resolve_many(hexdomains_by_domain,
+                                                   ordered=False):
+            payload = resolution_values(result)
+            payload['domain'] = domain.encode('idna')
+            payload['domain_as_hexadecimal'] = hexdomains_by_domain[domain]
+            yield json.dumps(payload) + '\n'
+
+    return flask.Response(generate(), mimetype='application/x-ndjson')
+
+
+def resolution_values(result):
+    """Return the IP, error and AAAA, MX and NS records of a resolution for
+    the IP endpoints.
+    """
+    resolution = resolver.Resolution.of(result)
+    values = {
+        'ip': resolution[0],
+        'error': resolution[1],
+    }
+    for rdtype in ('aaaa', 'mx', 'ns'):
+        values[rdtype] = resolution.records.get(rdtype, [])
+    return values
+
+
+@app.route('/stats/resolution')
+@auth.login_required
+def resolution_stats():
+    """Returns the resolution cache's counters, the health of the
+    upstream nameservers and the system resolver pool's queue.
+    """
+    return flask.jsonify({
+        'url': flask.request.base_url,
+        'cache': resolution_cache.CACHE.stats(),
+        'upstreams': tools.UPSTREAMS.stats(),
+        'system_resolver': tools.SYSTEM_RESOLVER.stats(),
+    })
+
+
+@app.route('/squats/<hexdomain>')
+@auth.login_required
+def squats(hexdomain):
+    """Returns the registered domains that a domain is a fuzzy domain of.
+    """
+    domain = tools.parse_domain(hexdomain)
+    if domain is None:
+        flask.abort(
+            400,
+            'Malformed domain or domain not represented in hexadecimal format.'
+        )
+
+    payload = standard_api_values(domain, skip='squats')
+    payload['registered_domains'] = [
+        registered.encode('idna')
+        for registered
+        in sorted(repository.squatted_domains(domain))
+    ]
     return flask.jsonify(payload)
 
 
@@ -166,22 +266,103 @@ def fuzz(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
 
-    fuzz_result = tools.fuzzy_domains(domain)
-    fuzz_payload = []
+    cursor = flask.request.args.get('cursor')
+    limit = flask.request.args.get('limit')
+    top_k = flask.request.args.get('top_k')
+
+    if top_k is not None:
+        if cursor is not None or limit is not None:
+            flask.abort(400, 'top_k cannot be combined with cursor or limit.')
+        return flask.jsonify(fuzz_payload(domain, fuzz_top_k(domain, top_k)))
+
+    # Fuzzes that are estimated to be too large to return in one go are
+    # downgraded to the first (largest) page.
+    if (cursor is None and limit is None and
+            not tools.within_fuzz_budget(domain)):
+        limit = MAX_FUZZ_PAGE_SIZE
+
+    if cursor is None and limit is None:
+        fuzz_result = tools.fuzzy_domains(domain)
+        next_cursor = None
+    else:
+        fuzz_result, next_cursor = fuzz_page(domain, cursor, limit)
+
+    payload = fuzz_payload(domain, fuzz_result)
+    if cursor is not None or limit is not None:
+        payload['next_cursor'] = next_cursor
+    return flask.jsonify(payload)
+
+
+def fuzz_payload(domain, fuzz_result):
+    """Return the fuzz endpoint's payload for the fuzz results."""
+    results_payload = []
     for result in fuzz_result:
         result_payload = standard_api_values(result['domain-name'], skip='url')
         result_payload['fuzzer'] = result['fuzzer']
-        fuzz_payload.append(result_payload)
+        if 'score' in result:
+            result_payload['score'] = result['score']
+        results_payload.append(result_payload)
 
     payload = standard_api_values(domain, skip='fuzz')
-    payload['fuzzy_domains'] = fuzz_payload
-    return flask.jsonify(payload)
+    payload['fuzzy_domains'] = results_payload
+    return payload
+
+
+def fuzz_top_k(domain, top_k):
+    """Return the top_k parameter's most similar fuzz results.
+
+    Ranking scores every fuzzy domain, so isn't offered for fuzzes over
+    budget.
+    """
+    try:
+        top_k = int(top_k)
+    except ValueError:
+        flask.abort(400, 'Malformed top_k.')
+    if not 1 <= top_k <= MAX_FUZZ_PAGE_SIZE:
+        flask.abort(
+            400, 'top_k must be between 1 and {}.'.format(MAX_FUZZ_PAGE_SIZE)
+        )
+    if not tools.within_fuzz_budget(domain):
+        flask.abort(400, 'Domain too large to rank.')
+
+    return tools.ranked_fuzzy_domains(domain, top_k)
+
+
+def fuzz_page(domain, cursor, limit):
+    """Return a page of fuzz results for the cursor and limit parameters.
+
+    Pages come from the same (resumable) fuzz as the chunked endpoint.
+    """
+    try:
+        limit = int(limit or DEFAULT_FUZZ_PAGE_SIZE)
+    except ValueError:
+        flask.abort(400, 'Malformed limit.')
+    if not 1 <= limit <= MAX_FUZZ_PAGE_SIZE:
+        flask.abort(
+            400, 'Limit must be between 1 and {}.'.format(MAX_FUZZ_PAGE_SIZE)
+        )
+
+    try:
+        page, next_cursor = tools.fuzzy_domains_page(domain, cursor, limit)
+    except dnstwist.InvalidCursor:
+        flask.abort(400, 'Malformed cursor.')
+
+    return [{'domain-name': result.domain, 'fuzzer': result.fuzzer}
+            for result
+            in page], next_cursor
 
 
 @app.route('/fuzz_chunked/<hexdomain>')
 @auth.login_required
 def fuzz_chunked(hexdomain):
-    """Return a chunked json fuzz based on jsonpipe by eBay."""
+    """Return a chunked json fuzz based on jsonpipe by eBay.
+
+    Pass second_order=true to follow the fuzz with the domains two edits
+    away, most plausible first, up to a budget.
+
+    Fuzzes estimated to be over budget are cut off after FUZZ_BUDGET
+    results.
+    """
     domain = tools.parse_domain(hexdomain)
     if domain is None:
         flask.abort(
@@ -189,8 +370,14 @@ def fuzz_chunked(hexdomain):
             'Malformed domain or domain not represented in hexadecimal format.'
         )
 
+    second_order = flask.request.args.get('second_order') == 'true'
+
+    results = tools.fuzzy_domains_iter(domain, second_order)
+    if not tools.within_fuzz_budget(domain, homoglyph_max=None):
+        results = itertools.islice(results, tools.FUZZ_BUDGET)
+
     def generate():
-        for result in tools.fuzzy_domains_iter(domain):
+        for result in results:
             domain_result = result.domain
             yield json.dumps({
                 'd': domain_result,
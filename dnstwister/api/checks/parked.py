@@ -60,16 +60,11 @@ def get_text(score):
 def second_level(domain):
     """Return the second-level bit of a domain.
 
-    Determine tld by finding the longest tld that is the end of the passed in
-    domain.
+    Determine tld by looking up the public suffix of the passed in domain.
     """
-    candidate = ''
-    for tld in tld_db.TLDS:
-        if domain.endswith('.' + tld) and len(tld) > len(candidate):
-            candidate = tld
-
-    if candidate != '':
-        return domain.rsplit('.' + candidate, 1)[0].split('.')[-1]
+    split = tld_db.PSL.split(domain, strict=True)
+    if split is not None:
+        return split[0].split('.')[-1]
     return ''
 
 
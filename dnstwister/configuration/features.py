@@ -10,3 +10,33 @@ def enable_noisy_domains():
 def enable_async_search():
     """Enable the new, faster, async search."""
     return os.getenv('feature.async_search') == 'true'
+
+
+def enable_fuzz_cache_redis():
+    """Share cached fuzz results between processes via Redis."""
+    return os.getenv('feature.fuzz_cache_redis') == 'true'
+
+
+def enable_resolution_cache_redis():
+    """Share cached resolutions between processes via Redis."""
+    return os.getenv('feature.resolution_cache_redis') == 'true'
+
+
+def enable_tld_swap():
+    """Add the TLD-swap fuzzer to fuzzes."""
+    return os.getenv('feature.tld_swap') == 'true'
+
+
+def enable_dictionary():
+    """Add the dictionary (keyword) fuzzer to fuzzes."""
+    return os.getenv('feature.dictionary') == 'true'
+
+
+def enable_score_ranking():
+    """Rank reports' fuzzy domains by similarity, most similar first."""
+    return os.getenv('feature.score_ranking') == 'true'
+
+
+def enable_batch_resolve():
+    """Resolve exports, deltas and the API via the batch resolver."""
+    return os.getenv('feature.batch_resolve') == 'true'
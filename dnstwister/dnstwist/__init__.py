@@ -1,8 +1,16 @@
 """ Sub-set of dnstwist functionality for dnstwister.
 """
 # Exceptions
+from dnstwist import InvalidCursor
 from dnstwist import InvalidDomain
 
 # Helpers
 from dnstwist import is_valid_domain
+from dnstwist import fuzz_many
+from dedupe import new_filter as new_dedupe_filter
 from dnstwist import fuzz_domain as DomainFuzzer
+
+# Results
+from dnstwist import Result
+from results import FuzzResult
+from results import FuzzResultSet
@@ -0,0 +1,172 @@
+"""De-duplication filters for streaming fuzzes.
+
+Streaming the fuzz of a long domain with de-duplication used to keep a set
+of every candidate, which is where most of the memory went. The filters here
+all support the two set operations the fuzzers use ("in" and add()), so are
+interchangeable:
+
+ * 'exact' - a plain set. Exact, but unbounded.
+ * 'bloom' - a Bloom filter. Fixed size, but a unique candidate is dropped
+   with probability up to error_rate (once capacity is reached it climbs).
+ * 'cuckoo' - a cuckoo filter. Fixed and usually smaller than a Bloom filter
+   at the same error_rate. Once full, new candidates aren't remembered so
+   duplicates may get through - unique candidates are never dropped for
+   that reason.
+"""
+import array
+import math
+import random
+
+
+EXACT = 'exact'
+BLOOM = 'bloom'
+CUCKOO = 'cuckoo'
+
+BACKENDS = (EXACT, BLOOM, CUCKOO)
+
+CAPACITY = 100000
+ERROR_RATE = 0.0001
+
+_MASK32 = 0xffffffff
+_MASK64 = 0xffffffffffffffff
+
+
+class BloomFilter(object):
+    """A Bloom filter sized for capacity items at error_rate."""
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE):
+        bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self._bits = max(int(math.ceil(bits)), 8)
+        self._hashes = max(int(round(self._bits * math.log(2) / capacity)), 1)
+        self._array = bytearray((self._bits + 7) // 8)
+
+    @property
+    def size(self):
+        """The size of the filter, in bytes."""
+        return len(self._array)
+
+    def _indexes(self, item):
+        # Double hashing, from halves of the 64-bit hash.
+        item_hash = hash(item) & _MASK64
+        first = item_hash & _MASK32
+        second = (item_hash >> 32) | 1
+        for i in xrange(self._hashes):
+            yield (first + i * second) % self._bits
+
+    def __contains__(self, item):
+        array_ = self._array
+        for index in self._indexes(item):
+            if not array_[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    def add(self, item):
+        array_ = self._array
+        for index in self._indexes(item):
+            array_[index >> 3] |= 1 << (index & 7)
+
+
+class CuckooFilter(object):
+    """A cuckoo filter (4-slot buckets, partial-key hashing) sized for
+    capacity items at error_rate.
+    """
+    BUCKET_SIZE = 4
+    MAX_KICKS = 500
+
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE, seed=0):
+        fingerprint_bits = int(math.ceil(
+            math.log(2.0 * self.BUCKET_SIZE / error_rate, 2)
+        ))
+        fingerprint_bits = min(max(fingerprint_bits, 4), 32)
+        self._fingerprints = (1 << fingerprint_bits) - 1
+
+        # Power-of-two buckets, so the alternate bucket is an XOR away, at
+        # up to 95% occupancy.
+        buckets = 1
+        while buckets * self.BUCKET_SIZE * 0.95 < capacity:
+            buckets <<= 1
+        self._bucket_mask = buckets - 1
+
+        typecode = 'H' if fingerprint_bits <= 16 else 'I'
+        self._slots = array.array(typecode, [0]) * (buckets * self.BUCKET_SIZE)
+        self._random = random.Random(seed)
+
+        self.overflows = 0
+
+    @property
+    def size(self):
+        """The size of the filter, in bytes."""
+        return len(self._slots) * self._slots.itemsize
+
+    def _locate(self, item):
+        item_hash = hash(item) & _MASK64
+        fingerprint = (item_hash >> 32) % self._fingerprints + 1
+        first = item_hash & self._bucket_mask
+        return fingerprint, first, self._alternate(first, fingerprint)
+
+    def _alternate(self, bucket, fingerprint):
+        return (bucket ^ (fingerprint * 0x5bd1e995)) & self._bucket_mask
+
+    def _bucket_has(self, bucket, fingerprint):
+        start = bucket * self.BUCKET_SIZE
+        return fingerprint in self._slots[start:start + self.BUCKET_SIZE]
+
+    def _bucket_insert(self, bucket, fingerprint):
+        start = bucket * self.BUCKET_SIZE
+        for slot in xrange(start, start + self.BUCKET_SIZE):
+            if self._slots[slot] == 0:
+                self._slots[slot] = fingerprint
+                return True
+        return False
+
+    def __contains__(self, item):
+        fingerprint, first, second = self._locate(item)
+        return (self._bucket_has(first, fingerprint) or
+                self._bucket_has(second, fingerprint))
+
+    def add(self, item):
+        fingerprint, first, second = self._locate(item)
+        if self._bucket_has(first, fingerprint) or self._bucket_has(second, fingerprint):
+            return
+        if self._bucket_insert(first, fingerprint) or self._bucket_insert(second, fingerprint):
+            return
+
+        # Once full, don't keep paying for evictions that will fail.
+        if self.overflows:
+            self.overflows += 1
+            return
+
+        # Evict fingerprints to their alternate buckets to make room.
+        bucket = self._random.choice((first, second))
+        for _ in xrange(self.MAX_KICKS):
+            slot = bucket * self.BUCKET_SIZE + self._random.randrange(self.BUCKET_SIZE)
+            fingerprint, self._slots[slot] = self._slots[slot], fingerprint
+            bucket = self._alternate(bucket, fingerprint)
+            if self._bucket_insert(bucket, fingerprint):
+                return
+
+        # Full - the last evicted fingerprint is forgotten.
+        self.overflows += 1
+
+
+def new_filter(backend=EXACT, capacity=CAPACITY, error_rate=ERROR_RATE):
+    """Return a new, empty, de-duplication filter."""
+    if backend == EXACT:
+        return set()
+    if backend == BLOOM:
+        return BloomFilter(capacity, error_rate)
+    if backend == CUCKOO:
+        return CuckooFilter(capacity, error_rate)
+    raise ValueError('Unknown de-duplication backend: {}'.format(backend))
+
+
+def from_option(de_dupe):
+    """Return the filter for a de_dupe argument - None for False, a new exact
+    filter for True, or the filter (or backend name) passed.
+    """
+    if de_dupe is None or de_dupe is False:
+        return None
+    if de_dupe is True:
+        return new_filter()
+    if isinstance(de_dupe, basestring):
+        return new_filter(de_dupe)
+    return de_dupe
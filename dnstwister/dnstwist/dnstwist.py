@@ -28,26 +28,25 @@ __author__ = 'Marcin Ulikowski'
 __version__ = '20180623'
 __email__ = 'marcin@ulikowski.pl'
 
+import binascii
+import collections
+import heapq
+import itertools
 import re
-import os.path
-
-import idna
-
-
-FILE_TLD = os.path.join(
-    'dnstwister',
-    'dnstwist',
-    'database',
-    'effective_tld_names.dat'
-)
-DB_TLD = os.path.exists(FILE_TLD)
-if not DB_TLD:
-    raise Exception('TLD database is required!')
-
-VALID_DOMAIN_RE = re.compile(
-    r'(?=^.{4,253}$)(^((?!-)[a-zA-Z0-9-]{1,63}(?<!-)\.)+[a-zA-Z]{2,63}\.?$)',
-    flags=re.IGNORECASE
-)
+import struct
+
+import dedupe
+import homoglyphs
+import keyboards
+import keywords
+import publicsuffix
+import results
+import scoring
+import tlds
+import validation
+import vectorized
+from validation import VALID_DOMAIN_RE
+from validation import is_valid_domain
 
 
 class InvalidDomain(Exception):
@@ -56,11 +55,67 @@ class InvalidDomain(Exception):
     pass
 
 
+class InvalidCursor(Exception):
+    """ Exception for malformed fuzz_iter() cursors.
+    """
+    pass
+
+
+# Positions within the two-dimensional fuzzers (position in the domain, then
+# character etc) are encoded as outer * _STRIDE + inner.
+_STRIDE = 256
+
+_CURSOR = struct.Struct('>BI')
+
+# The most second-order candidates fuzz_iter() examines (and so yields) by
+# default.
+SECOND_ORDER_BUDGET = 5000
+
+
+def _bitsquats(o):
+    """The number of valid characters one bit-flip away from ord o."""
+    count = 0
+    for mask in (1, 2, 4, 8, 16, 32, 64, 128):
+        b = o ^ mask
+        if (b >= 48 and b <= 57) or (b >= 97 and b <= 122) or b == 45:
+            count += 1
+    return count
+
+
+# The bitsquatting candidates per (8-bit) character, for estimate().
+_BITSQUATS = [_bitsquats(o) for o in range(256)]
+
+
+def encode_cursor(stage, position):
+    """Return an opaque cursor for a fuzzer stage index and position."""
+    return binascii.hexlify(_CURSOR.pack(stage, position))
+
+
+def decode_cursor(cursor):
+    """Return the (stage, position) from a cursor."""
+    try:
+        stage, position = _CURSOR.unpack(binascii.unhexlify(cursor))
+    except (TypeError, ValueError, struct.error):
+        raise InvalidCursor(cursor)
+    if stage >= len(fuzz_domain.STAGES):
+        raise InvalidCursor(cursor)
+    return stage, position
+
+
 class Result(object):
+    __slots__ = ('_fuzzer', '_domain', '_stage', '_position', '_score')
 
-    def __init__(self, fuzzer, domain):
+    def __init__(self, fuzzer, domain, stage=None, position=None, score=None):
         self._fuzzer = fuzzer
         self._domain = domain
+        self._stage = stage
+        self._position = position
+        self._score = score
+
+    @property
+    def score(self):
+        """The similarity score (see scoring.py), if ranked, or None."""
+        return self._score
 
     @property
     def fuzzer(self):
@@ -70,308 +125,429 @@ class Result(object):
     def domain(self):
         return self._domain
 
-
-class ResultBuilder(object):
-
-    def __init__(self, tld):
-        self._tld = tld
-
-    def build(self, fuzzer, domain):
-        return Result(fuzzer, domain + '.' + self._tld)
-
-
-def is_valid_domain(domain):
-    """Validate a domain - including unicode domains."""
-    try:
-        if len(domain) > 255:
-            return False
-
-        encoded_domain = idna.encode(domain)
-        if domain != encoded_domain and len(domain) == encoded_domain:
-            return False
-
-        return VALID_DOMAIN_RE.match(encoded_domain) is not None
-    except (UnicodeError, TypeError, idna.IDNAError):
-        pass
-    return False
+    @property
+    def cursor(self):
+        """The cursor to resume a fuzz_iter() after this result, or None."""
+        if self._stage is None:
+            return None
+        return encode_cursor(self._stage, self._position + 1)
 
 
 class fuzz_domain(object):
     """ Domain fuzzer.
     """
-    def __init__(self, domain):
-        self.domain, self.tld = self.__domain_tld(domain)
-        self.domains = []
-        self.qwerty = {
-        '1': '2q', '2': '3wq1', '3': '4ew2', '4': '5re3', '5': '6tr4', '6': '7yt5', '7': '8uy6', '8': '9iu7', '9': '0oi8', '0': 'po9',
-        'q': '12wa', 'w': '3esaq2', 'e': '4rdsw3', 'r': '5tfde4', 't': '6ygfr5', 'y': '7uhgt6', 'u': '8ijhy7', 'i': '9okju8', 'o': '0plki9', 'p': 'lo0',
-        'a': 'qwsz', 's': 'edxzaw', 'd': 'rfcxse', 'f': 'tgvcdr', 'g': 'yhbvft', 'h': 'ujnbgy', 'j': 'ikmnhu', 'k': 'olmji', 'l': 'kop',
-        'z': 'asx', 'x': 'zsdc', 'c': 'xdfv', 'v': 'cfgb', 'b': 'vghn', 'n': 'bhjm', 'm': 'njk'
-        }
-        self.qwertz = {
-        '1': '2q', '2': '3wq1', '3': '4ew2', '4': '5re3', '5': '6tr4', '6': '7zt5', '7': '8uz6', '8': '9iu7', '9': '0oi8', '0': 'po9',
-        'q': '12wa', 'w': '3esaq2', 'e': '4rdsw3', 'r': '5tfde4', 't': '6zgfr5', 'z': '7uhgt6', 'u': '8ijhz7', 'i': '9okju8', 'o': '0plki9', 'p': 'lo0',
-        'a': 'qwsy', 's': 'edxyaw', 'd': 'rfcxse', 'f': 'tgvcdr', 'g': 'zhbvft', 'h': 'ujnbgz', 'j': 'ikmnhu', 'k': 'olmji', 'l': 'kop',
-        'y': 'asx', 'x': 'ysdc', 'c': 'xdfv', 'v': 'cfgb', 'b': 'vghn', 'n': 'bhjm', 'm': 'njk'
-        }
-        self.azerty = {
-        '1': '2a', '2': '3za1', '3': '4ez2', '4': '5re3', '5': '6tr4', '6': '7yt5', '7': '8uy6', '8': '9iu7', '9': '0oi8', '0': 'po9',
-        'a': '2zq1', 'z': '3esqa2', 'e': '4rdsz3', 'r': '5tfde4', 't': '6ygfr5', 'y': '7uhgt6', 'u': '8ijhy7', 'i': '9okju8', 'o': '0plki9', 'p': 'lo0m',
-        'q': 'zswa', 's': 'edxwqz', 'd': 'rfcxse', 'f': 'tgvcdr', 'g': 'yhbvft', 'h': 'ujnbgy', 'j': 'iknhu', 'k': 'olji', 'l': 'kopm', 'm': 'lp',
-        'w': 'sxq', 'x': 'zsdc', 'c': 'xdfv', 'v': 'cfgb', 'b': 'vghn', 'n': 'bhj'
-        }
-        self.keyboards = [ self.qwerty, self.qwertz, self.azerty ]
-
-    def __domain_tld(self, domain):
-        domain = domain.rsplit('.', 2)
-
-        if len(domain) == 2:
-            return domain[0], domain[1]
-
-        if DB_TLD:
-            cc_tld = {}
-            re_tld = re.compile(r'^[a-z]{2,4}\.[a-z]{2}$', re.IGNORECASE)
+    # The merged keyboard layouts, from keyboards.py.
+    neighbours = keyboards.NEIGHBOURS
+
+    # The fuzzers, in the (fixed) order they are run.
+    STAGES = (
+        'Original*',
+        'Addition',
+        'Bitsquatting',
+        'Homoglyph',
+        'Hyphenation',
+        'Insertion',
+        'Omission',
+        'Repetition',
+        'Replacement',
+        'Subdomain',
+        'Transposition',
+        'Vowel swap',
+        'Various',
+        'TLD swap',
+        'Dictionary',
+    )
+
+    # The fuzzers that produce full domains, rather than variations of the
+    # domain without its TLD.
+    FULL_DOMAIN_STAGES = ('Various', 'TLD swap')
+
+    # The fuzzers composed in second-order mode, most plausible first. Pairs
+    # of them are run in order of their combined rank, so the likeliest
+    # two-edit squats come first.
+    SECOND_ORDER = (
+        'Replacement',
+        'Omission',
+        'Transposition',
+        'Insertion',
+        'Repetition',
+        'Vowel swap',
+        'Addition',
+        'Hyphenation',
+        'Bitsquatting',
+        'Subdomain',
+        'Homoglyph',
+    )
+
+    def __init__(self, domain, tld_swap=0, tld_ranking=tlds.PROXIMITY,
+                 dictionary=0):
+        """The TLD-swap and dictionary fuzzers are opt-in - tld_swap is the
+        number of TLDs to swap in, ranked per tld_ranking (see tlds.py), and
+        dictionary the number of keyword candidates (see keywords.py).
+        """
+        self.tld_swap = tld_swap
+        self.tld_ranking = tld_ranking
+        self.dictionary = dictionary
+        self.reset(domain)
 
-            for line in open(FILE_TLD):
-                line = line[:-1]
-                if re_tld.match(line):
-                    sld, tld = line.split('.')
-                    if not tld in cc_tld:
-                        cc_tld[tld] = []
-                    cc_tld[tld].append(sld)
+    def reset(self, domain):
+        """Point the fuzzer at a new domain.
 
-            sld_tld = cc_tld.get(domain[2])
-            if sld_tld:
-                if domain[1] in sld_tld:
-                    return domain[0], domain[1] + '.' + domain[2]
+        Everything that isn't specific to the domain (keyboard tables etc) is
+        kept, which is what makes batch fuzzing via fuzz_many() cheaper than
+        creating a fuzzer per domain.
+        """
+        self.domain, self.tld = self.__domain_tld(domain)
+        self.domains = results.FuzzResultSet()
 
-        return domain[0] + '.' + domain[1], domain[2]
+    def __domain_tld(self, domain):
+        split = publicsuffix.PSL.split(domain)
+        if split is None:
+            return tuple(domain.rsplit('.', 1))
+        return split
 
     def __validate_domain(self, domain):
-        return is_valid_domain(domain)
+        return validation.RELAXED.is_valid(domain)
 
     def __filter_domains(self):
 
-        # IDNA encoding's detailed check makes this 4x slower, and we validate
-        # all requests that just query a domain later on.
-        old_func = idna.core.check_label
-        idna.core.check_label = lambda l: None
-
+        # The IDNA encoding's detailed check makes this 4x slower, and we
+        # validate all requests that just query a domain later on, so the
+        # relaxed validator is used.
         seen = set()
-        filtered = []
+        filtered = results.FuzzResultSet()
 
-        for d in self.domains:
-            if d['domain-name'] in seen:
+        for (fuzzer, domain) in self.domains.pairs():
+            if domain in seen:
                 continue
 
-            seen.add(d['domain-name'])
+            seen.add(domain)
 
-            if self.__validate_domain(d['domain-name']):
-                filtered.append(d)
+            if self.__validate_domain(domain):
+                filtered.append(fuzzer, domain)
 
         self.domains = filtered
 
-        idna.core.check_label = old_func
+    # Each fuzzer yields (position, candidate) tuples, in increasing order of
+    # position, starting from the first candidate at or after start.
+    #
+    # So that they can be resumed part-way through, the fuzzers don't keep
+    # a set of the candidates seen so far. Instead they skip the candidates
+    # that (by construction) must have been generated already.
 
-    def __bitsquatting(self):
+    def __original(self, start=0):
+        if start == 0:
+            yield 0, self.domain
+
+    def __bitsquatting(self, start=0):
+        if vectorized.usable(self.domain):
+            return iter(vectorized.bitsquatting(self.domain, _STRIDE, start))
+        return self.__bitsquatting_python(start)
+
+    def __bitsquatting_python(self, start=0):
         masks = [1, 2, 4, 8, 16, 32, 64, 128]
-        for i in range(0, len(self.domain)):
+        for i in range(start // _STRIDE, len(self.domain)):
             c = self.domain[i]
-            for j in range(0, len(masks)):
 
-                # Deal with Unicode later...
-                if ord(c) > 255:
+            # Deal with Unicode later...
+            if ord(c) > 255:
+                continue
+
+            for j in range(0, len(masks)):
+                position = i * _STRIDE + j
+                if position < start:
                     continue
 
                 b = chr(ord(c) ^ masks[j])
                 o = ord(b)
                 if (o >= 48 and o <= 57) or (o >= 97 and o <= 122) or o == 45:
-                    yield self.domain[:i] + b + self.domain[i+1:]
-
-    def __homoglyph(self, MAX=1000):
-        glyphs = {
-        'a': [u'à', u'á', u'â', u'ã', u'ä', u'å', u'ɑ', u'а', u'ạ', u'ǎ', u'ă', u'ȧ', u'ӓ'],
-        'b': ['d', 'lb', 'ib', u'ʙ', u'Ь', u'b̔', u'ɓ', u'Б'],
-        'c': [u'ϲ', u'с', u'ƈ', u'ċ', u'ć', u'ç'],
-        'd': ['b', 'cl', 'dl', 'di', u'ԁ', u'ժ', u'ɗ', u'đ'],
-        'e': [u'é', u'ê', u'ë', u'ē', u'ĕ', u'ě', u'ė', u'е', u'ẹ', u'ę', u'є', u'ϵ', u'ҽ'],
-        'f': [u'Ϝ', u'ƒ', u'Ғ'],
-        'g': ['q', u'ɢ', u'ɡ', u'Ԍ', u'Ԍ', u'ġ', u'ğ', u'ց', u'ǵ', u'ģ'],
-        'h': ['lh', 'ih', u'һ', u'հ', u'Ꮒ', u'н'],
-        'i': ['1', 'l', u'Ꭵ', u'í', u'ï', u'ı', u'ɩ', u'ι', u'ꙇ', u'ǐ', u'ĭ', u'ì'],
-        'j': [u'ј', u'ʝ', u'ϳ', u'ɉ'],
-        'k': ['lk', 'ik', 'lc', u'κ', u'ⲕ', u'κ'],
-        'l': ['1', 'i', u'ɫ', u'ł'],
-        'm': ['n', 'nn', 'rn', 'rr', u'ṃ', u'ᴍ', u'м', u'ɱ'],
-        'n': ['m', 'r', u'ń'],
-        'o': ['0', u'Ο', u'ο', u'О', u'о', u'Օ', u'ȯ', u'ọ', u'ỏ', u'ơ', u'ó', u'ö', u'ӧ'],
-        'p': [u'ρ', u'р', u'ƿ', u'Ϸ', u'Þ'],
-        'q': ['g', u'զ', u'ԛ', u'գ', u'ʠ'],
-        'r': [u'ʀ', u'Г', u'ᴦ', u'ɼ', u'ɽ'],
-        's': [u'Ⴝ', u'Ꮪ', u'ʂ', u'ś', u'ѕ'],
-        't': [u'τ', u'т', u'ţ'],
-        'u': [u'μ', u'υ', u'Ս', u'ս', u'ц', u'ᴜ', u'ǔ', u'ŭ'],
-        'v': [u'ѵ', u'ν', u'v̇'],
-        'w': ['vv', u'ѡ', u'ա', u'ԝ'],
-        'x': [u'х', u'ҳ', u'ẋ'],
-        'y': [u'ʏ', u'γ', u'у', u'Ү', u'ý'],
-        'z': [u'ʐ', u'ż', u'ź', u'ʐ', u'ᴢ']
-        }
-
-        yielded = 0
-        seen = set()
-
-        for ws in range(0, len(self.domain)):
-            for i in range(0, (len(self.domain)-ws)+1):
-                win = self.domain[i:i+ws]
-
-                j = 0
-                while j < ws:
-                    c = win[j]
-                    if c in glyphs:
-                        win_copy = win
-                        for g in glyphs[c]:
-                            win = win.replace(c, g)
-                            candidate = self.domain[:i] + win + self.domain[i+ws:]
-                            if candidate not in seen:
-                                seen.add(candidate)
-                                yield candidate
-                                yielded += 1
-                            win = win_copy
-
-                            # Very long domains have terrible complexity when
-                            # ran through this algorithm.
-                            if MAX is not None and yielded >= MAX:
-                                return
-                    j += 1
-
-    def __hyphenation(self):
-        for i in range(1, len(self.domain)):
-            yield self.domain[:i] + '-' + self.domain[i:]
-
-    def __insertion(self):
-        seen = set()
-
-        for i in range(1, len(self.domain)-1):
-            for keys in self.keyboards:
-                if self.domain[i] in keys:
-                    for c in keys[self.domain[i]]:
-                        first = self.domain[:i] + c + self.domain[i] + self.domain[i+1:]
-                        second = self.domain[:i] + self.domain[i] + c + self.domain[i+1:]
-
-                        if first not in seen:
-                            seen.add(first)
-                            yield first
-
-                        if second not in seen:
-                            seen.add(second)
-                            yield second
-
-    def __omission(self):
-        seen = set()
-
-        for i in range(0, len(self.domain)):
-            candidate = self.domain[:i] + self.domain[i+1:]
-            if candidate not in seen:
-                seen.add(candidate)
-                yield candidate
-
-        n = re.sub(r'(.)\1+', r'\1', self.domain)
-
-        if n not in seen and n != self.domain:
-            yield n
-
-    def __repetition(self):
-        seen = set()
-
-        for i in range(0, len(self.domain)):
-            if self.domain[i].isalpha():
-                candidate = self.domain[:i] + self.domain[i] + self.domain[i] + self.domain[i+1:]
-                if candidate not in seen:
-                    seen.add(candidate)
-                    yield candidate
-
-    def __replacement(self):
-        seen = set()
+                    yield position, self.domain[:i] + b + self.domain[i+1:]
+
+    def __homoglyph(self, start=0, MAX=1000, seen=None):
+        # Very long domains produce a lot of homoglyphs, so are capped by
+        # default.
+        #
+        # Homoglyphs are de-duplicated as they are generated so resuming
+        # replays the skipped candidates, though they're cheap to build.
+        candidates = homoglyphs.homoglyphs(self.domain, budget=MAX, seen=seen)
+        return itertools.islice(enumerate(candidates), start, None)
+
+    def __hyphenation(self, start=0):
+        # Hyphenating after a hyphen is the same as hyphenating before it,
+        # which was generated already (unless that's before the first
+        # character).
+        for i in range(max(start, 1), len(self.domain)):
+            if i < 2 or self.domain[i-1] != '-':
+                yield i, self.domain[:i] + '-' + self.domain[i:]
+
+    def __insertion(self, start=0):
+        domain = self.domain
+
+        for i in range(max(start // _STRIDE, 1), len(domain)-1):
+            for (j, c) in enumerate(self.neighbours.get(domain[i], '')):
+                position = i * _STRIDE + j * 2
+                if position + 1 < start:
+                    continue
 
-        for i in range(0, len(self.domain)):
-            for keys in self.keyboards:
-                if self.domain[i] in keys:
-                    for c in keys[self.domain[i]]:
-                        candidate = self.domain[:i] + c + self.domain[i+1:]
-                        if candidate not in seen:
-                            seen.add(candidate)
-                            yield candidate
-
-    def __subdomain(self):
-        for i in range(1, len(self.domain)):
+                # Inserting c before domain[i] is the same as inserting it
+                # anywhere in the run of c's preceding domain[i] - and that
+                # was generated already if c neighbours the character
+                # before the run, by inserting c *after* that character.
+                if position >= start:
+                    run = i
+                    while run > 0 and domain[run-1] == c:
+                        run -= 1
+                    if run < 2 or c not in self.neighbours.get(domain[run-1], ''):
+                        yield position, domain[:i] + c + domain[i:]
+
+                # Inserting c after domain[i] is always new, c never
+                # neighbours itself.
+                yield position + 1, domain[:i+1] + c + domain[i+1:]
+
+    def __omission(self, start=0):
+        domain = self.domain
+
+        # Omitting any character in a run of the same character gives the
+        # same result, so only the first in each run is omitted.
+        for i in range(start, len(domain)):
+            if i == 0 or domain[i] != domain[i-1]:
+                yield i, domain[:i] + domain[i+1:]
+
+        # Collapsing every run to one character is only new if that omits
+        # more than one character.
+        repeats = sum(1 for i in range(1, len(domain)) if domain[i] == domain[i-1])
+        if start <= len(domain) and repeats > 1:
+            yield len(domain), re.sub(r'(.)\1+', r'\1', domain)
+
+    def __repetition(self, start=0):
+        domain = self.domain
+
+        # As for omissions, repeating any character in a run gives the same
+        # result.
+        for i in range(start, len(domain)):
+            if domain[i].isalpha() and (i == 0 or domain[i] != domain[i-1]):
+                yield i, domain[:i] + domain[i] + domain[i] + domain[i+1:]
+
+    def __replacement(self, start=0):
+        # The vectorized version only knows the default keyboard layouts.
+        if self.neighbours is keyboards.NEIGHBOURS and vectorized.usable(self.domain):
+            return iter(vectorized.replacement(self.domain, _STRIDE, start))
+        return self.__replacement_python(start)
+
+    def __replacement_python(self, start=0):
+        # The neighbours never include the character itself, so every
+        # candidate differs from the domain at exactly one position and no
+        # de-duplication is needed.
+        for i in range(start // _STRIDE, len(self.domain)):
+            for (j, c) in enumerate(self.neighbours.get(self.domain[i], '')):
+                position = i * _STRIDE + j
+                if position >= start:
+                    yield position, self.domain[:i] + c + self.domain[i+1:]
+
+    def __subdomain(self, start=0):
+        for i in range(max(start, 1), len(self.domain)):
             if self.domain[i] not in ['-', '.'] and self.domain[i-1] not in ['-', '.']:
-                yield self.domain[:i] + '.' + self.domain[i:]
+                yield i, self.domain[:i] + '.' + self.domain[i:]
 
-    def __transposition(self):
-        for i in range(0, len(self.domain)-1):
+    def __transposition(self, start=0):
+        for i in range(start, len(self.domain)-1):
             if self.domain[i+1] != self.domain[i]:
-                yield self.domain[:i] + self.domain[i+1] + self.domain[i] + self.domain[i+2:]
+                yield i, self.domain[:i] + self.domain[i+1] + self.domain[i] + self.domain[i+2:]
 
-    def __vowel_swap(self):
+    def __vowel_swap(self, start=0):
         vowels = 'aeiou'
-        seen = set()
 
-        for i in range(0, len(self.domain)):
-            for vowel in vowels:
-                if self.domain[i] in vowels:
-                    candidate = self.domain[:i] + vowel + self.domain[i+1:]
-                    if candidate not in seen:
-                        seen.add(candidate)
-                        yield candidate
+        # As for replacement, no de-duplication is needed as long as vowels
+        # aren't swapped for themselves.
+        for i in range(start // _STRIDE, len(self.domain)):
+            if self.domain[i] in vowels:
+                for (j, vowel) in enumerate(vowels):
+                    position = i * _STRIDE + j
+                    if position >= start and vowel != self.domain[i]:
+                        yield position, self.domain[:i] + vowel + self.domain[i+1:]
+
+    def __addition(self, start=0):
+        for i in range(start, 26):
+            yield i, self.domain + chr(97 + i)
+
+    def __various(self, start=0):
+        """Full domains, rather than variations of the domain."""
+        various = []
+        if not self.domain.startswith('www.'):
+            various.append('ww' + self.domain + '.' + self.tld)
+            various.append('www' + self.domain + '.' + self.tld)
+            various.append('www-' + self.domain + '.' + self.tld)
+        if '.' in self.tld:
+            various.append(self.domain + '.' + self.tld.split('.')[-1])
+            various.append(self.domain + self.tld)
+        if '.' not in self.tld:
+            various.append(self.domain + self.tld + '.' + self.tld)
+        if self.tld != 'com' and '.' not in self.tld:
+            various.append(self.domain + '-' + self.tld + '.com')
+        return itertools.islice(enumerate(various), start, None)
+
+    def __tld_swap(self, start=0):
+        """Full domains, as for __various()."""
+        if not self.tld_swap:
+            return
+
+        various = set(domain for (_, domain) in self.__various())
+        swaps = tlds.ranked(self.tld, self.tld_ranking, self.tld_swap)
+        for (i, tld) in itertools.islice(enumerate(swaps), start, None):
+            domain = self.domain + '.' + tld
+            if domain not in various:
+                yield i, domain
+
+    def __dictionary(self, start=0):
+        # Keywords are combined with the last label, so subdomains are kept
+        # as they are.
+        if not self.dictionary:
+            return
+
+        head, _, label = self.domain.rpartition('.')
+        candidates = keywords.KEYWORDS.combinations(label)
+        for (position, candidate) in itertools.islice(candidates, self.dictionary):
+            if position >= start and candidate != label:
+                if head:
+                    candidate = head + '.' + candidate
+                yield position, candidate
+
+    def __stages(self, homoglyph_max, seen=None):
+        """The fuzzers, in STAGES order."""
+        return (
+            self.__original,
+            self.__addition,
+            self.__bitsquatting,
+            lambda start: self.__homoglyph(start, MAX=homoglyph_max, seen=seen),
+            self.__hyphenation,
+            self.__insertion,
+            self.__omission,
+            self.__repetition,
+            self.__replacement,
+            self.__subdomain,
+            self.__transposition,
+            self.__vowel_swap,
+            self.__various,
+            self.__tld_swap,
+            self.__dictionary,
+        )
+
+    def estimate(self, homoglyph_max=1000):
+        """Return an upper bound on the candidates each fuzzer produces, as
+        an OrderedDict of fuzzer tag to count in STAGES order, without
+        generating any of them.
+
+        The bounds are closed-form in the domain's length and character
+        counts. homoglyph_max caps the homoglyphs as for fuzz() - pass None
+        for fuzz_iter(), which doesn't cap them.
+        """
+        domain = self.domain
+        length = len(domain)
+        counts = collections.Counter(domain)
+
+        def neighbours(chars):
+            return sum(count * len(self.neighbours.get(char, ''))
+                       for (char, count)
+                       in chars.items())
+
+        # Each glyph-able character's candidates are one per glyph per
+        # contiguous run of its occurrences.
+        homoglyph = sum(
+            count * (count + 1) // 2 * len(homoglyphs.GLYPHS[char])
+            for (char, count)
+            in counts.items()
+            if char in homoglyphs.GLYPHS
+        )
+        if homoglyph_max is not None:
+            homoglyph = min(homoglyph, homoglyph_max)
+
+        various = 0
+        if not domain.startswith('www.'):
+            various += 3
+        various += 2 if '.' in self.tld else 1
+        if self.tld != 'com' and '.' not in self.tld:
+            various += 1
+
+        return collections.OrderedDict(zip(self.STAGES, (
+            1,
+            26,
+            sum(count * _BITSQUATS[ord(char)]
+                for (char, count)
+                in counts.items()
+                if ord(char) <= 255),
+            homoglyph,
+            max(length - 1, 0),
+            2 * neighbours(collections.Counter(domain[1:-1])),
+            length + 1,
+            sum(count for (char, count) in counts.items() if char.isalpha()),
+            neighbours(counts),
+            max(length - 1, 0),
+            max(length - 1, 0),
+            4 * sum(counts[vowel] for vowel in 'aeiou'),
+            various,
+            self.tld_swap,
+            self.dictionary,
+        )))
+
+    def __second_order(self, seen, budget):
+        """Yield (tag, domain) for the valid domains two edits away from the
+        domain that aren't already in seen, stopping after budget candidates
+        have been examined - duplicates and invalid domains included.
+
+        Each pair of fuzzers is a lazy pipeline - the second fuzzer is run
+        over each of the first's candidates in turn - so nothing but the
+        seen filter grows with the number of combinations, and that by at
+        most the budget.
+        """
+        if budget <= 0:
+            return
+
+        rank = dict((tag, i) for (i, tag) in enumerate(self.SECOND_ORDER))
+        pairs = sorted(
+            itertools.product(self.SECOND_ORDER, repeat=2),
+            key=lambda pair: (rank[pair[0]] + rank[pair[1]], rank[pair[0]])
+        )
+
+        # A second fuzzer, re-pointed at each first-order candidate.
+        inner = fuzz_domain(self.domain + '.' + self.tld)
+        first = dict(zip(self.STAGES, self.__stages(1000)))
+        second = dict(zip(self.STAGES, inner.__stages(1000)))
+
+        seen.add(self.domain)
+
+        examined = 0
+        for (first_tag, second_tag) in pairs:
+            tag = first_tag + '+' + second_tag
+            for (_, candidate) in first[first_tag](0):
+                inner.domain = candidate
+                for (_, domain) in second[second_tag](0):
+                    if examined >= budget:
+                        return
+                    examined += 1
+
+                    if domain in seen:
+                        continue
+                    seen.add(domain)
 
-    def __addition(self):
-        for i in range(97, 123):
-            yield self.domain + chr(i)
+                    domain += '.' + self.tld
+                    if validation.STRICT.is_valid(domain):
+                        yield tag, domain
 
     def fuzz(self):
         """ Perform a domain fuzz.
         """
-        self.domains.append({ 'fuzzer': 'Original*', 'domain-name': self.domain + '.' + self.tld })
-
-        for domain in self.__addition():
-            self.domains.append({ 'fuzzer': 'Addition', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__bitsquatting():
-            self.domains.append({ 'fuzzer': 'Bitsquatting', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__homoglyph():
-            self.domains.append({ 'fuzzer': 'Homoglyph', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__hyphenation():
-            self.domains.append({ 'fuzzer': 'Hyphenation', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__insertion():
-            self.domains.append({ 'fuzzer': 'Insertion', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__omission():
-            self.domains.append({ 'fuzzer': 'Omission', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__repetition():
-            self.domains.append({ 'fuzzer': 'Repetition', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__replacement():
-            self.domains.append({ 'fuzzer': 'Replacement', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__subdomain():
-            self.domains.append({ 'fuzzer': 'Subdomain', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__transposition():
-            self.domains.append({ 'fuzzer': 'Transposition', 'domain-name': domain + '.' + self.tld })
-        for domain in self.__vowel_swap():
-            self.domains.append({ 'fuzzer': 'Vowel swap', 'domain-name': domain + '.' + self.tld })
-
-        if not self.domain.startswith('www.'):
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': 'ww' + self.domain + '.' + self.tld })
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': 'www' + self.domain + '.' + self.tld })
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': 'www-' + self.domain + '.' + self.tld })
-        if '.' in self.tld:
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + '.' + self.tld.split('.')[-1] })
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + self.tld })
-        if '.' not in self.tld:
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + self.tld + '.' + self.tld })
-        if self.tld != 'com' and '.' not in self.tld:
-            self.domains.append({ 'fuzzer': 'Various', 'domain-name': self.domain + '-' + self.tld + '.com' })
+        for (tag, fuzzer_func) in zip(self.STAGES, self.__stages(1000)):
+            if tag in self.FULL_DOMAIN_STAGES:
+                for (_, domain) in fuzzer_func(0):
+                    self.domains.append(tag, domain)
+            else:
+                for (_, domain) in fuzzer_func(0):
+                    self.domains.append(tag, domain + '.' + self.tld)
 
         self.__filter_domains()
 
-    def fuzz_iter(self, de_dupe=False):
+    def fuzz_iter(self, de_dupe=False, cursor=None, second_order=False,
+                  budget=SECOND_ORDER_BUDGET, ranked=False, top_k=None):
         """Return an iterator of the fuzz.
 
         The intent is to reduce memory usage and to allow the fuzzed domains
@@ -383,53 +559,119 @@ class fuzz_domain(object):
         domain here is irrelevant if it takes 1 second to resolve each one
         in the browser.
 
+        The order is deterministic, and each result has a cursor that can be
+        passed back in to resume the iteration after that result. Raises
+        InvalidCursor if the cursor is malformed.
+
         You can optionally de-duplicate as you go, though that will use more
-        memory obviously.
+        memory obviously, and only de-duplicates within one iteration.
+        de_dupe can be True (exact, via a set) or a filter from dedupe.py (or
+        its backend name) to bound that memory. The filter is shared with
+        the fuzzers that de-duplicate internally.
+
+        If second_order is True, candidates two edits away from the domain
+        (tagged with both fuzzers, eg "Replacement+Omission") are yielded
+        after the usual results, most plausible first, until budget
+        candidates have been examined. This mode always de-duplicates, with
+        an exact filter if de_dupe is False. Second-order results have no
+        cursor.
+
+        If ranked is True, or top_k is set, results are scored for similarity
+        to the domain (see scoring.py) and yielded best first - only the
+        top_k best if top_k is set, which only ever holds top_k results in
+        memory. Ranked results have no cursor.
         """
-        seen = set()
-        builder = ResultBuilder(self.tld)
-
-        yield builder.build('Original*', self.domain)
-
-        fuzzers = {
-            'Addition': self.__addition,
-            'Bitsquatting': self.__bitsquatting,
-            'Homoglyph': lambda: self.__homoglyph(MAX=None),
-            'Hyphenation': self.__hyphenation,
-            'Insertion': self.__insertion,
-            'Omission': self.__omission,
-            'Repetition': self.__repetition,
-            'Replacement': self.__replacement,
-            'Subdomain': self.__subdomain,
-            'Transposition': self.__transposition,
-            'Vowel swap': self.__vowel_swap
-        }
-
-        for (tag, fuzzer_func) in fuzzers.items():
-
-            for domain in fuzzer_func():
-                if de_dupe:
+        results = self.__iter_results(de_dupe, cursor, second_order, budget)
+        if ranked or top_k is not None:
+            return iter(self.__ranked(results, top_k))
+        return results
+
+    def __ranked(self, results, top_k=None, batch_size=1000):
+        """Return the results, scored in batches, best first."""
+        scorer = scoring.Scorer(self.domain + '.' + self.tld)
+
+        def scored():
+            while True:
+                batch = list(itertools.islice(results, batch_size))
+                if not batch:
+                    return
+                scores = scorer.scores([result.domain for result in batch])
+                for (result, score) in zip(batch, scores):
+                    yield Result(result.fuzzer, result.domain, score=score)
+
+        # Both are stable, so equal scores stay in generation order.
+        if top_k is None:
+            return sorted(scored(), key=lambda result: result.score, reverse=True)
+        return heapq.nlargest(top_k, scored(), key=lambda result: result.score)
+
+    def __iter_results(self, de_dupe, cursor, second_order, budget):
+        """The unranked fuzz_iter()."""
+        seen = dedupe.from_option(de_dupe)
+        if second_order and seen is None:
+            seen = dedupe.new_filter()
+
+        first_stage, start = 0, 0
+        if cursor is not None:
+            first_stage, start = decode_cursor(cursor)
+
+        stages = self.__stages(None, seen)
+
+        for stage in range(first_stage, len(stages)):
+            tag = self.STAGES[stage]
+            fuzzer_func = stages[stage]
+            positions = fuzzer_func(start if stage == first_stage else 0)
+
+            if tag == 'Original*' or tag in self.FULL_DOMAIN_STAGES:
+                for (position, domain) in positions:
+                    if tag == 'Original*':
+                        domain += '.' + self.tld
+                    yield Result(tag, domain, stage, position)
+                continue
+
+            # The homoglyph fuzzer checks the filter itself.
+            check_seen = seen is not None and tag != 'Homoglyph'
+
+            for (position, domain) in positions:
+                if check_seen:
                     if domain in seen:
                         continue
                     else:
                         seen.add(domain)
 
-                if not is_valid_domain(domain + '.' + self.tld):
+                domain += '.' + self.tld
+                if not validation.STRICT.is_valid(domain):
                     continue
 
-                yield builder.build(tag, domain)
+                yield Result(tag, domain, stage, position)
 
-        if not self.domain.startswith('www.'):
-            yield builder.build('Various', 'ww' + self.domain)
-            yield builder.build('Various', 'www' + self.domain)
-            yield builder.build('Various', 'www-' + self.domain)
+        if second_order:
+            for (tag, domain) in self.__second_order(seen, budget):
+                yield Result(tag, domain)
 
-        if '.' in self.tld:
-            yield Result('Various', self.domain + '.' + self.tld.split('.')[-1])
-            yield Result('Various', self.domain + self.tld)
 
-        if '.' not in self.tld:
-            yield builder.build('Various', self.domain + self.tld)
+def fuzz_many(domains, de_dupe=False):
+    """Fuzz many domains, sharing a single fuzzer across all of them.
 
-        if self.tld != 'com' and '.' not in self.tld:
-            yield Result('Various', self.domain + '-' + self.tld + '.com')
+    Yields (source_domain, fuzzer, candidate) tuples as they are generated, in
+    the same order as fuzz_iter() for each domain in turn.
+
+    If de_dupe is True a candidate is only yielded the first time it is
+    generated across *all* the domains - this costs a set of every candidate
+    seen so far, unless a bounded filter (see dedupe.py) is passed instead.
+    """
+    fuzzer = None
+    seen = dedupe.from_option(de_dupe)
+
+    for source_domain in domains:
+        if fuzzer is None:
+            fuzzer = fuzz_domain(source_domain)
+        else:
+            fuzzer.reset(source_domain)
+
+        for result in fuzzer.fuzz_iter():
+            if seen is not None:
+                if result.domain in seen:
+                    continue
+                seen.add(result.domain)
+
+            yield source_domain, result.fuzzer, result.domain
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Homoglyph candidate generation.
+
+The original dnstwist algorithm slides every window size over every window
+start and str.replace()s each glyph-able character within the window, which
+is roughly cubic in the domain length.
+
+Every candidate it produces is the domain with *all* the occurrences of one
+character c, within some window, swapped for one of c's glyphs. That is the
+same as swapping a contiguous run (in order of appearance) of c's
+occurrences, as long as the run doesn't span the whole domain (windows are
+never the full length of the domain).
+
+So this module builds each run's candidates directly. Runs are visited in
+order of (span, start) - the first window that the original algorithm would
+have produced the candidate in - which keeps the output order, and so any
+budgeted prefix of it, identical to the original.
+"""
+import heapq
+
+
+_GLYPHS = {
+    'a': [u'à', u'á', u'â', u'ã', u'ä', u'å', u'ɑ', u'а', u'ạ', u'ǎ', u'ă', u'ȧ', u'ӓ'],
+    'b': ['d', 'lb', 'ib', u'ʙ', u'Ь', u'b̔', u'ɓ', u'Б'],
+    'c': [u'ϲ', u'с', u'ƈ', u'ċ', u'ć', u'ç'],
+    'd': ['b', 'cl', 'dl', 'di', u'ԁ', u'ժ', u'ɗ', u'đ'],
+    'e': [u'é', u'ê', u'ë', u'ē', u'ĕ', u'ě', u'ė', u'е', u'ẹ', u'ę', u'є', u'ϵ', u'ҽ'],
+    'f': [u'Ϝ', u'ƒ', u'Ғ'],
+    'g': ['q', u'ɢ', u'ɡ', u'Ԍ', u'Ԍ', u'ġ', u'ğ', u'ց', u'ǵ', u'ģ'],
+    'h': ['lh', 'ih', u'һ', u'հ', u'Ꮒ', u'н'],
+    'i': ['1', 'l', u'Ꭵ', u'í', u'ï', u'ı', u'ɩ', u'ι', u'ꙇ', u'ǐ', u'ĭ', u'ì'],
+    'j': [u'ј', u'ʝ', u'ϳ', u'ɉ'],
+    'k': ['lk', 'ik', 'lc', u'κ', u'ⲕ', u'κ'],
+    'l': ['1', 'i', u'ɫ', u'ł'],
+    'm': ['n', 'nn', 'rn', 'rr', u'ṃ', u'ᴍ', u'м', u'ɱ'],
+    'n': ['m', 'r', u'ń'],
+    'o': ['0', u'Ο', u'ο', u'О', u'о', u'Օ', u'ȯ', u'ọ', u'ỏ', u'ơ', u'ó', u'ö', u'ӧ'],
+    'p': [u'ρ', u'р', u'ƿ', u'Ϸ', u'Þ'],
+    'q': ['g', u'զ', u'ԛ', u'գ', u'ʠ'],
+    'r': [u'ʀ', u'Г', u'ᴦ', u'ɼ', u'ɽ'],
+    's': [u'Ⴝ', u'Ꮪ', u'ʂ', u'ś', u'ѕ'],
+    't': [u'τ', u'т', u'ţ'],
+    'u': [u'μ', u'υ', u'Ս', u'ս', u'ц', u'ᴜ', u'ǔ', u'ŭ'],
+    'v': [u'ѵ', u'ν', u'v̇'],
+    'w': ['vv', u'ѡ', u'ա', u'ԝ'],
+    'x': [u'х', u'ҳ', u'ẋ'],
+    'y': [u'ʏ', u'γ', u'у', u'Ү', u'ý'],
+    'z': [u'ʐ', u'ż', u'ź', u'ʐ', u'ᴢ']
+}
+
+
+def _unique(glyphs):
+    """De-duplicate glyphs, keeping the first-seen order."""
+    seen = set()
+    return tuple(g for g in glyphs if not (g in seen or seen.add(g)))
+
+
+# The glyphs for each character, with the few duplicates removed.
+GLYPHS = dict((c, _unique(glyphs)) for (c, glyphs) in _GLYPHS.items())
+
+
+def homoglyphs(domain, budget=None, seen=None):
+    """Yield the homoglyph candidates for a domain, in a deterministic order.
+
+    Stops after budget candidates if budget is not None.
+
+    Swapping single-character glyphs can never produce the same candidate
+    twice - the candidates differ from the domain at different positions -
+    so only candidates using multi-character glyphs (which can collide, for
+    instance 'rn' vs 'm') need de-duplicating, via a private set.
+
+    If a seen filter (see dedupe.py) is passed it is shared with the other
+    fuzzers, so every candidate is checked against, and added to, it.
+    """
+    if budget is not None and budget <= 0:
+        return
+
+    shared = seen is not None
+    if not shared:
+        seen = set()
+
+    length = len(domain)
+
+    occurrences = {}
+    for (i, char) in enumerate(domain):
+        if char in GLYPHS:
+            occurrences.setdefault(char, []).append(i)
+
+    # Each chain of runs starts at one occurrence and is extended one
+    # occurrence at a time - so the span grows monotonically.
+    runs = [(1, start, char, s)
+            for (char, positions) in occurrences.items()
+            for (s, start) in enumerate(positions)]
+    heapq.heapify(runs)
+
+    yielded = 0
+    while runs:
+        span, start, char, last = heapq.heappop(runs)
+
+        # Every span in the heap is now at least this long.
+        if span >= length:
+            return
+
+        window = domain[start:start + span]
+        prefix = domain[:start]
+        suffix = domain[start + span:]
+
+        for glyph in GLYPHS[char]:
+            candidate = prefix + window.replace(char, glyph) + suffix
+
+            if shared or len(glyph) > 1:
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+
+            yield candidate
+            yielded += 1
+
+            if budget is not None and yielded >= budget:
+                return
+
+        positions = occurrences[char]
+        if last + 1 < len(positions):
+            heapq.heappush(runs, (
+                positions[last + 1] - start + 1, start, char, last + 1
+            ))
@@ -0,0 +1,59 @@
+"""Keyboard layouts, and the merged neighbouring-key table built from them.
+
+Layouts are plain data - a map of each key to the keys around it - so adding
+one is a matter of adding it to LAYOUTS (and to DEFAULT_LAYOUTS to use it by
+default).
+
+The table is compiled once, at import, into a single map of each character to
+its neighbours across all the default layouts, in first-seen order with the
+duplicates removed.
+"""
+import collections
+
+
+LAYOUTS = collections.OrderedDict([
+    ('qwerty', {
+        '1': '2q', '2': '3wq1', '3': '4ew2', '4': '5re3', '5': '6tr4', '6': '7yt5', '7': '8uy6', '8': '9iu7', '9': '0oi8', '0': 'po9',
+        'q': '12wa', 'w': '3esaq2', 'e': '4rdsw3', 'r': '5tfde4', 't': '6ygfr5', 'y': '7uhgt6', 'u': '8ijhy7', 'i': '9okju8', 'o': '0plki9', 'p': 'lo0',
+        'a': 'qwsz', 's': 'edxzaw', 'd': 'rfcxse', 'f': 'tgvcdr', 'g': 'yhbvft', 'h': 'ujnbgy', 'j': 'ikmnhu', 'k': 'olmji', 'l': 'kop',
+        'z': 'asx', 'x': 'zsdc', 'c': 'xdfv', 'v': 'cfgb', 'b': 'vghn', 'n': 'bhjm', 'm': 'njk'
+    }),
+    ('qwertz', {
+        '1': '2q', '2': '3wq1', '3': '4ew2', '4': '5re3', '5': '6tr4', '6': '7zt5', '7': '8uz6', '8': '9iu7', '9': '0oi8', '0': 'po9',
+        'q': '12wa', 'w': '3esaq2', 'e': '4rdsw3', 'r': '5tfde4', 't': '6zgfr5', 'z': '7uhgt6', 'u': '8ijhz7', 'i': '9okju8', 'o': '0plki9', 'p': 'lo0',
+        'a': 'qwsy', 's': 'edxyaw', 'd': 'rfcxse', 'f': 'tgvcdr', 'g': 'zhbvft', 'h': 'ujnbgz', 'j': 'ikmnhu', 'k': 'olmji', 'l': 'kop',
+        'y': 'asx', 'x': 'ysdc', 'c': 'xdfv', 'v': 'cfgb', 'b': 'vghn', 'n': 'bhjm', 'm': 'njk'
+    }),
+    ('azerty', {
+        '1': '2a', '2': '3za1', '3': '4ez2', '4': '5re3', '5': '6tr4', '6': '7yt5', '7': '8uy6', '8': '9iu7', '9': '0oi8', '0': 'po9',
+        'a': '2zq1', 'z': '3esqa2', 'e': '4rdsz3', 'r': '5tfde4', 't': '6ygfr5', 'y': '7uhgt6', 'u': '8ijhy7', 'i': '9okju8', 'o': '0plki9', 'p': 'lo0m',
+        'q': 'zswa', 's': 'edxwqz', 'd': 'rfcxse', 'f': 'tgvcdr', 'g': 'yhbvft', 'h': 'ujnbgy', 'j': 'iknhu', 'k': 'olji', 'l': 'kopm', 'm': 'lp',
+        'w': 'sxq', 'x': 'zsdc', 'c': 'xdfv', 'v': 'cfgb', 'b': 'vghn', 'n': 'bhj'
+    }),
+    ('dvorak', {
+        '1': '2', '2': '31', '3': '42', '4': '5p3', '5': '6yp4', '6': '7fy5', '7': '8gf6', '8': '9cg7', '9': '0rc8', '0': 'lr9',
+        'p': '5yue4', 'y': '6fiup5', 'f': '7gdiy6', 'g': '8chdf7', 'c': '9rthg8', 'r': '0lntc9', 'l': 'snr0',
+        'a': 'o', 'o': 'eqa', 'e': 'pujqo', 'u': 'yikjep', 'i': 'fdxkuy', 'd': 'ghbxif', 'h': 'ctmbdg', 't': 'rnwmhc', 'n': 'lsvwtr', 's': 'zvnl',
+        'q': 'ejo', 'j': 'ukqe', 'k': 'ixju', 'x': 'dbki', 'b': 'hmxd', 'm': 'twbh', 'w': 'nvmt', 'v': 'szwn', 'z': 'vs'
+    }),
+])
+
+DEFAULT_LAYOUTS = ('qwerty', 'qwertz', 'azerty')
+
+
+def neighbours(layouts=DEFAULT_LAYOUTS):
+    """Merge the named layouts into a map of each character to a string of
+    its distinct neighbouring keys, in layout then key order.
+    """
+    merged = {}
+    for name in layouts:
+        for (char, keys) in LAYOUTS[name].items():
+            existing = merged.get(char, '')
+            merged[char] = existing + ''.join(
+                c for (i, c) in enumerate(keys)
+                if c != char and c not in existing and c not in keys[:i]
+            )
+    return merged
+
+
+NEIGHBOURS = neighbours()
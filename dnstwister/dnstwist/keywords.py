@@ -0,0 +1,74 @@
+"""Keyword index for the dictionary fuzzer.
+
+The keyword list (database/keywords.txt) is loaded once, at import, into a
+KeywordIndex - an immutable array of the keywords in rank order plus a set
+for membership tests - which is shared by every fuzzer, and so every thread.
+"""
+import os.path
+
+
+DB_PATH = os.path.join(
+    'dnstwister',
+    'dnstwist',
+    'database',
+    'keywords.txt'
+)
+
+# The default number of dictionary candidates per domain.
+MAX = 500
+
+
+def load_keywords(path):
+    """Return a tuple of the keywords in a file, in file order."""
+    keywords = []
+    with open(path, 'rb') as keywords_file:
+        for line in keywords_file:
+            line = line.strip().lower()
+            if line == '' or line.startswith('#') or line in keywords:
+                continue
+            keywords.append(line)
+    return tuple(keywords)
+
+
+class KeywordIndex(object):
+    """The keywords, ranked, with fast affix lookups."""
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        self._set = frozenset(self.keywords)
+        self._longest = max([len(k) for k in self.keywords] or [0])
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def affixes(self, label):
+        """Return the label with each keyword it starts or ends with (and
+        any joining hyphen) removed - 'paypal' for 'paypal-login'.
+        """
+        bases = []
+        for length in range(1, min(self._longest, len(label) - 1) + 1):
+            for (keyword, base) in ((label[:length], label[length:]),
+                                    (label[-length:], label[:-length])):
+                if keyword in self._set:
+                    base = base.strip('-')
+                    if base and base not in bases:
+                        bases.append(base)
+        return bases
+
+    def combinations(self, label):
+        """Yield (position, candidate) for each keyword in rank order,
+        suffixed, prefixed and hyphen-joined to the label and each of its
+        affix bases (see affixes()) in turn - so the bases are reached
+        however few candidates are taken.
+        """
+        bases = [label] + self.affixes(label)
+        variants = len(bases) * 4
+        for (i, keyword) in enumerate(self.keywords):
+            for (b, base) in enumerate(bases):
+                position = i * variants + b * 4
+                yield position, base + keyword
+                yield position + 1, base + '-' + keyword
+                yield position + 2, keyword + base
+                yield position + 3, keyword + '-' + base
+
+
+KEYWORDS = KeywordIndex(load_keywords(DB_PATH))
@@ -0,0 +1,110 @@
+"""A small, thread-safe, least-recently-used cache.
+
+Entries are weighed (1 by default) and the least-recently-used entries are
+evicted once the total weight passes the maximum, so the cache can be bounded
+by something more meaningful than the entry count.
+"""
+import collections
+import threading
+
+
+MISSING = object()
+
+
+def _unit_weight(key, value):
+    """Every entry weighs 1."""
+    return 1
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache bounded by total entry weight."""
+    def __init__(self, max_weight, weigh=_unit_weight):
+        self._max_weight = max_weight
+        self._weigh = weigh
+        self._data = collections.OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def weight(self):
+        """The current total weight of the entries."""
+        return self._weight
+
+    @property
+    def max_weight(self):
+        """The maximum total weight before eviction."""
+        return self._max_weight
+
+    def get(self, key, default=MISSING):
+        """Return the value for a key, or default (MISSING) on a miss."""
+        with self._lock:
+            try:
+                weight, value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = (weight, value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting least-recently-used entries if required.
+
+        Values that weigh more than the whole cache are not stored.
+        """
+        weight = self._weigh(key, value)
+        with self._lock:
+            self._remove(key)
+            if weight > self._max_weight:
+                return
+            self._data[key] = (weight, value)
+            self._weight += weight
+            while self._weight > self._max_weight:
+                _, (old_weight, _) = self._data.popitem(last=False)
+                self._weight -= old_weight
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove a key, if present."""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        """Remove a key - the lock must be held."""
+        try:
+            weight, _ = self._data.pop(key)
+        except KeyError:
+            return
+        self._weight -= weight
+
+    def clear(self):
+        """Empty the cache, resetting the counters."""
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return a dict of the cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'weight': self._weight,
+            'max_weight': self._max_weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / float(lookups), 4) if lookups else None,
+        }
@@ -0,0 +1,136 @@
+"""Public suffix index for dnstwister.
+
+The effective_tld_names.dat (Public Suffix List) database is parsed once, at
+import, into a trie keyed on reversed domain labels. Lookups then cost one
+dict probe per label rather than a scan of the ~11k rules.
+
+Full PSL semantics are supported, including wildcard ('*.ck') and exception
+('!www.ck') rules - see https://publicsuffix.org/list/ for the algorithm.
+"""
+import os.path
+
+
+DB_PATH = os.path.join(
+    'dnstwister',
+    'dnstwist',
+    'database',
+    'effective_tld_names.dat'
+)
+
+if not os.path.exists(DB_PATH):
+    raise Exception('TLD database is required!')
+
+# Markers stored under the None key of a trie node, None can never be a
+# domain label.
+_RULE = None
+_NORMAL = 1
+_EXCEPTION = 2
+
+
+def load_rules(path, private=True):
+    """Return a tuple of the Unicode rules in a Public Suffix List file.
+
+    Pass private=False for just the ICANN section's rules.
+    """
+    rules = []
+    with open(path, 'rb') as psl_file:
+        for line in psl_file:
+            line = line.decode('utf-8').strip()
+            if not private and line == '// ===BEGIN PRIVATE DOMAINS===':
+                break
+            if line == '' or line.startswith('//'):
+                continue
+            rules.append(line.split()[0].lower())
+    return tuple(rules)
+
+
+class PublicSuffixList(object):
+    """A reversed-label trie of public suffix rules."""
+    def __init__(self, rules):
+        self._root = {}
+        for rule in rules:
+            self.add_rule(rule)
+
+    def add_rule(self, rule):
+        """Add a rule, plus its IDNA form if the rule is Unicode."""
+        self._add(rule)
+        try:
+            rule.encode('ascii')
+        except UnicodeError:
+            try:
+                self._add('.'.join(
+                    label if label == '*' else label.encode('idna')
+                    for label
+                    in rule.split('.')
+                ))
+            except UnicodeError:
+                pass
+
+    def _add(self, rule):
+        """Insert a single rule into the trie."""
+        kind = _NORMAL
+        if rule.startswith('!'):
+            kind = _EXCEPTION
+            rule = rule[1:]
+
+        node = self._root
+        for label in reversed(rule.split('.')):
+            node = node.setdefault(label, {})
+        node[_RULE] = kind
+
+    def suffix_length(self, domain, strict=False):
+        """Return the number of labels in the public suffix of a domain.
+
+        If no rule matches the implicit '*' rule applies (the last label is
+        the suffix) unless strict is True, in which case None is returned.
+        """
+        labels = domain.lower().split('.')
+        node = self._root
+        matched = 0
+
+        for depth, label in enumerate(reversed(labels), 1):
+            wildcard = node.get('*')
+            if wildcard is not None and wildcard.get(_RULE) == _NORMAL:
+                matched = depth
+
+            node = node.get(label)
+            if node is None:
+                break
+
+            kind = node.get(_RULE)
+            if kind == _EXCEPTION:
+                return depth - 1
+            elif kind == _NORMAL:
+                matched = depth
+
+        if matched == 0:
+            return None if strict else 1
+
+        return matched
+
+    def public_suffix(self, domain, strict=False):
+        """Return the public suffix of a domain, or None."""
+        length = self.suffix_length(domain, strict)
+        if length is None or length == 0:
+            return
+        return '.'.join(domain.split('.')[-length:])
+
+    def split(self, domain, strict=False):
+        """Split a domain into (name, public suffix).
+
+        Returns None if the domain has no name part, or if strict and no rule
+        matches.
+        """
+        length = self.suffix_length(domain, strict)
+        if length is None:
+            return
+
+        labels = domain.split('.')
+        if length == 0 or length >= len(labels):
+            return
+
+        return '.'.join(labels[:-length]), '.'.join(labels[-length:])
+
+
+RULES = load_rules(DB_PATH)
+PSL = PublicSuffixList(RULES)
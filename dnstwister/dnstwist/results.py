@@ -0,0 +1,226 @@
+"""Compact storage for fuzz results.
+
+A fuzz of a long domain produces thousands of results, and storing each one
+as a dict costs a few hundred bytes before the domain string is even counted.
+FuzzResultSet keeps the results in parallel columns instead:
+
+ * Fuzzer tags are interned to a small integer id, stored one byte per
+   result.
+ * Domains are stored in a plain list.
+ * Derived columns (hex encodings etc) are only computed for a result when
+   it is first read.
+
+Indexing a FuzzResultSet returns a FuzzResult, a slotted read-only view that
+behaves like the {'fuzzer': ..., 'domain-name': ...} dict it replaces, so
+templates, the API and existing callers don't need to change.
+"""
+import array
+
+
+FUZZER = 'fuzzer'
+DOMAIN_NAME = 'domain-name'
+
+_MISSING = object()
+
+
+class FuzzResult(object):
+    """A read-only, dict-compatible view of one result in a FuzzResultSet.
+    """
+    __slots__ = ('_results', '_index')
+
+    def __init__(self, results, index):
+        self._results = results
+        self._index = index
+
+    @property
+    def fuzzer(self):
+        return self._results.fuzzer_at(self._index)
+
+    @property
+    def domain(self):
+        return self._results.domain_at(self._index)
+
+    def keys(self):
+        return self._results.keys()
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        return self._results.value_at(self._index, key)
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, FuzzResult):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        if isinstance(other, FuzzResult):
+            other = dict(other.items())
+        return dict(self.items()) < other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class FuzzResultSet(object):
+    """An ordered, append-only collection of fuzz results.
+
+    Can be built from (and compared to) a sequence of the result dicts.
+    """
+    def __init__(self, results=()):
+        self._tag_names = []
+        self._tag_ids = {}
+        self._tags = array.array('B')
+        self._domains = []
+        self._columns = {}
+        self._column_names = []
+        self.extend(results)
+
+    def _tag_id(self, fuzzer):
+        try:
+            return self._tag_ids[fuzzer]
+        except KeyError:
+            tag_id = len(self._tag_names)
+            self._tag_names.append(intern(fuzzer) if isinstance(fuzzer, str)
+                                   else fuzzer)
+            self._tag_ids[fuzzer] = tag_id
+            return tag_id
+
+    def append(self, fuzzer, domain):
+        """Add a result."""
+        self._tags.append(self._tag_id(fuzzer))
+        self._domains.append(domain)
+        for (_, values) in self._columns.values():
+            if values is not None:
+                values.append(_MISSING)
+
+    def extend(self, results):
+        """Add results - FuzzResults, result dicts or (fuzzer, domain)
+        tuples.
+        """
+        if isinstance(results, FuzzResultSet):
+            for (fuzzer, domain) in results.pairs():
+                self.append(fuzzer, domain)
+            return
+
+        for result in results:
+            if isinstance(result, tuple):
+                self.append(*result)
+            else:
+                self.append(result[FUZZER], result[DOMAIN_NAME])
+
+    def add_column(self, name, func):
+        """Add a derived column, computed as func(domain) when first read.
+        """
+        if name in (FUZZER, DOMAIN_NAME):
+            raise ValueError('Cannot replace the {} column'.format(name))
+        if name not in self._columns:
+            self._column_names.append(name)
+        self._columns[name] = (func, None)
+
+    def keys(self):
+        """The keys of every result."""
+        return [DOMAIN_NAME, FUZZER] + self._column_names
+
+    def pairs(self):
+        """Iterate the (fuzzer, domain) pairs."""
+        names = self._tag_names
+        for (tag, domain) in zip(self._tags, self._domains):
+            yield names[tag], domain
+
+    def fuzzer_at(self, index):
+        return self._tag_names[self._tags[index]]
+
+    def domain_at(self, index):
+        return self._domains[index]
+
+    def value_at(self, index, key):
+        """Return the value of a column for a result."""
+        if key == DOMAIN_NAME:
+            return self._domains[index]
+        if key == FUZZER:
+            return self.fuzzer_at(index)
+
+        try:
+            func, values = self._columns[key]
+        except KeyError:
+            raise KeyError(key)
+
+        if values is None:
+            values = [_MISSING] * len(self._domains)
+            self._columns[key] = (func, values)
+
+        value = values[index]
+        if value is _MISSING:
+            value = func(self._domains[index])
+            values[index] = value
+        return value
+
+    def __len__(self):
+        return len(self._domains)
+
+    def __iter__(self):
+        for index in xrange(len(self._domains)):
+            yield FuzzResult(self, index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            subset = FuzzResultSet()
+            subset._tag_names = list(self._tag_names)
+            subset._tag_ids = dict(self._tag_ids)
+            subset._tags = self._tags[index]
+            subset._domains = self._domains[index]
+            subset._column_names = list(self._column_names)
+            for (name, (func, values)) in self._columns.items():
+                subset._columns[name] = (
+                    func, values[index] if values is not None else None
+                )
+            return subset
+
+        if index < 0:
+            index += len(self._domains)
+        if not 0 <= index < len(self._domains):
+            raise IndexError('FuzzResultSet index out of range')
+        return FuzzResult(self, index)
+
+    def __eq__(self, other):
+        try:
+            return (len(self) == len(other) and
+                    all(a == b for (a, b) in zip(self, other)))
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'FuzzResultSet({!r})'.format(list(self))
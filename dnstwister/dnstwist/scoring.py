@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Similarity scoring of fuzz candidates.
+
+Each candidate is scored between 0 and 1 against the original domain, from:
+
+ * Its Damerau-Levenshtein (optimal string alignment) distance.
+ * Its visual confusability - how many of those edits are explained by the
+   homoglyph table, by comparing "skeletons" of the two domains where every
+   glyph has been mapped to a canonical character.
+ * Its keyboard distance - how many of those edits are neighbouring keys.
+
+Candidates are nearly always a small edit of the original, so the common
+prefix and suffix are stripped before anything quadratic is done. Scoring
+a batch (see Scorer.scores()) computes everything about the original once,
+and each distance once per distinct pair of stripped differences - most
+candidates are the same one or two character edit at different positions.
+The original domain itself scores 1.
+"""
+import homoglyphs
+import keyboards
+
+
+EDIT_WEIGHT = 0.5
+VISUAL_WEIGHT = 0.3
+KEYBOARD_WEIGHT = 0.2
+
+
+def _glyph_classes():
+    """Return a map of each glyph (and glyph-able character) to a canonical
+    character for its class of confusable characters, and the multi-character
+    glyphs, longest first.
+    """
+    parents = {}
+
+    def find(char):
+        while parents.get(char, char) != char:
+            char = parents[char]
+        return char
+
+    multi = []
+    for (char, glyphs) in sorted(homoglyphs.GLYPHS.items()):
+        for glyph in glyphs:
+            if len(glyph) > 1:
+                multi.append((glyph, char))
+                continue
+            (first, second) = sorted((find(char), find(glyph)))
+            parents[second] = first
+
+    classes = dict((char, find(char)) for char in parents)
+    multi = [(glyph, classes.get(char, char))
+             for (glyph, char)
+             in sorted(multi, key=lambda pair: -len(pair[0]))]
+    return classes, multi
+
+
+_CLASSES, _MULTI_GLYPHS = _glyph_classes()
+_TRANSLATE = dict((ord(glyph), unicode(char)) for (glyph, char) in _CLASSES.items())
+
+
+def skeleton(domain):
+    """The domain with every glyph mapped to its class' character."""
+    domain = unicode(domain)
+    for (glyph, char) in _MULTI_GLYPHS:
+        if glyph in domain:
+            domain = domain.replace(glyph, char)
+    return domain.translate(_TRANSLATE)
+
+
+def _strip_common(first, second):
+    """Return first and second without their common prefix and suffix, and
+    the length of that prefix.
+    """
+    prefix = 0
+    shortest = min(len(first), len(second))
+    while prefix < shortest and first[prefix] == second[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while (suffix < shortest - prefix and
+           first[-1 - suffix] == second[-1 - suffix]):
+        suffix += 1
+
+    return (first[prefix:len(first) - suffix],
+            second[prefix:len(second) - suffix],
+            prefix)
+
+
+def distance(first, second):
+    """The Damerau-Levenshtein (optimal string alignment) distance."""
+    first, second, _ = _strip_common(first, second)
+    return _stripped_distance(first, second)
+
+
+def _stripped_distance(first, second):
+    """The distance between strings without a common prefix or suffix."""
+    if not first or not second:
+        return len(first) + len(second)
+
+    before = None
+    row = range(len(second) + 1)
+    for i in range(1, len(first) + 1):
+        previous, row = row, [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i-1] == second[j-1] else 1
+            row[j] = min(row[j-1] + 1, previous[j] + 1, previous[j-1] + cost)
+            if (i > 1 and j > 1 and first[i-1] == second[j-2] and
+                    first[i-2] == second[j-1]):
+                row[j] = min(row[j], before[j-2] + cost)
+        before = previous
+    return row[-1]
+
+
+class Scorer(object):
+    """Scores candidates against one original domain."""
+    def __init__(self, domain, neighbours=keyboards.NEIGHBOURS):
+        self.domain = domain
+        self.neighbours = neighbours
+        self._skeleton = skeleton(domain)
+
+    @staticmethod
+    def _distance(first, second, memo):
+        """The distance between stripped strings, memoised in memo."""
+        try:
+            return memo[first, second]
+        except KeyError:
+            edits = memo[first, second] = _stripped_distance(first, second)
+            return edits
+
+    def _keyboard(self, original, changed, prefix):
+        """The fraction of the edits (original to changed, after prefix) that
+        are neighbouring keys.
+        """
+        if len(original) == len(changed):
+            adjacent = sum(1 for (a, b) in zip(original, changed)
+                           if a != b and b in self.neighbours.get(a, ''))
+            return adjacent / float(max(sum(1 for (a, b)
+                                            in zip(original, changed)
+                                            if a != b), 1))
+
+        # A single insertion, next to one of its neighbours.
+        if len(original) == 0 and len(changed) == 1:
+            around = self.domain[max(prefix - 1, 0):prefix + 1]
+            return 1.0 if any(changed in self.neighbours.get(char, '')
+                              for char
+                              in around) else 0.0
+
+        return 0.0
+
+    def score(self, candidate, memo=None):
+        """Return the candidate's score, between 0 and 1.
+
+        memo is a dict of the distances already computed, shared across a
+        batch.
+        """
+        if memo is None:
+            memo = {}
+
+        original, changed, prefix = _strip_common(self.domain, candidate)
+        edits = self._distance(original, changed, memo)
+        if edits == 0:
+            return 1.0
+
+        glyphs, changed_glyphs, _ = _strip_common(self._skeleton,
+                                                  skeleton(candidate))
+        glyph_edits = self._distance(glyphs, changed_glyphs, memo)
+        visual = (edits - min(glyph_edits, edits)) / float(edits)
+
+        return (EDIT_WEIGHT / (1 + edits) +
+                VISUAL_WEIGHT * visual +
+                KEYBOARD_WEIGHT * self._keyboard(original, changed, prefix))
+
+    def scores(self, candidates):
+        """Return the scores for a batch of candidates, computing each
+        distinct distance once.
+        """
+        memo = {}
+        return [self.score(candidate, memo) for candidate in candidates]
@@ -0,0 +1,146 @@
+"""Ranked top-level domains, for the TLD-swap fuzzer.
+
+The ICANN section of the Public Suffix List is indexed once, at import, into
+a global ranking of the top-level domains per ranking strategy, plus a map of
+each top-level domain to the public suffixes beneath it (co.uk, org.uk etc).
+
+The strategies are:
+
+ * 'popularity' - the most registered TLDs first.
+ * 'abuse' - the cheap TLDs most used for abusive registrations first.
+ * 'proximity' - the suffixes closest to the original first: its siblings
+   under the same TLD (org.uk for co.uk), and TLDs one typo away from its
+   own (co, cm and om for com). Then as for 'popularity'.
+
+Each ranking ends with the rest of the TLDs, alphabetically.
+"""
+import itertools
+import string
+
+import publicsuffix
+
+
+POPULARITY = 'popularity'
+ABUSE = 'abuse'
+PROXIMITY = 'proximity'
+
+RANKINGS = (POPULARITY, ABUSE, PROXIMITY)
+
+# The default number of swapped TLDs per domain.
+TOP_N = 50
+
+# By registrations, most first.
+POPULAR = (
+    'com', 'cn', 'de', 'net', 'uk', 'org', 'nl', 'ru', 'br', 'au', 'fr',
+    'eu', 'it', 'info', 'xyz', 'ca', 'top', 'in', 'es', 'pl', 'ch', 'online',
+    'jp', 'be', 'se', 'co', 'site', 'dk', 'at', 'us', 'io', 'biz', 'me',
+    'cz', 'mx', 'ar', 'tw', 'kr', 'hu', 'gr', 'no', 'fi', 'pt', 'ir', 'za',
+    'shop', 'app', 'store', 'club', 'vip',
+)
+
+# Cheap TLDs, by their share of abusive registrations, most first.
+ABUSED = (
+    'tk', 'ml', 'ga', 'cf', 'gq', 'top', 'xyz', 'icu', 'buzz', 'cyou',
+    'rest', 'bond', 'sbs', 'cfd', 'fit', 'click', 'link', 'work', 'support',
+    'live', 'shop', 'online', 'site', 'club', 'quest', 'monster', 'loan',
+    'gdn', 'ws', 'pw',
+)
+
+_CHARS = string.ascii_lowercase + string.digits
+
+
+def _ascii_suffixes(rules):
+    """The plain ASCII suffixes from a set of rules."""
+    for rule in rules:
+        if rule.startswith('*') or rule.startswith('!'):
+            continue
+        try:
+            yield rule.encode('ascii')
+        except UnicodeError:
+            pass
+
+
+def _index(rules):
+    """Return the (sorted) top-level domains and a map of each to the
+    two-label suffixes beneath it.
+    """
+    top_level = set()
+    siblings = {}
+    for suffix in _ascii_suffixes(rules):
+        labels = suffix.split('.')
+        if len(labels) == 1:
+            top_level.add(suffix)
+        elif len(labels) == 2:
+            siblings.setdefault(labels[1], []).append(suffix)
+
+    return (
+        tuple(sorted(top_level)),
+        dict((tld, tuple(sorted(suffixes)))
+             for (tld, suffixes)
+             in siblings.items()),
+    )
+
+
+TOP_LEVEL, SIBLINGS = _index(publicsuffix.load_rules(publicsuffix.DB_PATH,
+                                                     private=False))
+
+_TOP_LEVEL_SET = frozenset(TOP_LEVEL)
+
+
+def _ranking(*preferred):
+    """The top-level domains, preferred ones first."""
+    ranked = []
+    for tld in itertools.chain(*(preferred + (TOP_LEVEL,))):
+        if tld in _TOP_LEVEL_SET and tld not in ranked:
+            ranked.append(tld)
+    return tuple(ranked)
+
+
+_RANKED = {
+    POPULARITY: _ranking(POPULAR, ABUSED),
+    ABUSE: _ranking(ABUSED, POPULAR),
+    PROXIMITY: _ranking(POPULAR, ABUSED),
+}
+
+_RANK = dict((tld, i) for (i, tld) in enumerate(_RANKED[POPULARITY]))
+
+
+def _typos(tld):
+    """The top-level domains one omission, replacement, transposition or
+    insertion away from tld, most popular first.
+    """
+    typos = set()
+    for i in range(len(tld) + 1):
+        typos.add(tld[:i] + tld[i+1:])
+        typos.add(tld[:i] + tld[i+1:i+2] + tld[i:i+1] + tld[i+2:])
+        for c in _CHARS:
+            typos.add(tld[:i] + c + tld[i+1:])
+            typos.add(tld[:i] + c + tld[i:])
+    typos.discard(tld)
+    return sorted(typos & _TOP_LEVEL_SET, key=_RANK.get)
+
+
+def ranked(tld, ranking=PROXIMITY, top_n=TOP_N):
+    """Return up to top_n public suffixes to swap for tld, best first."""
+    if ranking not in _RANKED:
+        raise ValueError('Unknown TLD ranking: {}'.format(ranking))
+
+    candidates = _RANKED[ranking]
+    if ranking == PROXIMITY:
+        last = tld.rsplit('.', 1)[-1]
+        candidates = itertools.chain(
+            (last,),
+            SIBLINGS.get(last, ()),
+            _typos(last),
+            candidates,
+        )
+
+    swaps = []
+    seen = set([tld])
+    for suffix in candidates:
+        if len(swaps) >= top_n:
+            break
+        if suffix not in seen:
+            seen.add(suffix)
+            swaps.append(suffix)
+    return swaps
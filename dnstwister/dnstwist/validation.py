@@ -0,0 +1,165 @@
+"""Domain validation for dnstwister.
+
+Validation runs on every generated candidate so it is the hot path of
+fuzzing. It is split into:
+
+ * A pure-ASCII fast path - ASCII domains that match VALID_DOMAIN_RE and
+   have no '--' (so can't be, or look like, an IDNA A-label) are already
+   what IDNA encoding would return, so IDNA is skipped entirely.
+ * A bounded LRU of IDNA encodings for everything else, after a cheap
+   check for non-ASCII domains that can only be too long once encoded.
+ * A "relaxed" mode that skips the (slow) per-codepoint IDNA label checks,
+   used when bulk-fuzzing as every domain is validated again, strictly,
+   before it is actually queried. This replaces monkeypatching
+   idna.core.check_label, which wasn't thread safe.
+"""
+import re
+
+import idna
+
+import lru
+
+
+VALID_DOMAIN_RE = re.compile(
+    r'(?=^.{4,253}$)(^((?!-)[a-zA-Z0-9-]{1,63}(?<!-)\.)+[a-zA-Z]{2,63}\.?$)',
+    flags=re.IGNORECASE
+)
+
+# The label separators idna.encode() splits on.
+DOTS_RE = re.compile(u'[\u002e\u3002\uff0e\uff61]')
+
+CACHE_SIZE = 10000
+
+INVALID = None
+
+
+def relaxed_encode(domain):
+    """IDNA-encode a domain the same way as idna.encode(), without the
+    per-codepoint label checks.
+    """
+    if isinstance(domain, str):
+        domain = domain.decode('ascii')
+
+    labels = DOTS_RE.split(domain)
+    if not labels or labels == ['']:
+        raise idna.IDNAError('Empty domain')
+
+    trailing_dot = False
+    if labels[-1] == '':
+        del labels[-1]
+        trailing_dot = True
+
+    result = []
+    for label in labels:
+        if label == '':
+            raise idna.IDNAError('Empty label')
+        try:
+            encoded = label.encode('ascii')
+            if encoded.lower().startswith('xn--'):
+                # Must at least be decodable.
+                encoded[4:].decode('punycode')
+        except UnicodeEncodeError:
+            encoded = 'xn--' + label.encode('punycode')
+        if len(encoded) > 63:
+            raise idna.IDNAError('Label too long')
+        result.append(encoded)
+
+    if trailing_dot:
+        result.append('')
+
+    encoded_domain = '.'.join(result)
+    if len(encoded_domain) > (254 if trailing_dot else 253):
+        raise idna.IDNAError('Domain too long')
+
+    return encoded_domain
+
+
+def too_long_to_encode(domain):
+    """Return True if a non-ASCII domain is certainly too long to be valid
+    once IDNA-encoded.
+
+    Punycode is never shorter than its input, so an encoded non-ASCII label
+    is at least 4 ('xn--') characters longer than the label itself. This is
+    much cheaper than finding out the hard way - long bot-submitted domains
+    produce thousands of such candidates.
+    """
+    total = -1
+    for label in DOTS_RE.split(domain):
+        length = len(label)
+        try:
+            label.encode('ascii')
+        except UnicodeError:
+            length += 4
+        if length > 63:
+            return True
+        total += length + 1
+    return total > 254
+
+
+class DomainValidator(object):
+    """Validate domains - including unicode domains.
+
+    Thread safe - the only shared state is the (locked) encoding cache.
+    """
+    def __init__(self, relaxed=False, cache_size=CACHE_SIZE):
+        self._relaxed = relaxed
+        self._encode = relaxed_encode if relaxed else idna.encode
+        self._cache = lru.LRUCache(cache_size)
+
+    @property
+    def relaxed(self):
+        """Whether the IDNA label checks are skipped."""
+        return self._relaxed
+
+    @property
+    def cache(self):
+        """The IDNA encoding cache."""
+        return self._cache
+
+    def encode(self, domain):
+        """Return the IDNA encoding of a domain, or None if unencodable."""
+        encoded = self._cache.get(domain)
+        if encoded is lru.MISSING:
+            try:
+                encoded = self._encode(domain)
+            except (UnicodeError, idna.IDNAError):
+                encoded = INVALID
+            self._cache.set(domain, encoded)
+        return encoded
+
+    def is_valid(self, domain):
+        """Return True if the domain is valid, False otherwise."""
+        try:
+            if len(domain) > 255:
+                return False
+
+            try:
+                domain.encode('ascii')
+            except UnicodeError:
+                if too_long_to_encode(domain):
+                    return False
+            else:
+                if VALID_DOMAIN_RE.match(domain) is None:
+                    return False
+                if '--' not in domain:
+                    return True
+
+            encoded_domain = self.encode(domain)
+            if encoded_domain is INVALID:
+                return False
+
+            return VALID_DOMAIN_RE.match(encoded_domain) is not None
+        except (UnicodeError, TypeError, AttributeError, idna.IDNAError):
+            pass
+        return False
+
+
+STRICT = DomainValidator()
+RELAXED = DomainValidator(relaxed=True)
+
+
+def is_valid_domain(domain, relaxed=False):
+    """Validate a domain - including unicode domains."""
+    if relaxed:
+        return RELAXED.is_valid(domain)
+    return STRICT.is_valid(domain)
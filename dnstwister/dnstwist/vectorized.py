@@ -0,0 +1,113 @@
+"""NumPy versions of the bitsquatting and replacement fuzzers.
+
+The label is encoded as a uint8 array, every bit-flip (or neighbouring key)
+is applied at once as a 2-D array, the valid results are picked out with a
+lookup table and only those survivors are built into candidates - again as
+one array, split into rows.
+
+NumPy is optional. Without it, or for labels where the set-up costs more than
+it saves (short, or non-ASCII, labels), the fuzzers use their pure Python
+versions - which produce identical output, in identical order.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import keyboards
+
+
+AVAILABLE = numpy is not None
+
+# Labels shorter than this are faster in pure Python, see
+# tests/manual/vectorized_benchmark.py.
+MIN_LENGTH = 16
+
+_MASKS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _valid_bytes():
+    """The lookup table of the bytes a bitsquat may produce."""
+    valid = numpy.zeros(256, dtype=bool)
+    for char in '0123456789abcdefghijklmnopqrstuvwxyz-':
+        valid[ord(char)] = True
+    return valid
+
+
+def _neighbour_table(neighbours):
+    """Return the neighbours as a (256, widest) uint8 array, zero-padded,
+    and the count of neighbours per byte.
+    """
+    width = max(len(keys) for keys in neighbours.values())
+    table = numpy.zeros((256, width), dtype=numpy.uint8)
+    counts = numpy.zeros(256, dtype=numpy.intp)
+    for (char, keys) in neighbours.items():
+        table[ord(char), :len(keys)] = [ord(key) for key in keys]
+        counts[ord(char)] = len(keys)
+    return table, counts
+
+
+if AVAILABLE:
+    _VALID = _valid_bytes()
+    _MASK_ARRAY = numpy.array(_MASKS, dtype=numpy.uint8)
+    _NEIGHBOURS, _NEIGHBOUR_COUNTS = _neighbour_table(keyboards.NEIGHBOURS)
+
+
+def usable(label):
+    """Return True if the vectorized fuzzers should be used for a label."""
+    if not AVAILABLE or len(label) < MIN_LENGTH:
+        return False
+    try:
+        label.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+
+def _encode(label):
+    return numpy.frombuffer(label.encode('ascii'), dtype=numpy.uint8)
+
+
+def _candidates(label, codes, rows, columns, values, stride, start):
+    """Return (position, candidate) for the label with codes[row] replaced
+    by each value, in order, from position start.
+    """
+    positions = rows * stride + columns
+    keep = positions >= start
+    rows, values, positions = rows[keep], values[keep], positions[keep]
+
+    length = len(codes)
+    block = numpy.tile(codes, (len(rows), 1))
+    block[numpy.arange(len(rows)), rows] = values
+
+    data = block.tostring()
+    if isinstance(label, unicode):
+        data = data.decode('ascii')
+
+    return [(position, data[k * length:(k + 1) * length])
+            for (k, position)
+            in enumerate(positions.tolist())]
+
+
+def bitsquatting(label, stride, start=0):
+    """The vectorized __bitsquatting(), as a list."""
+    codes = _encode(label)
+    flipped = codes[:, numpy.newaxis] ^ _MASK_ARRAY
+    rows, columns = numpy.nonzero(_VALID[flipped])
+    return _candidates(
+        label, codes, rows, columns, flipped[rows, columns], stride, start
+    )
+
+
+def replacement(label, stride, start=0):
+    """The vectorized __replacement(), as a list, for the default keyboard
+    layouts (keyboards.NEIGHBOURS).
+    """
+    codes = _encode(label)
+    width = _NEIGHBOURS.shape[1]
+    present = numpy.arange(width) < _NEIGHBOUR_COUNTS[codes][:, numpy.newaxis]
+    rows, columns = numpy.nonzero(present)
+    return _candidates(
+        label, codes, rows, columns, _NEIGHBOURS[codes[rows], columns],
+        stride, start
+    )
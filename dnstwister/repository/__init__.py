@@ -2,6 +2,7 @@
 import datetime
 
 from dnstwister import data_db as db
+from dnstwister.repository import postings
 import dnstwister.storage.interfaces
 
 
@@ -26,6 +27,7 @@ def unregister_domain(domain):
         'registered_for_reporting',
         'resolution_report',
         'resolution_report_updated',
+        'resolution_nxdomains',
         'delta_report',
         'delta_report_updated',
         'delta_report_read',
@@ -33,6 +35,8 @@ def unregister_domain(domain):
     for prefix in prefixes:
         db.delete(prefix, domain)
 
+    remove_from_squat_index(domain)
+
 
 def is_domain_registered(domain):
     """Return whether a domain is registered for reporting."""
@@ -95,6 +99,26 @@ def update_resolution_report(domain, report, updated=None):
     )
 
 
+def get_nxdomains(domain):
+    """Return a dict of the fuzzy domains of a domain that were NXDOMAIN
+    when last resolved, to when they should next be resolved.
+    """
+    nxdomains = db.get('resolution_nxdomains', domain) or {}
+    return dict((candidate, db.from_db_datetime(recheck))
+                for (candidate, recheck)
+                in nxdomains.items())
+
+
+def update_nxdomains(domain, nxdomains):
+    """Update the NXDOMAIN fuzzy domains of a domain, see get_nxdomains().
+    """
+    db.set('resolution_nxdomains', domain, dict(
+        (candidate, db.to_db_datetime(recheck))
+        for (candidate, recheck)
+        in nxdomains.items()
+    ))
+
+
 def isubscriptions():
     """Return an iterator of subscription information."""
     keys_iter = db.ikeys('email_sub')
@@ -135,6 +159,19 @@ def subscribe_email(sub_id, email_address, domain, hide_noisy):
         'domain': domain,
         'hide_noisy': hide_noisy
     })
+    index_subscription(sub_id, domain)
+
+
+def index_subscription(sub_id, domain):
+    """Add a subscription to the index of subscriptions by domain, if it's
+    not there already.
+
+    The email worker re-indexes each subscription it processes, so those
+    made before the index was - or lost to concurrent updates - are added.
+    """
+    sub_ids = db.get('email_sub_by_domain', domain) or []
+    if sub_id not in sub_ids:
+        db.set('email_sub_by_domain', domain, sub_ids + [sub_id])
 
 
 def update_last_email_sub_sent_date(sub_id, when=None):
@@ -156,12 +193,111 @@ def email_last_send_for_sub(sub_id):
 
 def unsubscribe(sub_id):
     """Unsubscribe a user."""
+    domain = subscribed_domain(sub_id)
     db.delete('email_sub', sub_id)
     db.delete('email_sub_last_sent', sub_id)
 
+    if domain is not None:
+        sub_ids = db.get('email_sub_by_domain', domain) or []
+        if sub_id in sub_ids:
+            sub_ids.remove(sub_id)
+        if sub_ids:
+            db.set('email_sub_by_domain', domain, sub_ids)
+        else:
+            db.delete('email_sub_by_domain', domain)
+
 
 def subscribed_domain(sub_id):
     """Return what domain the subscription is for."""
     subscription = db.get('email_sub', sub_id)
     if subscription is not None:
         return subscription['domain']
+
+
+def _squat_source_id(domain, create=False):
+    """Return the squat index's integer id for a registered domain, or None.
+    """
+    source_id = db.get('squat_source_id', domain)
+    if source_id is None and create:
+        source_id = db.incr('squat_meta', 'next_id') - 1
+        db.set('squat_source_id', domain, source_id)
+        db.set('squat_source', str(source_id), domain)
+    return source_id
+
+
+def _update_posting(key, source_id, add):
+    """Add or remove a registered domain's id in a candidate's posting list.
+    """
+    ids = set(postings.unpack_ids(db.get('squat_posting', key)))
+    if add:
+        ids.add(source_id)
+    else:
+        ids.discard(source_id)
+
+    if ids:
+        db.set('squat_posting', key, postings.pack_ids(ids))
+    else:
+        db.delete('squat_posting', key)
+
+
+def update_squat_index(domain, candidates):
+    """Index the fuzzy domains (candidates) of a registered domain.
+
+    Only the changes since the last update are written.
+    """
+    source_id = _squat_source_id(domain, create=True)
+    key = str(source_id)
+
+    old = postings.unpack_hashes(db.get('squat_source_hashes', key))
+    new = set(postings.candidate_hash(candidate)
+              for candidate
+              in candidates
+              if candidate != domain)
+
+    for candidate_hash in new - old:
+        _update_posting(candidate_hash, source_id, True)
+    for candidate_hash in old - new:
+        _update_posting(candidate_hash, source_id, False)
+
+    if new != old:
+        db.set('squat_source_hashes', key, postings.pack_hashes(new))
+
+
+def remove_from_squat_index(domain):
+    """Remove a domain from the squat index."""
+    source_id = _squat_source_id(domain)
+    if source_id is None:
+        return
+    key = str(source_id)
+
+    old = postings.unpack_hashes(db.get('squat_source_hashes', key))
+    for candidate_hash in old:
+        _update_posting(candidate_hash, source_id, False)
+
+    db.delete('squat_source_hashes', key)
+    db.delete('squat_source', key)
+    db.delete('squat_source_id', domain)
+
+
+def squatted_domains(candidate):
+    """Return the registered domains that a candidate domain is a fuzzy
+    domain of.
+    """
+    packed = db.get('squat_posting', postings.candidate_hash(candidate))
+    domains = []
+    for source_id in postings.unpack_ids(packed):
+        domain = db.get('squat_source', str(source_id))
+        if domain is not None:
+            domains.append(domain)
+    return domains
+
+
+def isubscriptions_for_candidate(candidate):
+    """Return an iterator of the subscriptions (as for isubscriptions()) to
+    the registered domains that a candidate domain squats.
+    """
+    for domain in set(squatted_domains(candidate)):
+        for sub_id in db.get('email_sub_by_domain', domain) or []:
+            sub = db.get('email_sub', sub_id)
+            if sub is not None and sub['domain'] == domain:
+                yield sub_id, sub
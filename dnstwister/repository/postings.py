@@ -0,0 +1,67 @@
+"""Compact encodings for the candidate-to-registered-domain index.
+
+Candidates are keyed on a 64-bit hash rather than the domain itself, and
+registered domains are referred to by a small integer id. Posting lists (the
+ids of the registered domains that generate a candidate) are sorted, delta
+and varint encoded, and the set of candidate hashes for each registered
+domain is stored as one packed string of hashes. Both are base64 encoded so
+they can be stored as plain JSON values.
+"""
+import base64
+import hashlib
+
+HASH_BYTES = 8
+
+
+def candidate_hash(candidate):
+    """Return the hex hash key of a candidate domain."""
+    if isinstance(candidate, unicode):
+        candidate = candidate.encode('utf-8')
+    return hashlib.sha1(candidate.lower()).hexdigest()[:HASH_BYTES * 2]
+
+
+def pack_ids(ids):
+    """Return the packed string for a collection of non-negative ids."""
+    data = bytearray()
+    previous = 0
+    for value in sorted(set(ids)):
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            data.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return base64.b64encode(bytes(data))
+
+
+def unpack_ids(packed):
+    """Return the sorted list of ids in a packed string."""
+    ids = []
+    value = 0
+    delta = 0
+    shift = 0
+    for byte in bytearray(base64.b64decode(packed or '')):
+        delta |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        value += delta
+        ids.append(value)
+        delta = 0
+        shift = 0
+    return ids
+
+
+def pack_hashes(hashes):
+    """Return the packed string for a collection of candidate hashes."""
+    return base64.b64encode(''.join(
+        key.decode('hex') for key in sorted(set(hashes))
+    ))
+
+
+def unpack_hashes(packed):
+    """Return the set of candidate hashes in a packed string."""
+    data = base64.b64decode(packed or '')
+    return set(data[i:i + HASH_BYTES].encode('hex')
+               for i
+               in range(0, len(data), HASH_BYTES))
@@ -21,46 +21,93 @@ $(document).ready(function() {
     $('.resolved_total').text(resolvable);
 
     var resolveQueue = $.map($('.resolvable'), function(elem) {
-        return $(elem).data('hex');
-    }).reverse();
+        return $(elem).attr('data-hex');
+    });
+
+    var showResult = function(hex, result) {
+
+        var elem = $('.resolvable[data-hex=' + hex + ']');
+
+        if (result.ip !== false) {
+            elem.text(result.ip);
+            elem.parent().addClass('resolved');
+            $('.report').show();
+            found += 1;
+        }
+        else if (result.mx && result.mx.length > 0) {
+            // Registered for mail only.
+            elem.text('MX: ' + result.mx[0]);
+            elem.parent().addClass('resolved');
+            $('.report').show();
+            found += 1;
+        }
+        else if (result.error !== false) {
+            elem.text('Resolution error!');
+            elem.attr('title', 'There was an error resolving this IP');
+            elem.parent().addClass('error');
+            $('.report').show();
+        }
+        else {
+            elem.text('None resolved');
+        }
+        to_resolve -= 1;
+        $('.resolved_count').text(resolvable - to_resolve);
+    };
+
+    // Domains are resolved in batches, each streaming back a line of JSON
+    // per domain as it resolves.
+    var BATCH_SIZE = 50;
 
     var resolveNext = function(queue) {
 
-        var hex = queue.pop();
+        var batch = queue.splice(0, BATCH_SIZE);
 
-        if (hex === undefined) {
+        if (batch.length === 0) {
             return;
         }
 
-        $.getJSON('/api/ip/' + hex, function(result) {
-
-            var elem = $('.resolvable[data-hex=' + hex + ']');
+        var pending = {};
+        $.each(batch, function(_, hex) {
+            pending[hex] = true;
+        });
 
-            if (result.ip !== false) {
-                elem.text(result.ip);
-                elem.parent().addClass('resolved');
-                $('.report').show();
-                found += 1;
-            }
-            else if (result.error !== false) {
-                elem.text('Resolution error!');
-                elem.attr('title', 'There was an error resolving this IP');
-                elem.parent().addClass('error');
-                $('.report').show();
+        var consumed = 0;
+        var readLines = function(text) {
+            var end;
+            while ((end = text.indexOf('\n', consumed)) !== -1) {
+                var result = JSON.parse(text.slice(consumed, end));
+                consumed = end + 1;
+                if (pending[result.domain_as_hexadecimal]) {
+                    delete pending[result.domain_as_hexadecimal];
+                    showResult(result.domain_as_hexadecimal, result);
+                }
             }
-            else {
-                elem.text('None resolved');
-            }
-            to_resolve -= 1;
-            $('.resolved_count').text(resolvable - to_resolve);
+        };
 
+        $.ajax({
+            url: '/api/ip/batch',
+            type: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify(batch),
+            dataType: 'text',
+            xhrFields: {
+                onprogress: function(e) {
+                    readLines(e.target.responseText);
+                }
+            }
+        }).done(function(text) {
+            readLines(text);
+        }).always(function() {
+            // Anything not streamed back is an error.
+            $.each(pending, function(hex) {
+                showResult(hex, {'ip': false, 'error': true});
+            });
             resolveNext(queue);
-
         });
     };
 
-    // 5 "threads"
-    $.map([0, 1, 2, 3, 4], function() {
+    // 3 "threads"
+    $.map([0, 1, 2], function() {
         setTimeout(function() {
             resolveNext(resolveQueue);
         });
@@ -950,9 +950,11 @@ var search = (function () {
     return hex
   }
 
-  var resolveA = function (idnaEncodedDomain, callback) {
+  // One query for the IP and MX records - the resolver skips the MX query
+  // for domains that don't exist.
+  var resolve = function (hexEncodedDomain, callback) {
     var request = new XMLHttpRequest()
-    var url = 'https://dnstwister.report/api/a?pd=' + idnaEncodedDomain
+    var url = '/api/ip/' + hexEncodedDomain
     request.open('GET', url)
     request.send()
     request.onreadystatechange = (e) => {
@@ -960,35 +962,14 @@ var search = (function () {
         if (request.status === 200) {
           var responseText = request.responseText
           var response = JSON.parse(responseText)
+          var mxExists = response.mx.length > 0
           if (response.error === false) {
-            callback(response.ip)
+            callback(response.ip, mxExists)
           } else {
-            callback(null)
+            callback(null, mxExists)
           }
         } else {
-          callback(null)
-        }
-      }
-    }
-  }
-
-  var resolveMx = function (idnaEncodedDomain, callback) {
-    var request = new XMLHttpRequest()
-    var url = 'https://dnstwister.report/api/mx?pd=' + idnaEncodedDomain
-    request.open('GET', url)
-    request.send()
-    request.onreadystatechange = (e) => {
-      if (request.readyState === 4) {
-        if (request.status === 200) {
-          var responseText = request.responseText
-          var response = JSON.parse(responseText)
-          if (response.mx === undefined) {
-            callback(null)
-          } else {
-            callback(response.mx)
-          }
-        } else {
-          callback(null)
+          callback(null, null)
         }
       }
     }
@@ -1037,7 +1018,7 @@ var search = (function () {
 
       checkedCount += 1
 
-      resolveA(idnaEncodedDomain, function (ip) {
+      resolve(hexEncodedDomain, function (ip, mxExists) {
         if (ip === null) {
           erroredA.push([nextDomain, idnaEncodedDomain])
         } else if (ip !== false) {
@@ -1046,21 +1027,17 @@ var search = (function () {
           ui.addARecordInfo(nextDomain, ip)
         }
 
-        resolveMx(idnaEncodedDomain, function (mxExists) {
-          if (mxExists === true) {
-            if (ip === null || ip === false) {
-              resolvedCount += 1
-              ui.addResolvedRow(reportElem, nextDomain, idnaEncodedDomain, hexEncodedDomain)
-              ui.addUnresolvedARecord(nextDomain)
-            }
-            ui.addMxRecord(nextDomain)
-          } else if (mxExists === null && ip !== null) {
-            erroredA.push([nextDomain, idnaEncodedDomain])
+        if (mxExists === true) {
+          if (ip === null || ip === false) {
+            resolvedCount += 1
+            ui.addResolvedRow(reportElem, nextDomain, idnaEncodedDomain, hexEncodedDomain)
+            ui.addUnresolvedARecord(nextDomain)
           }
+          ui.addMxRecord(nextDomain)
+        }
 
-          ui.updateProgress(identifiedCount, checkedCount, resolvedCount, allIdentified)
-          resolveMomentarily()
-        })
+        ui.updateProgress(identifiedCount, checkedCount, resolvedCount, allIdentified)
+        resolveMomentarily()
       })
     }
 
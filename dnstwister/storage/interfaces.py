@@ -22,6 +22,12 @@ class IKeyValueDB(zope.interface.Interface):
     def delete(kind, key):
         """Delete a key."""
 
+    # pylint: disable=no-self-argument
+    def incr(kind, key):
+        """Atomically increment the integer value for kind:key (from 0 if it
+        has no value), returning the new value.
+        """
+
     # pylint: disable=no-self-argument
     def to_db_datetime(datetime_obj):
         """Convert a datetime object to db datetime data."""
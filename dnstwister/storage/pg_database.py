@@ -115,6 +115,24 @@ class PGDatabase(object):
                 """, (psycopg2.extras.Json(value), pkey))
             self._commit()
 
+    @resetonfail
+    def incr(self, prefix, key):
+        """Atomically increment the integer value for a key (from 0 if no
+        value), returning the new value.
+        """
+        pkey = ':'.join((prefix, key))
+        with self.cursor as cur:
+            cur.execute("""
+                INSERT INTO data (key, value)
+                VALUES (%s, '1')
+                ON CONFLICT (key) DO UPDATE
+                SET value = to_jsonb(data.value::text::bigint + 1)
+                RETURNING value;
+            """, (pkey,))
+            value = cur.fetchone()[0]
+            self._commit()
+            return value
+
     @resetonfail
     def get(self, prefix, key):
         """Return the value for key, or None if no value."""
@@ -1,5 +1,6 @@
 """Generic tools."""
 import binascii
+import itertools
 import os
 import re
 import random
@@ -9,14 +10,57 @@ import urlparse
 import dns.resolver
 import flask
 
-from dnstwister import cache
+from dnstwister.configuration import features
+from dnstwister.dnstwist import keywords
+from dnstwister.dnstwist import scoring
+from dnstwister.dnstwist import tlds
+from dnstwister.tools import fuzz_cache
+from dnstwister.tools import resolution_cache
+from dnstwister.tools import resolver
+from dnstwister.tools import system_resolver
 from dnstwister.tools import tld_db
+from dnstwister.tools import upstreams
 import dnstwister.dnstwist as dnstwist
 
 
 RESOLVER = dns.resolver.Resolver()
-RESOLVER.lifetime = 0.1
-RESOLVER.timeout = 0.1
+
+# The nameservers (from the system configuration), with timeouts derived from
+# their latency, see upstreams.py. Resolutions try up to RESOLVE_ATTEMPTS of
+# them.
+UPSTREAMS = upstreams.UpstreamPool(RESOLVER.nameservers, RESOLVER.port)
+RESOLVE_ATTEMPTS = 2
+
+# Runs the system resolver fallback off the request threads.
+SYSTEM_RESOLVER = system_resolver.SystemResolver()
+
+# Queries the A, AAAA, MX and NS records of a domain together, for
+# resolve().
+RECORD_RESOLVER = resolver.BatchResolver(
+    retries=RESOLVE_ATTEMPTS - 1, upstream_pool=UPSTREAMS,
+    rdtypes=resolver.RECORD_TYPES
+)
+
+# Resolves many domains concurrently, when feature.batch_resolve is enabled.
+BATCH_RESOLVER = resolver.BatchResolver(
+    cache=resolution_cache.CACHE, upstream_pool=UPSTREAMS,
+    rdtypes=resolver.RECORD_TYPES
+)
+RESOLVE_CONCURRENCY = int(
+    os.getenv('RESOLVE_CONCURRENCY', resolver.CONCURRENCY)
+)
+
+# The most fuzzy domains (as estimated) a request may ask to fuzz in one go.
+FUZZ_BUDGET = int(os.getenv('FUZZ_BUDGET', 10000))
+
+# The TLDs swapped in, and how they're ranked, when the TLD-swap fuzzer is
+# enabled.
+TLD_SWAP_TOP_N = int(os.getenv('TLD_SWAP_TOP_N', tlds.TOP_N))
+TLD_SWAP_RANKING = os.getenv('TLD_SWAP_RANKING', tlds.PROXIMITY)
+
+# The most keyword candidates per domain, when the dictionary fuzzer is
+# enabled.
+DICTIONARY_MAX = int(os.getenv('DICTIONARY_MAX', keywords.MAX))
 
 
 def encode_domain(domain):
@@ -33,22 +77,148 @@ def decode_domain(encoded_domain):
     return binascii.unhexlify(encoded_domain).decode('idna')
 
 
+def _fuzz_options():
+    """Return the DomainFuzzer options for the optional fuzzers that are
+    enabled.
+    """
+    options = {}
+    if features.enable_tld_swap():
+        options['tld_swap'] = TLD_SWAP_TOP_N
+        options['tld_ranking'] = TLD_SWAP_RANKING
+    if features.enable_dictionary():
+        options['dictionary'] = DICTIONARY_MAX
+    return options
+
+
+def domain_fuzzer(domain):
+    """Return a DomainFuzzer, with the enabled optional fuzzers."""
+    return dnstwist.DomainFuzzer(domain, **_fuzz_options())
+
+
+def _cache_kind(kind):
+    """Return the cache kind for a fuzz with the enabled optional fuzzers,
+    so toggling them doesn't serve stale results.
+    """
+    options = _fuzz_options()
+    return ':'.join(
+        [kind] + ['{}={}'.format(key, options[key]) for key in sorted(options)]
+    )
+
+
 def fuzzy_domains(domain):
-    """Return the fuzzy domains."""
-    fuzzer = dnstwist.DomainFuzzer(domain)
-    fuzzer.fuzz()
-    return list(fuzzer.domains)
+    """Return the fuzzy domains, as a FuzzResultSet.
+
+    Cached, see fuzz_cache.py.
+    """
+    kind = _cache_kind('fuzz')
+    results = fuzz_cache.CACHE.get(kind, domain)
+    if results is None:
+        fuzzer = domain_fuzzer(domain)
+        fuzzer.fuzz()
+        results = dnstwist.FuzzResultSet(fuzzer.domains)
+        fuzz_cache.CACHE.set(kind, domain, results)
+    return results
+
+
+def ranked_fuzzy_domains(domain, top_k=None, results=None):
+    """Return the fuzzy domains best (most similar to the domain) first, as
+    a FuzzResultSet with a "score" column - only the top_k best if top_k is
+    not None.
+
+    The original domain always scores highest, so stays first. The fuzzy
+    domains are fuzzed (or read from the cache) unless passed as results.
+    """
+    if results is None:
+        results = fuzzy_domains(domain)
+    candidates = [candidate for (_, candidate) in results.pairs()]
+    scores = scoring.Scorer(domain).scores(candidates)
+
+    order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+    if top_k is not None:
+        order = order[:top_k]
+
+    pairs = list(results.pairs())
+    ranked = dnstwist.FuzzResultSet(pairs[i] for i in order)
+    ranked.add_column('score', dict(zip(candidates, scores)).get)
+    return ranked
 
 
-def fuzzy_domains_iter(domain):
-    """Return the fuzzy domains iterator."""
-    return dnstwist.DomainFuzzer(domain).fuzz_iter()
+def fuzz_estimate(domain, homoglyph_max=1000):
+    """Return an upper bound on the number of fuzzy domains for a domain,
+    without fuzzing it.
+
+    homoglyph_max is as for DomainFuzzer.estimate() - the default matches
+    fuzzy_domains(), None matches the iterator.
+    """
+    estimate = domain_fuzzer(domain).estimate(homoglyph_max)
+    return sum(estimate.values())
+
+
+def within_fuzz_budget(domain, homoglyph_max=1000):
+    """Return True if fuzzing the domain in one go is within FUZZ_BUDGET.
+
+    homoglyph_max is as for fuzz_estimate() - pass None when guarding the
+    iterator, which doesn't cap the homoglyphs.
+    """
+    return fuzz_estimate(domain, homoglyph_max) <= FUZZ_BUDGET
 
 
-def analyse(domain):
-    """Analyse a domain."""
+def fuzzy_domains_iter(domain, second_order=False):
+    """Return the fuzzy domains iterator, optionally followed by the
+    second-order (two edits away) fuzzy domains.
+
+    Served from the cache if a previous iteration ran to completion,
+    otherwise results are cached as they are generated.
+    """
+    kind = _cache_kind('iter2' if second_order else 'iter')
+    results = fuzz_cache.CACHE.get(kind, domain)
+    if results is not None:
+        return (dnstwist.Result(fuzzer, candidate)
+                for (fuzzer, candidate)
+                in results.pairs())
+    return _caching_fuzz_iter(domain, second_order)
+
+
+def fuzzy_domains_page(domain, cursor=None, limit=100):
+    """Return a page of up to limit fuzzy domains, resuming from cursor (as
+    returned in a previous page) if it is not None.
+
+    Returns a (results, next_cursor) tuple, next_cursor is None for the last
+    page. Raises dnstwist.InvalidCursor on a malformed cursor.
+    """
+    fuzzer = domain_fuzzer(domain)
+    page = list(itertools.islice(fuzzer.fuzz_iter(cursor=cursor), limit + 1))
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = page[-1].cursor
+
+    return page, next_cursor
+
+
+def _caching_fuzz_iter(domain, second_order=False):
+    """Iterate a fuzz, caching the results once it completes."""
+    results = dnstwist.FuzzResultSet()
+    fuzzer = domain_fuzzer(domain)
+    for result in fuzzer.fuzz_iter(second_order=second_order):
+        results.append(result.fuzzer, result.domain)
+        yield result
+    kind = _cache_kind('iter2' if second_order else 'iter')
+    fuzz_cache.CACHE.set(kind, domain, results)
+
+
+def analyse(domain, top_k=None):
+    """Analyse a domain.
+
+    The fuzzy domains are ranked best first (see ranked_fuzzy_domains()) if
+    top_k is set, or if ranking is enabled by feature flag.
+    """
     data = {'fuzzy_domains': []}
-    results = fuzzy_domains(domain)
+    if top_k is not None or features.enable_score_ranking():
+        results = ranked_fuzzy_domains(domain, top_k)
+    else:
+        results = fuzzy_domains(domain)
 
     if len(results) == 0:
         return None
@@ -56,8 +226,9 @@ def analyse(domain):
     # Add a hex-encoded version of the domain for the later IP resolution. We
     # do this because the same people who may use this app already have
     # blocking on things like www.exampl0e.com in URLs...
-    for result in results:
-        result['hex'] = encode_domain(result['domain-name'])
+    #
+    # The column is computed lazily, as each result is read.
+    results.add_column('hex', encode_domain)
     data['fuzzy_domains'] = results
 
     return (domain, data)
@@ -150,47 +321,71 @@ def suggest_domain(search_domain):
     return random.choice(valid_suggestions)
 
 
-@cache.memoize(3600)
 def resolve(domain):
     """Resolves a domain to an IP.
 
     Returns and (IP, False) on successful resolution, (False, False) on
     successful failure to resolve and (None, True) on error in attempting to
-    resolve.
+    resolve - as a resolver.Resolution, which also has the resolution's
+    status (NXDOMAIN, timeout etc) and its A, AAAA, MX and NS records.
 
-    Cached to 1 hour.
+    Cached for the DNS TTL, see resolution_cache.py.
     """
+    return resolution_cache.CACHE.fetch(domain, _resolve)
+
+
+def _resolve(domain):
+    """Resolves a domain to a resolver.Resolution."""
     if not dnstwist.is_valid_domain(domain):
-        return False, True
+        return resolver.Resolution(resolver.ERROR)
 
     idna_domain = domain.encode('idna')
 
-    # Try for an 'A' record.
+    # Query for all the record types at once (the 127.0.0.1 edge case is an
+    # error).
+    _, resolution = next(RECORD_RESOLVER.resolve_many([domain]))
+    if resolution.status in (resolver.RESOLVED, resolver.NXDOMAIN,
+                             resolver.NODATA):
+        return resolution
+
+    # Try for a simple resolution if the 'A' record request failed (timed
+    # out, SERVFAIL) - on the bounded pool, giving up if it's busy or slow.
+    # Negative answers are authoritative, and the system resolver would only
+    # repeat them.
     try:
-        ip_addr = str(sorted(RESOLVER.query(idna_domain, 'A'))[0].address)
+        ip_addr = SYSTEM_RESOLVER.gethostbyname(idna_domain)
 
         # Weird edge case that sometimes happens?!?!
         if ip_addr != '127.0.0.1':
-            return ip_addr, False
-    except:
-        pass
-
-    # Try for a simple resolution if the 'A' record request failed
-    try:
-        ip_addr = socket.gethostbyname(idna_domain)
+            records = dict(resolution.records, a=[ip_addr])
+            return resolver.Resolution(resolver.RESOLVED, ip_addr,
+                                       records=records)
+    except socket.gaierror as ex:
+        # A temporary failure tells us no more than the 'A' query did.
+        if ex.errno == socket.EAI_AGAIN:
+            return resolution
 
-        # Weird edge case that sometimes happens?!?!
-        if ip_addr != '127.0.0.1':
-            return ip_addr, False
-    except socket.gaierror:
         # Indicates failure to resolve to IP address, not an error in
         # the attempt.
-        return False, False
+        return resolver.Resolution(resolver.NXDOMAIN)
     except:
         pass
 
-    # Error due to exception of 127.0.0.1 issue.
-    return False, True
+    return resolution
+
+
+def resolve_many(domains, ordered=True):
+    """Yield (domain, resolver.Resolution) for each domain, as for
+    resolve().
+
+    Uses the batch resolver if enabled, streaming results in the order of
+    domains if ordered is True, otherwise as they complete.
+    """
+    if features.enable_batch_resolve():
+        return BATCH_RESOLVER.resolve_many(
+            domains, RESOLVE_CONCURRENCY, ordered
+        )
+    return ((domain, resolve(domain)) for domain in domains)
 
 
 def random_id(n_bytes=32):
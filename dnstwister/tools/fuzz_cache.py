@@ -0,0 +1,162 @@
+"""Cache of fuzz results.
+
+Fuzzing is deterministic, and the same domains are fuzzed over and over by
+the reports, exports, API and the deltas worker, so the results are cached:
+
+ * In-process, in an LRU bounded by the total number of stored candidates
+   (a fuzz of a long domain can be a hundred times the size of a short one).
+ * Optionally (feature.fuzz_cache_redis), in Redis so results are shared
+   between dynos and workers and survive restarts.
+
+Keys include a hash of the fuzzer's source and data files, so deploying a
+change to the fuzzer invalidates everything cached by the previous version.
+"""
+import hashlib
+import json
+import os
+import zlib
+
+import redis
+
+from dnstwister.configuration import features
+from dnstwister.dnstwist import lru
+from dnstwister.dnstwist import results
+
+
+MAX_CANDIDATES = int(os.getenv('FUZZ_CACHE_MAX_CANDIDATES', 250000))
+
+EXPIRY = 60 * 60 * 24
+
+FUZZER_DIR = os.path.dirname(lru.__file__)
+
+
+def fuzzer_version(path=FUZZER_DIR):
+    """Return a hash of the fuzzer's python source and data files."""
+    digest = hashlib.sha1()
+    for (root, dirs, files) in sorted(os.walk(path)):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(('.pyc', '.pyo', '.md')):
+                continue
+            with open(os.path.join(root, name), 'rb') as data:
+                digest.update(name)
+                digest.update(data.read())
+    return digest.hexdigest()[:12]
+
+
+VERSION = fuzzer_version()
+
+
+def _candidate_count(key, value):
+    """Entries are weighed by their number of candidates."""
+    return max(len(value), 1)
+
+
+class FuzzCache(object):
+    """A two-tier cache of FuzzResultSets by domain.
+
+    Callers get their own copy of the cached results, so they are free to
+    add columns etc.
+    """
+    def __init__(self, max_candidates=MAX_CANDIDATES, version=VERSION):
+        self._local = lru.LRUCache(max_candidates, weigh=_candidate_count)
+        self._version = version
+        self._conn = None
+
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+
+    @property
+    def version(self):
+        """The fuzzer version the cache is keyed on."""
+        return self._version
+
+    @property
+    def r_conn(self):
+        """The shared tier's redis connection, or None if disabled."""
+        if not features.enable_fuzz_cache_redis():
+            return None
+        if self._conn is None:
+            url = os.getenv('REDIS_URL')
+            if url is None:
+                raise Exception('REDIS connection configuration not set!')
+            self._conn = redis.from_url(url)
+        return self._conn
+
+    def _key(self, kind, domain):
+        if isinstance(domain, unicode):
+            domain = domain.encode('utf-8')
+        return 'fuzz:{}:{}:{}'.format(self._version, kind, domain)
+
+    def get(self, kind, domain):
+        """Return a copy of the cached FuzzResultSet, or None."""
+        key = self._key(kind, domain)
+
+        cached = self._local.get(key)
+        if cached is lru.MISSING:
+            cached = self._get_shared(key)
+            if cached is None:
+                return
+            self._local.set(key, cached)
+
+        return cached[:]
+
+    def set(self, kind, domain, fuzz_results):
+        """Cache (a copy of) the complete FuzzResultSet of a fuzz."""
+        key = self._key(kind, domain)
+        cached = fuzz_results[:]
+        self._local.set(key, cached)
+        self._set_shared(key, cached)
+
+    def _get_shared(self, key):
+        try:
+            conn = self.r_conn
+            if conn is None:
+                return
+            data = conn.get(key)
+        except Exception:
+            self.shared_errors += 1
+            return
+
+        if data is None:
+            self.shared_misses += 1
+            return
+
+        try:
+            pairs = json.loads(zlib.decompress(data))
+        except (zlib.error, ValueError):
+            # Corrupt, or not written by this version.
+            self.shared_misses += 1
+            return
+
+        self.shared_hits += 1
+        return results.FuzzResultSet(tuple(pair) for pair in pairs)
+
+    def _set_shared(self, key, fuzz_results):
+        try:
+            conn = self.r_conn
+            if conn is None:
+                return
+            data = zlib.compress(json.dumps(list(fuzz_results.pairs())))
+            conn.set(key, data, ex=EXPIRY)
+        except Exception:
+            self.shared_errors += 1
+
+    def clear(self):
+        """Clear the in-process tier."""
+        self._local.clear()
+
+    def stats(self):
+        """Return the hit/miss counters of both tiers."""
+        stats = self._local.stats()
+        stats.update({
+            'shared_hits': self.shared_hits,
+            'shared_misses': self.shared_misses,
+            'shared_errors': self.shared_errors,
+            'version': self._version,
+        })
+        return stats
+
+
+CACHE = FuzzCache()
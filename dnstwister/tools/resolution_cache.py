@@ -0,0 +1,256 @@
+"""Cache of domain resolutions.
+
+Resolutions, with all their records, are cached for as long as DNS allows -
+the least TTL of the records or, for NXDOMAIN and no data answers, the SOA
+minimum (RFC 2308) - clamped to between MIN_TTL and MAX_TTL. Failures are
+cached only briefly, for the RETRY_AFTER of their status, so that they are
+retried soon.
+
+The cache has two tiers:
+
+ * In-process, in an LRU bounded by the (approximate) bytes stored.
+ * Optionally (feature.resolution_cache_redis), in Redis so resolutions are
+   shared between dynos and with the deltas worker.
+
+Concurrent misses for the same domain are collapsed into one resolution, the
+other callers waiting for its result.
+"""
+import json
+import os
+import threading
+import time
+
+import redis
+
+from dnstwister.configuration import features
+from dnstwister.dnstwist import lru
+from dnstwister.tools import resolver
+
+
+MAX_BYTES = int(os.getenv('RESOLUTION_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+
+MIN_TTL = 30
+MAX_TTL = 3600
+
+# For resolutions without a TTL (by the system resolver, or negative answers
+# without a SOA record).
+DEFAULT_TTL = 300
+
+RETRY_AFTER = {
+    resolver.TIMEOUT: 5,
+    resolver.SERVFAIL: 15,
+    resolver.ERROR: 60,
+}
+
+# The approximate per-entry overhead of the key, tuples, OrderedDict etc.
+ENTRY_BYTES = 250
+
+
+def _entry_bytes(key, entry):
+    """Entries are weighed by their approximate size in bytes."""
+    resolution, _ = entry
+    return (ENTRY_BYTES + len(key) + len(resolution[0] or '') +
+            sum(len(value)
+                for values in resolution.records.values()
+                for value in values))
+
+
+def cache_ttl(resolution):
+    """Return the seconds to cache a Resolution for."""
+    if resolution.status in RETRY_AFTER:
+        return RETRY_AFTER[resolution.status]
+    if resolution.ttl is None:
+        return DEFAULT_TTL
+    return max(MIN_TTL, min(MAX_TTL, resolution.ttl))
+
+
+class _Flight(object):
+    """A resolution in progress."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class ResolutionCache(object):
+    """A two-tier, TTL-aware, cache of Resolutions by domain."""
+    def __init__(self, max_bytes=MAX_BYTES, clock=time.time):
+        self._local = lru.LRUCache(max_bytes, weigh=_entry_bytes)
+        self._clock = clock
+        self._conn = None
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.collapsed = 0
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+
+    @property
+    def r_conn(self):
+        """The shared tier's redis connection, or None if disabled."""
+        if not features.enable_resolution_cache_redis():
+            return None
+        if self._conn is None:
+            url = os.getenv('REDIS_URL')
+            if url is None:
+                raise Exception('REDIS connection configuration not set!')
+            self._conn = redis.from_url(url)
+        return self._conn
+
+    def _count(self, counter):
+        """Increment a counter - safely, as they're shared by threads."""
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _key(self, domain):
+        if isinstance(domain, unicode):
+            domain = domain.encode('utf-8')
+        return 'resolve:{}'.format(domain)
+
+    def get(self, domain):
+        """Return the cached Resolution for a domain, or None."""
+        key = self._key(domain)
+        now = self._clock()
+
+        entry = self._local.get(key)
+        if entry is not lru.MISSING and entry[1] <= now:
+            self._local.delete(key)
+            self._count('expirations')
+            entry = lru.MISSING
+
+        if entry is lru.MISSING:
+            entry = self._get_shared(key, now)
+            if entry is None:
+                self._count('misses')
+                return
+            self._local.set(key, entry)
+
+        self._count('hits')
+        return entry[0]
+
+    def set(self, domain, resolution):
+        """Cache a Resolution for as long as its status and TTL allow."""
+        key = self._key(domain)
+        ttl = cache_ttl(resolution)
+        entry = (resolution, self._clock() + ttl)
+        self._local.set(key, entry)
+        self._set_shared(key, entry, ttl)
+
+    def fetch(self, domain, resolve):
+        """Return the cached Resolution for a domain, or call resolve() for
+        one to cache. Callers that miss while the domain is being resolved
+        wait for that resolution.
+        """
+        result = self.get(domain)
+        if result is not None:
+            return result
+
+        key = self._key(domain)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._count('collapsed')
+            flight.done.wait()
+            if flight.result is not None:
+                return flight.result
+            return self.fetch(domain, resolve)
+
+        try:
+            flight.result = resolve(domain)
+            self.set(domain, flight.result)
+            return flight.result
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _get_shared(self, key, now):
+        try:
+            conn = self.r_conn
+            if conn is None:
+                return
+            data = conn.get(key)
+        except Exception:
+            self._count('shared_errors')
+            return
+
+        if data is None:
+            self._count('shared_misses')
+            return
+
+        try:
+            status, ip_addr, ttl, expires, records = json.loads(data)
+        except ValueError:
+            # Cached before the records were.
+            self._count('shared_misses')
+            return
+
+        if expires <= now:
+            self._count('shared_misses')
+            return
+
+        self._count('shared_hits')
+        if ip_addr:
+            ip_addr = str(ip_addr)
+        records = dict((str(rdtype), [str(value) for value in values])
+                       for (rdtype, values) in records.items())
+        resolution = resolver.Resolution(str(status), ip_addr, ttl, records)
+        return resolution, expires
+
+    def _set_shared(self, key, entry, ttl):
+        try:
+            conn = self.r_conn
+            if conn is None:
+                return
+            resolution, expires = entry
+            conn.set(key, json.dumps([resolution.status, resolution[0],
+                                      resolution.ttl, expires,
+                                      resolution.records]),
+                     ex=int(ttl))
+        except Exception:
+            self._count('shared_errors')
+
+    def clear(self):
+        """Clear the in-process tier, resetting the counters."""
+        self._local.clear()
+        with self._counters_lock:
+            self.hits = 0
+            self.misses = 0
+            self.expirations = 0
+            self.collapsed = 0
+            self.shared_hits = 0
+            self.shared_misses = 0
+            self.shared_errors = 0
+
+    def stats(self):
+        """Return the hit, miss and eviction counters of both tiers."""
+        with self._counters_lock:
+            lookups = self.hits + self.misses
+            hit_ratio = None
+            if lookups:
+                hit_ratio = round(self.hits / float(lookups), 4)
+            return {
+                'entries': len(self._local),
+                'bytes': self._local.weight,
+                'max_bytes': self._local.max_weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': hit_ratio,
+                'evictions': self._local.evictions,
+                'expirations': self.expirations,
+                'collapsed': self.collapsed,
+                'shared_hits': self.shared_hits,
+                'shared_misses': self.shared_misses,
+                'shared_errors': self.shared_errors,
+            }
+
+
+CACHE = ResolutionCache()
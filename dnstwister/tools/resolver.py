@@ -0,0 +1,524 @@
+"""Batch DNS resolution.
+
+The BatchResolver resolves many domains from a single thread: up to
+`concurrency` domains are resolved at once, each query on its own
+non-blocking UDP socket, and a poll() loop matches replies to their queries
+and retries (on the next nameserver) or fails the queries that time out.
+Sockets are pooled and reused between queries and between batches.
+
+Each domain is queried for a set of record types - just 'A' by default, or
+all of RECORD_TYPES for a full resolution - combined into one result. The
+'A' query goes first, and the other types are only queried (together) if it
+was answered - most fuzzy domains don't exist, and those cost one query.
+
+Nameservers are chosen, and queries timed out, by their observed health and
+latency (see upstreams.py).
+
+Results are Resolutions - the tools.resolve() (ip, error) tuples, typed with
+their status and carrying the records found - and are streamed either in the
+order the domains were given or as they complete. There is no fallback to the
+system resolver, which would block.
+
+If given a cache (see resolution_cache.py), cached domains aren't queried and
+the results of those that are are cached for their TTL.
+"""
+import collections
+import errno
+import select
+import socket
+import threading
+import time
+
+import dns.entropy
+import dns.exception
+import dns.inet
+import dns.message
+import dns.rcode
+import dns.rdatatype
+
+import dnstwister.dnstwist as dnstwist
+from dnstwister.tools import upstreams
+
+
+# The default, and most, queries in flight at once.
+CONCURRENCY = 50
+MAX_CONCURRENCY = 500
+
+# Seconds to wait for each attempt at a query until there are enough
+# latencies to derive it from, and the attempts after the first.
+QUERY_TIMEOUT = 1.0
+RETRIES = 1
+
+# Idle sockets kept for reuse, per address family.
+MAX_IDLE_SOCKETS = MAX_CONCURRENCY
+
+# The record types of a full resolution.
+RECORD_TYPES = ('A', 'AAAA', 'MX', 'NS')
+
+# Resolution statuses. ERROR is for domains that can't be queried and
+# answers that can't be used.
+RESOLVED = 'resolved'
+NXDOMAIN = 'nxdomain'
+NODATA = 'nodata'
+SERVFAIL = 'servfail'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+# The statuses that are worth retrying soon.
+TRANSIENT = (SERVFAIL, TIMEOUT)
+
+
+class Resolution(tuple):
+    """The (ip, error) of a resolution, as returned by tools.resolve() -
+    (IP, False) if resolved, (False, False) for NXDOMAIN or no data and
+    (False, True) otherwise - with its status and DNS TTL (None if unknown).
+
+    The status and IP are those of the 'A' query. The records found, of any
+    type queried, are in `records` - a dict of lower-case record type to a
+    list of the addresses (A, AAAA) or hosts (MX, in preference order, NS).
+    """
+    def __new__(cls, status, ip_addr=False, ttl=None, records=None):
+        if status != RESOLVED:
+            ip_addr = False
+        self = tuple.__new__(
+            cls, (ip_addr, status not in (RESOLVED, NXDOMAIN, NODATA))
+        )
+        self.status = status
+        self.ttl = ttl
+        self.records = records or {}
+        return self
+
+    def __getnewargs__(self):
+        return self.status, self[0], self.ttl, self.records
+
+    def __repr__(self):
+        return 'Resolution({!r}, {!r}, {!r}, {!r})'.format(
+            self.status, self[0], self.ttl, self.records
+        )
+
+    @classmethod
+    def of(cls, result):
+        """Return an (ip, error) result as a Resolution, inferring the
+        status of untyped results.
+        """
+        if isinstance(result, cls):
+            return result
+        ip_addr, error = result
+        if ip_addr:
+            return cls(RESOLVED, ip_addr)
+        return cls(ERROR if error else NXDOMAIN)
+
+    @property
+    def transient(self):
+        """True if the resolution failed in a way worth retrying soon."""
+        return self.status in TRANSIENT
+
+
+class _Job(object):
+    """A domain being resolved, and the responses to its queries so far by
+    record type (None for those that timed out).
+
+    The messages are sent first, and the follow-ups once the 'A' query is
+    answered.
+    """
+    __slots__ = ('index', 'domain', 'messages', 'follow_ups', 'expected',
+                 'responses', 'failed')
+
+    def __init__(self, index, domain, messages):
+        self.index = index
+        self.domain = domain
+        self.messages = messages
+        self.follow_ups = []
+        if (len(messages) > 1 and
+                messages[0].question[0].rdtype == dns.rdatatype.A):
+            self.messages, self.follow_ups = messages[:1], messages[1:]
+        self.expected = len(messages)
+        self.responses = {}
+        self.failed = False
+
+
+class _Query(object):
+    """An in-flight query."""
+    __slots__ = ('job', 'rdtype', 'message', 'wire', 'sock', 'deadline',
+                 'attempt', 'upstream', 'sent')
+
+    def __init__(self, job, message, sock):
+        self.job = job
+        self.rdtype = message.question[0].rdtype
+        self.message = message
+        self.wire = None
+        self.sock = sock
+        self.deadline = None
+        self.attempt = 0
+        self.upstream = None
+        self.sent = None
+
+
+def readable(socks, timeout):
+    """Return those of socks that are readable within timeout seconds.
+
+    Uses poll() where there is one, as select() can't wait on descriptors
+    past FD_SETSIZE (1024) and a batch can have more sockets open than that -
+    up to MAX_CONCURRENCY domains, each with a query per record type.
+    """
+    if not hasattr(select, 'poll'):
+        return select.select(socks, [], [], timeout)[0]
+
+    poller = select.poll()
+    by_fd = {}
+    for sock in socks:
+        by_fd[sock.fileno()] = sock
+        poller.register(sock, select.POLLIN)
+    return [by_fd[fd] for (fd, _) in poller.poll(timeout * 1000)]
+
+
+def negative_ttl(response):
+    """Return the TTL of a negative (NXDOMAIN or no data) response - the
+    lesser of its SOA record's TTL and minimum (RFC 2308) - or None if it
+    has no SOA record.
+    """
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return min(rrset.ttl, rrset[0].minimum)
+
+
+def answer(response):
+    """Return the Resolution for a response to an 'A' query."""
+    rcode = response.rcode()
+    if rcode == dns.rcode.NXDOMAIN:
+        return Resolution(NXDOMAIN, ttl=negative_ttl(response))
+    if rcode == dns.rcode.SERVFAIL:
+        return Resolution(SERVFAIL)
+    if rcode != dns.rcode.NOERROR:
+        return Resolution(ERROR)
+
+    rrsets = [rrset
+              for rrset in response.answer
+              if rrset.rdtype == dns.rdatatype.A]
+    if not rrsets:
+        return Resolution(NODATA, ttl=negative_ttl(response))
+
+    addresses = sorted(rdata for rrset in rrsets for rdata in rrset)
+    ip_addr = str(addresses[0].address)
+
+    # The same edge case as in tools.resolve().
+    if ip_addr == '127.0.0.1':
+        return Resolution(ERROR)
+
+    return Resolution(RESOLVED, ip_addr, min(rrset.ttl for rrset in rrsets))
+
+
+def records(response, rdtype):
+    """Return the (values, ttl) of the records of a type in a response -
+    ([], None) if there are none.
+    """
+    rrsets = [rrset
+              for rrset in response.answer
+              if rrset.rdtype == rdtype]
+    if not rrsets:
+        return [], None
+
+    rdatas = [rdata for rrset in rrsets for rdata in rrset]
+    if rdtype == dns.rdatatype.MX:
+        values = [rdata.exchange.to_text(omit_final_dot=True)
+                  for rdata
+                  in sorted(rdatas, key=lambda r: (r.preference, r.exchange))]
+    elif rdtype == dns.rdatatype.NS:
+        values = sorted(rdata.target.to_text(omit_final_dot=True)
+                        for rdata in rdatas)
+    else:
+        values = [str(rdata.address) for rdata in sorted(rdatas)]
+    return values, min(rrset.ttl for rrset in rrsets)
+
+
+def combine(responses):
+    """Return the Resolution for the responses to a domain's queries, by
+    record type (None for those that timed out).
+
+    The status and IP are from the 'A' query, the TTL is the least of all
+    the answers' and the records are those of every query answered.
+    """
+    response = responses.get(dns.rdatatype.A)
+    resolution = Resolution(TIMEOUT) if response is None else answer(response)
+
+    found = {}
+    ttls = [resolution.ttl] if resolution.ttl is not None else []
+    for (rdtype, response) in responses.items():
+        if response is None or response.rcode() != dns.rcode.NOERROR:
+            continue
+        values, ttl = records(response, rdtype)
+        if values:
+            found[dns.rdatatype.to_text(rdtype).lower()] = values
+            ttls.append(ttl)
+
+    return Resolution(resolution.status, resolution[0],
+                      min(ttls) if ttls else None, found)
+
+
+class BatchResolver(object):
+    """Resolves batches of domains to IPs (and, optionally, other records)
+    concurrently, via a set of nameservers or an UpstreamPool shared with
+    other resolvers.
+    """
+    def __init__(self, nameservers=(), port=53, timeout=QUERY_TIMEOUT,
+                 retries=RETRIES, cache=None, upstream_pool=None,
+                 rdtypes=('A',)):
+        if upstream_pool is None:
+            upstream_pool = upstreams.UpstreamPool(
+                nameservers, port, timeout
+            )
+        self.upstream_pool = upstream_pool
+        self.retries = retries
+        self.cache = cache
+        self.rdtypes = [dns.rdatatype.from_text(rdtype) for rdtype in rdtypes]
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _take_socket(self, family):
+        """Return an idle socket, or a new one."""
+        with self._lock:
+            idle = self._idle.get(family)
+            if idle:
+                return idle.pop()
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        return sock
+
+    def _return_socket(self, sock):
+        """Drain a socket of late replies and return it to the pool."""
+        try:
+            while True:
+                sock.recv(65535)
+        except socket.error:
+            pass
+
+        with self._lock:
+            idle = self._idle.setdefault(sock.family, [])
+            if len(idle) < MAX_IDLE_SOCKETS:
+                idle.append(sock)
+                return
+        sock.close()
+
+    def close(self):
+        """Close the pooled sockets."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for sockets in idle.values():
+            for sock in sockets:
+                sock.close()
+
+    def _send(self, query, choices):
+        """(Re)send a query, to the next nameserver of choices. Returns
+        False if the send failed.
+
+        Each attempt has a new message ID, so that a late reply to an
+        earlier attempt isn't taken for the reply to this one.
+        """
+        if query.attempt:
+            query.message.id = dns.entropy.random_16()
+        query.wire = query.message.to_wire()
+        query.upstream = choices[query.attempt % len(choices)]
+        query.sent = time.time()
+        query.deadline = query.sent + query.upstream.timeout
+        try:
+            query.sock.sendto(
+                query.wire, (query.upstream.address, self.upstream_pool.port)
+            )
+        except socket.error as ex:
+            if ex.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return False
+        return True
+
+    def _job(self, index, domain):
+        """Return the job for a domain, or None if the domain can't be
+        queried.
+        """
+        if not dnstwist.is_valid_domain(domain):
+            return None
+        try:
+            idna_domain = domain.encode('idna')
+            messages = [dns.message.make_query(idna_domain, rdtype)
+                        for rdtype in self.rdtypes]
+        except (UnicodeError, dns.exception.DNSException):
+            return None
+        return _Job(index, domain, messages)
+
+    def _start(self, job, message, choices):
+        """Return the started query for one of a job's messages, or None if
+        it couldn't be sent.
+        """
+        family = dns.inet.af_for_address(choices[0].address)
+        query = _Query(job, message, self._take_socket(family))
+        if not self._send(query, choices):
+            self._return_socket(query.sock)
+            return None
+        return query
+
+    def _reply(self, query):
+        """Return the response on a readable query's socket, or None if it
+        was not the reply to the query.
+        """
+        try:
+            wire = query.sock.recv(65535)
+        except socket.error:
+            return None
+        try:
+            response = dns.message.from_wire(wire)
+        except dns.exception.DNSException:
+            return None
+        if not query.message.is_response(response):
+            return None
+        query.upstream.success(time.time() - query.sent)
+        return response
+
+    def _follow_ups(self, job, rdtype, response):
+        """Return the messages to send after a response (None if there was
+        none) to one of a job's queries - its follow-ups if that was the
+        'A' query and it was answered, otherwise none.
+        """
+        if rdtype != dns.rdatatype.A or not job.follow_ups:
+            return []
+        follow_ups, job.follow_ups = job.follow_ups, []
+        if response is None or response.rcode() != dns.rcode.NOERROR:
+            job.expected -= len(follow_ups)
+            return []
+        return follow_ups
+
+    def _finish(self, job, rdtype, response):
+        """Record the response (None if there was none) to one of a job's
+        queries, returning the job's Resolution if that was the last.
+        """
+        job.responses[rdtype] = response
+        if len(job.responses) < job.expected:
+            return None
+        if job.failed:
+            return Resolution(ERROR)
+        resolution = combine(job.responses)
+        self._cache(job.domain, resolution)
+        return resolution
+
+    def _cache(self, domain, resolution):
+        if self.cache is not None:
+            self.cache.set(domain, resolution)
+
+    def _cached(self, domain):
+        if self.cache is not None:
+            return self.cache.get(domain)
+
+    def resolve_many(self, domains, concurrency=CONCURRENCY, ordered=True):
+        """Yield (domain, Resolution) for each domain, resolving up to
+        concurrency domains at once.
+
+        Results are yielded in the order of domains if ordered is True,
+        otherwise as they complete.
+        """
+        if not len(self.upstream_pool):
+            raise ValueError('No nameservers to query')
+        concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+
+        pending = enumerate(domains)
+        exhausted = False
+        active = 0
+        waiting = collections.deque()
+        inflight = {}
+        completed = []
+        finished = {}
+        next_index = 0
+
+        try:
+            while True:
+                while waiting or (active < concurrency and not exhausted):
+                    if not waiting:
+                        try:
+                            index, domain = next(pending)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        result = self._cached(domain)
+                        if result is not None:
+                            completed.append((index, domain, result))
+                            continue
+                        job = self._job(index, domain)
+                        if job is None:
+                            completed.append((index, domain,
+                                              Resolution(ERROR)))
+                            continue
+                        active += 1
+                        waiting.extend((job, message)
+                                       for message in job.messages)
+
+                    job, message = waiting.popleft()
+                    query = self._start(
+                        job, message, self.upstream_pool.choose()
+                    )
+                    if query is not None:
+                        inflight[query.sock] = query
+                        continue
+                    job.failed = True
+                    rdtype = message.question[0].rdtype
+                    self._follow_ups(job, rdtype, None)
+                    result = self._finish(job, rdtype, None)
+                    if result is not None:
+                        active -= 1
+                        completed.append((job.index, job.domain, result))
+
+                if inflight:
+                    wait = min(q.deadline for q in inflight.values())
+                    ready = readable(
+                        inflight.keys(), max(wait - time.time(), 0)
+                    )
+
+                    for sock in ready:
+                        query = inflight[sock]
+                        response = self._reply(query)
+                        if response is None:
+                            continue
+                        del inflight[sock]
+                        self._return_socket(sock)
+                        waiting.extend(
+                            (query.job, message)
+                            for message
+                            in self._follow_ups(query.job, query.rdtype,
+                                                response)
+                        )
+                        result = self._finish(query.job, query.rdtype,
+                                              response)
+                        if result is not None:
+                            active -= 1
+                            completed.append((query.job.index,
+                                              query.job.domain, result))
+
+                    now = time.time()
+                    for query in [q for q in inflight.values()
+                                  if q.deadline <= now]:
+                        query.upstream.failure(query.deadline - query.sent)
+                        query.attempt += 1
+                        choices = self.upstream_pool.choose()
+                        if (query.attempt <= self.retries and
+                                self._send(query, choices)):
+                            continue
+                        del inflight[query.sock]
+                        self._return_socket(query.sock)
+                        self._follow_ups(query.job, query.rdtype, None)
+                        result = self._finish(query.job, query.rdtype, None)
+                        if result is not None:
+                            active -= 1
+                            completed.append((query.job.index,
+                                              query.job.domain, result))
+
+                if ordered:
+                    for (index, domain, result) in completed:
+                        finished[index] = (domain, result)
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+                else:
+                    for (_, domain, result) in completed:
+                        yield domain, result
+                completed = []
+
+                if exhausted and not waiting and not inflight:
+                    break
+        finally:
+            for sock in inflight.keys():
+                self._return_socket(sock)
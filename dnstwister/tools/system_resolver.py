@@ -0,0 +1,134 @@
+"""A bounded pool for the blocking system resolver (socket.gethostbyname).
+
+gethostbyname() can block for the system resolver's full timeout and can't be
+cancelled, so lookups are run on a small, fixed, pool of worker threads fed
+from a bounded queue:
+
+ * Callers wait no longer than their timeout. A lookup that times out while
+   still queued is dropped, one that's already running is left to finish.
+ * When the queue is full lookups are refused straight away.
+
+So a burst of slow lookups ties up, at most, the pool's own threads rather
+than the web server's.
+"""
+import os
+import Queue
+import socket
+import threading
+
+
+WORKERS = int(os.getenv('SYSTEM_RESOLVER_WORKERS', 4))
+MAX_QUEUE = int(os.getenv('SYSTEM_RESOLVER_MAX_QUEUE', 32))
+TIMEOUT = 1.0
+
+
+class Overloaded(Exception):
+    """The lookup queue is full."""
+
+
+class Timeout(Exception):
+    """The lookup didn't complete in time."""
+
+
+class _Lookup(object):
+    """A queued lookup."""
+    __slots__ = ('name', 'done', 'result', 'error', 'abandoned')
+
+    def __init__(self, name):
+        self.name = name
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SystemResolver(object):
+    """Runs gethostbyname() lookups on a bounded pool of threads."""
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE, timeout=TIMEOUT):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queue = Queue.Queue(max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.busy = 0
+        self.max_queue_depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def _start(self):
+        """Start the worker threads, if not yet started."""
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            lookup = self._queue.get()
+            if lookup.abandoned:
+                with self._lock:
+                    self.dropped += 1
+                continue
+
+            with self._lock:
+                self.busy += 1
+            try:
+                lookup.result = socket.gethostbyname(lookup.name)
+            except Exception as ex:
+                lookup.error = ex
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                    self.completed += 1
+                lookup.done.set()
+
+    def gethostbyname(self, name, timeout=None):
+        """Return socket.gethostbyname(name), raising Overloaded if the
+        queue is full and Timeout if it takes longer than the timeout.
+        """
+        self._start()
+        lookup = _Lookup(name)
+        try:
+            self._queue.put_nowait(lookup)
+        except Queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(name)
+
+        with self._lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth,
+                                       self._queue.qsize())
+
+        if not lookup.done.wait(self.timeout if timeout is None else timeout):
+            lookup.abandoned = True
+            with self._lock:
+                self.timeouts += 1
+            raise Timeout(name)
+
+        if lookup.error is not None:
+            raise lookup.error
+        return lookup.result
+
+    def stats(self):
+        """Return the pool's queue depth and counters."""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'busy': self.busy,
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'dropped': self.dropped,
+            }
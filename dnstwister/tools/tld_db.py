@@ -1,33 +1,28 @@
 """Interface to the top-level-domains database in dnstwister.
 
-It's small so we hold it in memory as a set.
+The database is parsed once into the public suffix index shared with the
+fuzzer, the set of plain ASCII suffixes is kept here for membership tests.
 """
-import os
+from dnstwister.dnstwist import publicsuffix
 
 
-TLDS = set()
+DB_PATH = publicsuffix.DB_PATH
 
-DB_PATH = os.path.join(
-    'dnstwister',
-    'dnstwist',
-    'database',
-    'effective_tld_names.dat'
-)
+PSL = publicsuffix.PSL
 
-if not os.path.exists(DB_PATH):
-    raise Exception('TLD database is required!')
 
-def valid_tld(line):
-    """Return True if the line is a valid TLD, False otherwise."""
-    line = line.strip()
-    if line.startswith('//') or line.startswith('*') or line == '':
+def valid_tld(rule):
+    """Return True if the rule is a plain ASCII suffix, False otherwise."""
+    if rule.startswith('*') or rule.startswith('!'):
         return False
     try:
-        line.decode('ascii')
-    except UnicodeDecodeError:
+        rule.encode('ascii')
+    except UnicodeError:
         return False
     return True
 
 
-with open(DB_PATH, 'rb') as tldf:
-    TLDS.update(filter(valid_tld, tldf.read().split('\n')))
+TLDS = set(rule.encode('ascii')
+           for rule
+           in publicsuffix.RULES
+           if valid_tld(rule))
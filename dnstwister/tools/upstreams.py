@@ -0,0 +1,176 @@
+"""Health and latency tracking of the upstream nameservers.
+
+Each nameserver's recent query latencies and failures are kept in a rolling
+window, from which:
+
+ * Its query timeout is derived - TIMEOUT_MULTIPLIER times the observed
+   95th percentile latency, within MIN_TIMEOUT and MAX_TIMEOUT, or the
+   default timeout until there are MIN_SAMPLES latencies. Timeouts count as
+   a latency of the timeout, so the timeout grows if they're frequent.
+ * A circuit breaker is driven. After FAILURE_THRESHOLD consecutive failures
+   (or too high a failure rate) the breaker opens and the nameserver isn't
+   used for COOLDOWN seconds, after which it is tried again ("half-open") -
+   the next result closing or re-opening the breaker.
+
+Healthy nameservers are used fastest first. If every breaker is open they're
+all used anyway, least recently opened first, rather than failing every
+query.
+"""
+import collections
+import math
+import threading
+import time
+
+
+WINDOW = 200
+MIN_SAMPLES = 10
+
+DEFAULT_TIMEOUT = 0.5
+MIN_TIMEOUT = 0.05
+MAX_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 2
+
+FAILURE_THRESHOLD = 5
+MAX_FAILURE_RATE = 0.5
+COOLDOWN = 30
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def percentile(values, fraction):
+    """The nearest-rank percentile of some values, or None."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(int(math.ceil(fraction * len(ordered))) - 1, 0)]
+
+
+class Upstream(object):
+    """A nameserver's latencies, failures and circuit breaker."""
+    def __init__(self, address, default_timeout=DEFAULT_TIMEOUT,
+                 clock=time.time):
+        self.address = address
+        self.default_timeout = default_timeout
+        self._clock = clock
+        self._latencies = collections.deque(maxlen=WINDOW)
+        self._outcomes = collections.deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.queries = 0
+        self.failures = 0
+
+    def _open(self):
+        """Open the breaker - the lock must be held."""
+        self.state = OPEN
+        self.opened_at = self._clock()
+
+    def success(self, latency):
+        """Record a query answered in latency seconds."""
+        with self._lock:
+            self._latencies.append(latency)
+            self._outcomes.append(True)
+            self.queries += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+
+    def failure(self, timeout=None):
+        """Record a query that failed or, if given the timeout, timed out.
+
+        A timed out query counts as a latency of its timeout, so that the
+        timeout backs off if too many queries hit it.
+        """
+        with self._lock:
+            if timeout is not None:
+                self._latencies.append(timeout)
+            self._outcomes.append(False)
+            self.queries += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            if (self.state == HALF_OPEN or
+                    self.consecutive_failures >= FAILURE_THRESHOLD or
+                    self._failure_rate() > MAX_FAILURE_RATE):
+                self._open()
+
+    def _failure_rate(self):
+        """The failure rate over the window, once it's worth trusting - the
+        lock must be held.
+        """
+        if len(self._outcomes) < MIN_SAMPLES:
+            return 0
+        return self._outcomes.count(False) / float(len(self._outcomes))
+
+    @property
+    def available(self):
+        """True if the breaker allows queries to the nameserver."""
+        with self._lock:
+            if (self.state == OPEN and
+                    self._clock() - self.opened_at >= COOLDOWN):
+                self.state = HALF_OPEN
+            return self.state != OPEN
+
+    @property
+    def p95(self):
+        """The 95th percentile latency, or None if too few samples."""
+        latencies = list(self._latencies)
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return percentile(latencies, 0.95)
+
+    @property
+    def timeout(self):
+        """The query timeout, in seconds."""
+        p95 = self.p95
+        if p95 is None:
+            return self.default_timeout
+        return max(MIN_TIMEOUT, min(MAX_TIMEOUT, p95 * TIMEOUT_MULTIPLIER))
+
+    def stats(self):
+        """Return the nameserver's latency, failure and breaker state."""
+        latencies = list(self._latencies)
+        with self._lock:
+            failure_rate = (
+                self._outcomes.count(False) / float(len(self._outcomes))
+                if self._outcomes else None
+            )
+        return {
+            'address': self.address,
+            'state': self.state,
+            'timeout': self.timeout,
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'samples': len(latencies),
+            'failure_rate': failure_rate,
+            'consecutive_failures': self.consecutive_failures,
+            'queries': self.queries,
+            'failures': self.failures,
+        }
+
+
+class UpstreamPool(object):
+    """The upstream nameservers, healthiest and fastest first."""
+    def __init__(self, addresses, port=53, default_timeout=DEFAULT_TIMEOUT,
+                 clock=time.time):
+        self.port = port
+        self.upstreams = [Upstream(address, default_timeout, clock)
+                          for address in addresses]
+
+    def __len__(self):
+        return len(self.upstreams)
+
+    def choose(self):
+        """Return the upstreams to try, in order."""
+        available = [upstream
+                     for upstream in self.upstreams
+                     if upstream.available]
+        if not available:
+            return sorted(self.upstreams, key=lambda u: u.opened_at)
+        return sorted(available, key=lambda u: u.timeout)
+
+    def stats(self):
+        """Return the stats of each upstream."""
+        return [upstream.stats() for upstream in self.upstreams]
@@ -1,4 +1,5 @@
 """Search/report page."""
+import itertools
 import json
 
 import flask
@@ -43,9 +44,12 @@ def json_render(domain):
             yield indent * 2 + '"fuzzy_domains": [\n'
 
             fuzzy_domains = rept['fuzzy_domains']
-            for (j, entry) in enumerate(fuzzy_domains):
+            resolutions = tools.resolve_many(
+                entry['domain-name'] for entry in fuzzy_domains
+            )
+            for (j, (entry, (_, (ip_addr, error)))) in enumerate(
+                    itertools.izip(fuzzy_domains, resolutions)):
 
-                ip_addr, error = tools.resolve(entry['domain-name'])
                 data = {
                     'domain-name': entry['domain-name'].encode('idna'),
                     'fuzzer': entry['fuzzer'],
@@ -93,8 +97,11 @@ def csv_render(domain):
         """Streaming download generator."""
         yield ','.join(headers) + '\n'
         for (domain, rept) in reports.items():
-            for entry in rept['fuzzy_domains']:
-                ip_addr, error = tools.resolve(entry['domain-name'])
+            resolutions = tools.resolve_many(
+                entry['domain-name'] for entry in rept['fuzzy_domains']
+            )
+            for (entry, (_, (ip_addr, error))) in itertools.izip(
+                    rept['fuzzy_domains'], resolutions):
 
                 row = (
                     domain.encode('idna'),
@@ -203,11 +210,22 @@ def search(search_domain, fmt=None):
     if domain is None:
         return handle_invalid_domain(search_domain)
 
+    # Reports that would be too large to build in one go are downgraded to
+    # the streamed search (which is cut off at the budget), exports of them
+    # are refused.
+    within_budget = tools.within_fuzz_budget(domain)
+    if not within_budget:
+        app.logger.info(
+            'Fuzz of {} estimated over budget'.format(search_domain)
+        )
+
     if fmt is None:
-        if features.enable_async_search():
+        if features.enable_async_search() or not within_budget:
             return flask.redirect('/search?ed={}'.format(search_domain))
         else:
             return html_render(domain)
+    elif not within_budget:
+        flask.abort(400, 'Domain too large to export.')
     elif fmt == 'json':
         return json_render(domain)
     elif fmt == 'csv':
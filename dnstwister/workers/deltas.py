@@ -1,8 +1,10 @@
 """Updates atom feeds."""
 import datetime
+import os
 import time
 
 from dnstwister import repository
+from dnstwister.tools import resolver
 import dnstwister.tools as tools
 import dnstwister.dnstwist as dnstwist
 
@@ -12,9 +14,80 @@ PERIOD = 86400  # 24 hours
 # Multiplier on period to unregister if not read.
 UNREGISTER = 3  # 3 days
 
+# Only resolve the most similar fuzzy domains, if set.
+TOP_K = int(os.getenv('DELTAS_TOP_K', 0)) or None
+
+# Fuzzy domains whose resolution failed transiently (timed out, SERVFAIL)
+# keep their previous resolution, and are re-resolved after each pass over
+# the domains in up to this many retry passes, this many seconds apart.
+RETRIES = 2
+RETRY_DELAY = 15
+
+# Fuzzy domains that are NXDOMAIN twice in a row aren't resolved again for
+# their negative TTL (the SOA minimum), up to this long - less than PERIOD,
+# so a squat registered since is still found by the next pass.
+NXDOMAIN_SKIP = min(
+    datetime.timedelta(hours=int(os.getenv('DELTAS_NXDOMAIN_SKIP_HOURS', 12))),
+    datetime.timedelta(seconds=PERIOD) - datetime.timedelta(hours=1)
+)
+
+
+def resolve(domains):
+    """Return a dict of domains to their resolver.Resolution."""
+    return dict((dom, resolver.Resolution.of(result))
+                for (dom, result)
+                in tools.resolve_many(domains, ordered=False))
+
+
+def registered(resolution, tweak):
+    """Return the resolution report entry for a Resolution, or None if the
+    domain isn't registered.
+
+    Domains with only IPv6 or mail records are registered too, reported by
+    their AAAA address or as "MX <mail server>".
+    """
+    records = resolution.records
+    if resolution.status == resolver.RESOLVED:
+        ip_addr = resolution[0]
+    elif resolution.status == resolver.NODATA and records.get('aaaa'):
+        ip_addr = records['aaaa'][0]
+    elif resolution.status == resolver.NODATA and records.get('mx'):
+        ip_addr = 'MX {}'.format(records['mx'][0])
+    else:
+        return None
+
+    entry = {'ip': ip_addr, 'tweak': tweak}
+    for rdtype in ('aaaa', 'mx'):
+        if rdtype in records:
+            entry[rdtype] = records[rdtype]
+    return entry
+
+
+def report_ip(entry):
+    """Return the IP of a resolution report entry."""
+    try:
+        return entry['ip']
+    except TypeError:
+        # handle old-style ip-only reports
+        return entry
+
+
+def nxdomain_recheck(dom, nxdomains, now, resolution):
+    """Return when to next resolve a fuzzy domain that was NXDOMAIN - only
+    those that were NXDOMAIN last time too, with a negative TTL, are skipped.
+    """
+    if dom not in nxdomains or resolution.ttl is None:
+        return now
+    return now + min(datetime.timedelta(seconds=resolution.ttl),
+                     NXDOMAIN_SKIP)
+
 
 def process_domain(domain):
-    """Process a domain - generating resolution reports and deltas."""
+    """Process a domain - generating resolution reports and deltas.
+
+    Returns a dict of the fuzzy domains whose resolution failed transiently
+    to their tweak, for retry_domain().
+    """
     if not dnstwist.is_valid_domain(domain):
         print 'Invalid: {}'.format(repr(domain))
         repository.unregister_domain(domain)
@@ -46,34 +119,56 @@ def process_domain(domain):
     if existing_report is None:
         existing_report = {}
 
+    # Keep the candidate to registered domain index up to date.
+    results = tools.fuzzy_domains(domain)
+    repository.update_squat_index(
+        domain, [candidate for (_, candidate) in results.pairs()]
+    )
+
+    if TOP_K is not None:
+        results = tools.ranked_fuzzy_domains(domain, TOP_K, results)
+
+    tweaks = dict(
+        (candidate, fuzzer)
+        for (fuzzer, candidate)
+        in list(results.pairs())[1:]
+    )
+
+    now = datetime.datetime.now()
+    nxdomains = repository.get_nxdomains(domain)
+    skipped = set(dom
+                  for (dom, recheck) in nxdomains.items()
+                  if dom in tweaks and recheck > now)
+
+    resolutions = resolve([dom for dom in tweaks if dom not in skipped])
+
     new_report = {}
-    for entry in tools.analyse(domain)[1]['fuzzy_domains'][1:]:
-        ip_addr, error = tools.resolve(entry['domain-name'])
-        if error or not ip_addr or ip_addr is None:
-            continue
-        new_report[entry['domain-name']] = {
-            'ip': ip_addr,
-            'tweak': entry['fuzzer'],
-        }
+    new_nxdomains = dict((dom, nxdomains[dom]) for dom in skipped)
+    transient = {}
+    for (dom, resolution) in resolutions.items():
+        entry = registered(resolution, tweaks[dom])
+        if entry is not None:
+            new_report[dom] = entry
+        elif resolution.transient:
+            transient[dom] = tweaks[dom]
+            if dom in existing_report:
+                # Not a deletion, we just don't know yet.
+                new_report[dom] = existing_report[dom]
+        elif resolution.status == resolver.NXDOMAIN:
+            new_nxdomains[dom] = nxdomain_recheck(dom, nxdomains, now,
+                                                  resolution)
 
     repository.update_resolution_report(domain, new_report)
+    repository.update_nxdomains(domain, new_nxdomains)
 
     delta_report = {'new': [], 'updated': [], 'deleted': []}
     for (dom, data) in new_report.items():
 
-        try:
-            new_ip = data['ip']
-        except TypeError:
-            # handle old-style ip-only reports
-            new_ip = data
+        new_ip = report_ip(data)
 
         if dom in existing_report.keys():
 
-            try:
-                existing_ip = existing_report[dom]['ip']
-            except TypeError:
-                # handle old-style ip-only reports
-                existing_ip = existing_report[dom]
+            existing_ip = report_ip(existing_report[dom])
 
             if new_ip != existing_ip:
                 delta_report['updated'].append(
@@ -93,6 +188,69 @@ def process_domain(domain):
         domain.encode('idna'), time.time() - start
     )
 
+    return transient
+
+
+def retry_domain(domain, tweaks):
+    """Re-resolve a domain's fuzzy domains that failed transiently (as a
+    dict of fuzzy domain to tweak), adding any changes to its reports.
+
+    Returns those that failed transiently again.
+    """
+    report = repository.get_resolution_report(domain) or {}
+    delta_report = repository.get_delta_report(domain) or {
+        'new': [], 'updated': [], 'deleted': []
+    }
+    nxdomains = repository.get_nxdomains(domain)
+    now = datetime.datetime.now()
+
+    transient = {}
+    for (dom, resolution) in resolve(list(tweaks)).items():
+        entry = registered(resolution, tweaks[dom])
+        if entry is not None:
+            if dom not in report:
+                delta_report['new'].append((dom, entry['ip']))
+            elif report_ip(report[dom]) != entry['ip']:
+                delta_report['updated'].append(
+                    (dom, report_ip(report[dom]), entry['ip'])
+                )
+            report[dom] = entry
+        elif resolution.transient:
+            transient[dom] = tweaks[dom]
+        else:
+            if dom in report:
+                del report[dom]
+                delta_report['deleted'].append(dom)
+            if resolution.status == resolver.NXDOMAIN:
+                nxdomains[dom] = nxdomain_recheck(dom, nxdomains, now,
+                                                  resolution)
+
+    repository.update_resolution_report(domain, report)
+    repository.update_nxdomains(domain, nxdomains)
+    repository.update_delta_report(
+        domain, delta_report, repository.delta_report_updated(domain)
+    )
+
+    return transient
+
+
+def retry_transient_failures(retries):
+    """Retry the transient failures of a pass over the domains - a dict of
+    domain to process_domain()'s result - in up to RETRIES passes,
+    RETRY_DELAY seconds apart.
+    """
+    for _ in range(RETRIES):
+        retries = dict((domain, tweaks)
+                       for (domain, tweaks) in retries.items()
+                       if tweaks)
+        if not retries:
+            return
+
+        time.sleep(RETRY_DELAY)
+
+        retries = dict((domain, retry_domain(domain, tweaks))
+                       for (domain, tweaks) in retries.items())
+
 
 def main():
     """Main code for worker."""
@@ -103,6 +261,7 @@ def main():
         start = time.time()
 
         domains_iter = repository.iregistered_domains()
+        retries = {}
 
         while True:
             try:
@@ -110,7 +269,9 @@ def main():
             except StopIteration:
                 break
 
-            process_domain(domain)
+            retries[domain] = process_domain(domain)
+
+        retry_transient_failures(retries)
 
         print 'All deltas processed in {} seconds'.format(
             round(time.time() - start, 2)
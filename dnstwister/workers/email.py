@@ -43,6 +43,9 @@ def process_sub(sub_id, detail):
     # Ensure the domain is registered for reporting, register if not.
     repository.register_domain(domain)
 
+    # And that the subscription can be found by domain.
+    repository.index_subscription(sub_id, domain)
+
     # Mark delta report as "read" so it's not unsubscribed.
     repository.mark_delta_report_as_read(domain)
 
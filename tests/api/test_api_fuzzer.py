@@ -1,5 +1,8 @@
 """The API's fuzzer endpoint."""
 import binascii
+import json
+
+import dnstwister.tools as tools
 
 
 def test_fuzzer(webapp):
@@ -41,3 +44,126 @@ def test_chunking_api_endpoint(webapp):
     assert response.startswith(
         u'{"ed": "612e636f6d", "d": "a.com", "pd": "a.com"}\n\n{"ed": "61612e636f6d", "d": "aa.com", "pd": "aa.com"}\n\n'
     )
+
+
+def test_fuzzer_pagination(webapp):
+    """The fuzz can be paged through with a cursor and limit."""
+    hexdomain = binascii.hexlify('abc.com')
+
+    response = webapp.get('/api/fuzz/{}?limit=50'.format(hexdomain)).json
+    assert len(response['fuzzy_domains']) == 50
+    assert response['fuzzy_domains'][0]['fuzzer'] == 'Original*'
+
+    domains = [d['domain'] for d in response['fuzzy_domains']]
+    while response['next_cursor'] is not None:
+        response = webapp.get('/api/fuzz/{}?limit=50&cursor={}'.format(
+            hexdomain, response['next_cursor']
+        )).json
+        domains.extend(d['domain'] for d in response['fuzzy_domains'])
+
+    chunked = webapp.get('/api/fuzz_chunked/{}'.format(hexdomain)).text
+    assert domains == [json.loads(line)['pd']
+                       for line
+                       in chunked.split('\n\n')
+                       if line]
+
+
+def test_fuzzer_pagination_errors(webapp):
+    """Bad cursors and limits are rejected."""
+    hexdomain = binascii.hexlify('abc.com')
+
+    for query in ('cursor=zz', 'cursor=ffffffffff', 'limit=0', 'limit=a', 'limit=1001'):
+        response = webapp.get(
+            '/api/fuzz/{}?{}'.format(hexdomain, query), expect_errors=True
+        )
+        assert response.status_code == 400
+
+
+def test_fuzzer_over_budget_is_paginated(webapp, monkeypatch):
+    """Fuzzes estimated to be over budget are downgraded to the first page.
+    """
+    monkeypatch.setattr('dnstwister.tools.FUZZ_BUDGET', 100)
+    hexdomain = binascii.hexlify('abc.com')
+
+    response = webapp.get('/api/fuzz/{}'.format(hexdomain)).json
+    assert len(response['fuzzy_domains']) == 107
+    assert response['next_cursor'] is None
+
+    hexdomain = binascii.hexlify('thisisaverylongdomainname.com')
+
+    response = webapp.get('/api/fuzz/{}'.format(hexdomain)).json
+    assert len(response['fuzzy_domains']) == 1000
+    assert response['next_cursor'] is not None
+
+
+def test_chunked_fuzz_over_budget_is_capped(webapp, monkeypatch):
+    """Streamed fuzzes estimated to be over budget stop at the budget."""
+    monkeypatch.setattr('dnstwister.tools.FUZZ_BUDGET', 200)
+
+    hexdomain = binascii.hexlify('abc.com')
+    results = webapp.get('/api/fuzz_chunked/{}'.format(hexdomain)).text
+    assert len([line for line in results.split('\n\n') if line]) == 107
+
+    hexdomain = binascii.hexlify('thisisaverylongdomainname.com')
+    results = webapp.get('/api/fuzz_chunked/{}'.format(hexdomain)).text
+    assert len([line for line in results.split('\n\n') if line]) == 200
+
+
+def test_chunked_fuzz_budget_counts_every_homoglyph(webapp):
+    """The stream doesn't cap homoglyphs, so neither does its budget."""
+    domain = 'a' * 40 + '.com'
+    assert tools.fuzz_estimate(domain) <= tools.FUZZ_BUDGET
+
+    hexdomain = binascii.hexlify(domain)
+    results = webapp.get('/api/fuzz_chunked/{}'.format(hexdomain)).text
+    assert len([line for line in results.split('\n\n') if line]) == tools.FUZZ_BUDGET
+
+
+def test_chunking_api_endpoint_second_order(webapp):
+    """The chunked fuzz can be followed by the second-order fuzz."""
+    hexdomain = binascii.hexlify('abc.com')
+
+    first_order = webapp.get('/api/fuzz_chunked/{}'.format(hexdomain)).text
+    second_order = webapp.get(
+        '/api/fuzz_chunked/{}?second_order=true'.format(hexdomain)
+    ).text
+
+    first_order = [json.loads(line)['d'] for line in first_order.split('\n\n') if line]
+    second_order = [json.loads(line)['d'] for line in second_order.split('\n\n') if line]
+
+    assert set(first_order) < set(second_order)
+    assert len(second_order) == len(set(second_order))
+
+
+def test_fuzzer_top_k(webapp):
+    """The most similar fuzzy domains can be requested."""
+    hexdomain = binascii.hexlify('example.com')
+
+    response = webapp.get('/api/fuzz/{}?top_k=5'.format(hexdomain)).json
+    results = response['fuzzy_domains']
+
+    assert len(results) == 5
+    assert results[0]['domain'] == 'example.com'
+    assert results[0]['score'] == 1.0
+    assert 'next_cursor' not in response
+
+    for query in ('top_k=0', 'top_k=a', 'top_k=5&limit=5'):
+        response = webapp.get(
+            '/api/fuzz/{}?{}'.format(hexdomain, query), expect_errors=True
+        )
+        assert response.status_code == 400
+
+
+def test_fuzzer_top_k_over_budget_is_refused(webapp, monkeypatch):
+    """Ranking scores every fuzzy domain, so is refused over budget."""
+    monkeypatch.setattr('dnstwister.tools.FUZZ_BUDGET', 100)
+
+    def no_ranking(*args, **kwargs):
+        raise AssertionError('Ranked an over budget fuzz')
+    monkeypatch.setattr('dnstwister.tools.ranked_fuzzy_domains', no_ranking)
+
+    hexdomain = binascii.hexlify('thisisaverylongdomainname.com')
+    response = webapp.get(
+        '/api/fuzz/{}?top_k=1'.format(hexdomain), expect_errors=True
+    )
+    assert response.status_code == 400
@@ -0,0 +1,98 @@
+"""The API's batch IP resolution endpoint."""
+import binascii
+import json
+
+from dnstwister.tools import resolution_cache
+from dnstwister.tools import resolver
+
+
+def results(response):
+    """Return the streamed results, by domain."""
+    return dict((result['domain'], result)
+                for result
+                in map(json.loads, response.body.strip().split('\n')))
+
+
+def test_batch_resolve(webapp, monkeypatch):
+    """Each domain is resolved once, a line of JSON each."""
+    resolutions = {
+        'a.com': resolver.Resolution(resolver.RESOLVED, '1.2.3.4',
+                                     records={'mx': ['mx.a.com']}),
+        'b.com': resolver.Resolution(resolver.NXDOMAIN),
+    }
+    calls = []
+
+    def resolve(domain):
+        calls.append(domain)
+        return resolutions[domain]
+
+    monkeypatch.setattr('dnstwister.tools.resolve', resolve)
+
+    hexdomains = [binascii.hexlify('a.com'), binascii.hexlify('b.com')]
+    response = webapp.post_json('/api/ip/batch', hexdomains + hexdomains[:1])
+
+    assert response.content_type == 'application/x-ndjson'
+    assert sorted(calls) == ['a.com', 'b.com']
+    assert results(response) == {
+        'a.com': {
+            'domain': 'a.com',
+            'domain_as_hexadecimal': hexdomains[0],
+            'ip': '1.2.3.4',
+            'error': False,
+            'aaaa': [],
+            'mx': ['mx.a.com'],
+            'ns': [],
+        },
+        'b.com': {
+            'domain': 'b.com',
+            'domain_as_hexadecimal': hexdomains[1],
+            'ip': False,
+            'error': False,
+            'aaaa': [],
+            'mx': [],
+            'ns': [],
+        },
+    }
+
+
+def test_batch_resolve_uses_the_shared_cache(webapp, monkeypatch):
+    """Cached resolutions aren't resolved again, and new ones are cached."""
+    cache = resolution_cache.ResolutionCache()
+    cache.set('b.com', resolver.Resolution(resolver.RESOLVED, '9.9.9.9'))
+    monkeypatch.setattr('dnstwister.tools.resolution_cache.CACHE', cache)
+
+    calls = []
+
+    def _resolve(domain):
+        calls.append(domain)
+        return resolver.Resolution(resolver.RESOLVED, '1.2.3.4')
+
+    monkeypatch.setattr('dnstwister.tools._resolve', _resolve)
+
+    response = webapp.post_json(
+        '/api/ip/batch', [binascii.hexlify('a.com'), binascii.hexlify('b.com')]
+    )
+    streamed = results(response)
+
+    assert streamed['a.com']['ip'] == '1.2.3.4'
+    assert streamed['b.com']['ip'] == '9.9.9.9'
+    assert calls == ['a.com']
+    assert cache.get('a.com') == ('1.2.3.4', False)
+
+
+def test_batch_size_is_capped(webapp, monkeypatch):
+    """Over-sized batches are refused."""
+    monkeypatch.setattr('dnstwister.api.MAX_IP_BATCH_SIZE', 2)
+    hexdomains = [binascii.hexlify('{}.com'.format(i)) for i in range(3)]
+
+    response = webapp.post_json('/api/ip/batch', hexdomains, expect_errors=True)
+
+    assert response.status_code == 400
+
+
+def test_malformed_batches_are_refused(webapp):
+    """Batches must be lists of hex-encoded domains."""
+    for body in ({'domains': []}, ['not hex'], [1234]):
+        response = webapp.post_json('/api/ip/batch', body,
+                                    expect_errors=True)
+        assert response.status_code == 400
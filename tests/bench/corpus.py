@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# The domains the fuzzer benchmarks run against, by category.
+#
+CORPUS = {
+    'short': (
+        'a.com',
+        'abc.com',
+        'www.example.com',
+    ),
+    'long': (
+        'thisisaveryveryverylongdomainnameforbenchmarking.com',
+        # The bot domain from tests/test_slow_requests.py
+        'zzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzz.zzzzzzzzzzzzzzzzzzzzzzzzzppieo.com',
+    ),
+    'idn': (
+        u'єxample.com',
+        u'münchen.de',
+        u'bücher-shop.co.uk',
+    ),
+    'multi-label': (
+        'mail.internal.corp.example.co.uk',
+        'a.b.c.d.e.example.com.au',
+        'login.secure.bank.example.net',
+    ),
+}
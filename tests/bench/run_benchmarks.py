@@ -0,0 +1,256 @@
+# Fuzzer micro-benchmark suite, with regression thresholds.
+#
+# Times each of the fuzz_domain fuzzers separately, plus fuzz(), fuzz_iter()
+# and tools.analyse(), across the corpus in corpus.py. Each benchmark runs in
+# a fresh process per corpus category so that its peak RSS can be measured.
+# Records calls/sec, candidates/sec and the peak RSS increase, and compares
+# them to a JSON baseline.
+#
+# Exits with status 1 if any benchmark is slower, or uses more memory, than
+# the baseline by more than the threshold percentage. Timings are only
+# comparable on one machine, so the baseline isn't committed - record one
+# locally (--save) before making changes, then compare against it.
+#
+# Usage (from the repository root):
+#           PYTHONPATH=. python tests/bench/run_benchmarks.py [--threshold PERCENT] [--save] [--baseline PATH] [--only NAME]
+#
+# Eg:
+#           PYTHONPATH=. python tests/bench/run_benchmarks.py --save
+#           PYTHONPATH=. python tests/bench/run_benchmarks.py --threshold 25
+#
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.keywords as keywords
+import dnstwister.dnstwist.tlds as tlds
+import dnstwister.tools as tools
+import dnstwister.tools.fuzz_cache as fuzz_cache
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+THRESHOLD = 20.0
+
+# Each benchmark is repeated for at least MIN_TIME, REPEATS times, per corpus
+# category, and the best rate is kept - the slower runs are other processes
+# getting in the way.
+MIN_TIME = 0.1
+REPEATS = 5
+
+# Peak RSS changes smaller than this are noise.
+RSS_SLACK_KB = 2048
+
+
+def fuzzer_benchmark(tag):
+    """Benchmark one of fuzz_domain's private fuzzers."""
+    method = '_fuzz_domain__' + tag.lower().rstrip('*').replace(' ', '_')
+
+    def run(domain):
+        fuzzer = dnstwist.fuzz_domain(domain, tld_swap=tlds.TOP_N,
+                                      dictionary=keywords.MAX)
+        return sum(1 for _ in getattr(fuzzer, method)())
+    return run
+
+
+def fuzz(domain):
+    fuzzer = dnstwist.fuzz_domain(domain)
+    fuzzer.fuzz()
+    return len(fuzzer.domains)
+
+
+def fuzz_iter(domain):
+    return sum(1 for _ in dnstwist.fuzz_domain(domain).fuzz_iter())
+
+
+def analyse(domain):
+    fuzz_cache.CACHE.clear()
+    results = tools.analyse(domain)[1]['fuzzy_domains']
+
+    # Every report reads every hex value.
+    for result in results:
+        result['hex']
+    return len(results)
+
+
+BENCHMARKS = [('fuzzer.' + tag, fuzzer_benchmark(tag))
+              for tag
+              in dnstwist.fuzz_domain.STAGES]
+BENCHMARKS += [
+    ('fuzz', fuzz),
+    ('fuzz_iter', fuzz_iter),
+    ('tools.analyse', analyse),
+]
+
+
+def _proc_status_kb(field):
+    with open('/proc/self/status') as status:
+        return int(re.search(field + r':\s+(\d+)', status.read()).group(1))
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS, if the platform allows it
+    (Linux 4.0+), so the imports' peak doesn't hide the benchmark's.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        pass
+
+
+def peak_rss_kb():
+    """Peak RSS of this process, in kilobytes."""
+    try:
+        return _proc_status_kb('VmHWM')
+    except (IOError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(func, domains):
+    """Return the results of a benchmark on a corpus category's domains."""
+    reset_peak_rss()
+    rss_before = peak_rss_kb()
+
+    best = None
+    for _ in range(REPEATS):
+        calls = 0
+        candidates = 0
+        start = timeit.default_timer()
+        while True:
+            for domain in domains:
+                candidates += func(domain)
+                calls += 1
+            duration = timeit.default_timer() - start
+            if duration >= MIN_TIME:
+                break
+
+        if best is None or calls / duration > best['calls_per_sec']:
+            best = {
+                'calls_per_sec': round(calls / duration, 1),
+                'candidates_per_sec': round(candidates / duration, 1),
+            }
+
+    best['peak_rss_kb'] = peak_rss_kb() - rss_before
+    return best
+
+
+def run_all(only=None):
+    """Run every benchmark, on each corpus category, in its own process."""
+    results = {}
+    for (name, _) in BENCHMARKS:
+        if only is not None and name != only:
+            continue
+        for category in sorted(corpus.CORPUS):
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--child', name, category],
+                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+            )
+            results.setdefault(name, {})[category] = json.loads(
+                output.strip().splitlines()[-1]
+            )
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """Yield a description of each regression beyond threshold percent."""
+    for (name, categories) in sorted(results.items()):
+        for (category, result) in sorted(categories.items()):
+            try:
+                base = baseline[name][category]
+            except KeyError:
+                continue
+
+            for key in ('calls_per_sec', 'candidates_per_sec'):
+                if base[key] and result[key] < base[key] * (1 - threshold / 100):
+                    yield '{} {} {}: {} vs baseline {}'.format(
+                        name, category, key, result[key], base[key]
+                    )
+
+            limit = base['peak_rss_kb'] * (1 + threshold / 100) + RSS_SLACK_KB
+            if result['peak_rss_kb'] > limit:
+                yield '{} {} peak_rss_kb: {} vs baseline {}'.format(
+                    name, category, result['peak_rss_kb'], base['peak_rss_kb']
+                )
+
+
+def report(results, baseline):
+    """Print the results, with the change from the baseline."""
+    print '{:<24} {:<12} {:>12} {:>16} {:>14}'.format(
+        'benchmark', 'corpus', 'calls/sec', 'candidates/sec', 'peak RSS KB'
+    )
+    for (name, categories) in sorted(results.items()):
+        for (category, result) in sorted(categories.items()):
+            change = ''
+            base = baseline.get(name, {}).get(category)
+            if base and base['calls_per_sec']:
+                change = '{:+.1f}%'.format(
+                    100.0 * result['calls_per_sec'] / base['calls_per_sec'] - 100
+                )
+            print '{:<24} {:<12} {:>12} {:>16} {:>14} {:>8}'.format(
+                name, category, result['calls_per_sec'],
+                result['candidates_per_sec'], result['peak_rss_kb'], change
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fuzzer benchmarks.')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='regression threshold, percent')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--only', help='run a single benchmark')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        name, category = args.child
+        print json.dumps(measure(dict(BENCHMARKS)[name],
+                                 corpus.CORPUS[category]))
+        return 0
+
+    results = run_all(args.only)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    elif not args.save:
+        report(results, baseline)
+        print '\nNo baseline at {}, record one with --save.'.format(
+            args.baseline
+        )
+        return 0
+
+    report(results, baseline)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+        print '\nSaved baseline to {}'.format(args.baseline)
+        return 0
+
+    found = list(regressions(results, baseline, args.threshold))
+    if found:
+        print '\nRegressions beyond {}%:'.format(args.threshold)
+        for regression in found:
+            print '  ' + regression
+        return 1
+
+    print '\nNo regressions beyond {}%.'.format(args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""A local stub DNS server, for testing and benchmarking resolution without
+real DNS.
+"""
+import heapq
+import random
+import socket
+import threading
+import time
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+
+def fixture_zone(names, nxdomain=0.0, mx=0.0, seed=0):
+    """Return a zone for (IDNA encodable) names, leaving out a `nxdomain`
+    fraction of them (so they're NXDOMAIN) and giving a `mx` fraction of the
+    rest MX records. Names are chosen at random, repeatably for a seed.
+    """
+    rand = random.Random(seed)
+    zone = {}
+    for (i, name) in enumerate(sorted(set(names))):
+        name = name.encode('idna')
+        if rand.random() < nxdomain:
+            continue
+        records = {'A': '10.{}.{}.{}'.format(i >> 16 & 255, i >> 8 & 255,
+                                             i & 255)}
+        if rand.random() < mx:
+            records['MX'] = '10 mx.{}.'.format(name)
+        zone[name] = records
+    return zone
+
+
+class StubDNSServer(object):
+    """Answers queries over UDP on localhost from a zone of {name: ip} or,
+    for other record types, {name: {rdtype: rdata or [rdata, ...]}}. Names
+    not in the zone are NXDOMAIN, names with an ip of None (or without the
+    type queried) have no data, names in `servfail` are SERVFAIL, names in
+    `silent` are never answered and names in `delays` are answered after
+    that many seconds.
+
+    Answers have a TTL of `ttl` and NXDOMAINs a SOA record with a minimum of
+    `soa_minimum`, if set.
+
+    To simulate a real nameserver, every answer can be delayed by `latency`
+    seconds - or a random delay between (low, high) seconds - and a `loss`
+    fraction of queries dropped, at random repeatably for a seed.
+
+    The server listens on host:port, by default a free port on 127.0.0.1.
+    """
+    def __init__(self, zone, silent=(), delays=None, ttl=60,
+                 soa_minimum=None, host='127.0.0.1', port=0, servfail=(),
+                 latency=0, loss=0.0, seed=0):
+        self.zone = dict(zone)
+        self.servfail = set(servfail)
+        self.ttl = ttl
+        self.soa_minimum = soa_minimum
+        self.silent = set(silent)
+        self.delays = dict(delays or {})
+        self.latency = latency
+        self.loss = loss
+        self.queries = []
+        self._random = random.Random(seed)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+
+        # Delayed replies, as a heap of (due, sequence, reply, client).
+        self._outbox = []
+        self._outbox_changed = threading.Condition()
+        self._sequence = 0
+        self._closed = False
+        self._sender = threading.Thread(target=self._send_delayed)
+        self._sender.daemon = True
+
+    @property
+    def port(self):
+        """The port the server is listening on."""
+        return self._sock.getsockname()[1]
+
+    def __enter__(self):
+        self._thread.start()
+        self._sender.start()
+        return self
+
+    def __exit__(self, *args):
+        with self._outbox_changed:
+            self._closed = True
+            self._outbox_changed.notify()
+        self._sender.join()
+        self._sock.close()
+
+    def _rdatas(self, name, rdtype):
+        """Return the zone's rdatas of a type for a name."""
+        records = self.zone.get(name)
+        if not isinstance(records, dict):
+            records = {'A': records}
+        rdatas = records.get(dns.rdatatype.to_text(rdtype))
+        if rdatas is None:
+            return []
+        if isinstance(rdatas, basestring):
+            return [rdatas]
+        return list(rdatas)
+
+    def _answer(self, query):
+        """Return the response to a query."""
+        response = dns.message.make_response(query)
+        name = query.question[0].name.to_text(omit_final_dot=True)
+        rdtype = query.question[0].rdtype
+        rdatas = self._rdatas(name, rdtype)
+        if name in self.servfail:
+            response.set_rcode(dns.rcode.SERVFAIL)
+        elif rdatas:
+            response.answer.append(dns.rrset.from_text_list(
+                name + '.', self.ttl, 'IN', rdtype, rdatas
+            ))
+        else:
+            if name not in self.zone:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            if self.soa_minimum is not None:
+                response.authority.append(dns.rrset.from_text(
+                    name.split('.', 1)[-1] + '.', 3600, 'IN', 'SOA',
+                    'ns. hostmaster. 1 7200 900 1209600 {}'.format(
+                        self.soa_minimum
+                    )
+                ))
+        return name, response.to_wire()
+
+    def _delay(self, name):
+        """Return the seconds to delay the answer for a name by."""
+        if name in self.delays:
+            return self.delays[name]
+        if isinstance(self.latency, tuple):
+            return self._random.uniform(*self.latency)
+        return self.latency
+
+    def _serve(self):
+        while True:
+            try:
+                wire, client = self._sock.recvfrom(65535)
+            except socket.error:
+                return
+            name, reply = self._answer(dns.message.from_wire(wire))
+            self.queries.append(name)
+            if name in self.silent:
+                continue
+            if self.loss and self._random.random() < self.loss:
+                continue
+            delay = self._delay(name)
+            if delay > 0:
+                with self._outbox_changed:
+                    self._sequence += 1
+                    heapq.heappush(self._outbox, (time.time() + delay,
+                                                  self._sequence, reply,
+                                                  client))
+                    self._outbox_changed.notify()
+                continue
+            self._send(reply, client)
+
+    def _send_delayed(self):
+        """Send the delayed replies as they fall due."""
+        while True:
+            with self._outbox_changed:
+                while not self._closed:
+                    if self._outbox:
+                        wait = self._outbox[0][0] - time.time()
+                        if wait <= 0:
+                            break
+                        self._outbox_changed.wait(wait)
+                    else:
+                        self._outbox_changed.wait()
+                if self._closed:
+                    return
+                _, _, reply, client = heapq.heappop(self._outbox)
+            self._send(reply, client)
+
+    def _send(self, reply, client):
+        try:
+            self._sock.sendto(reply, client)
+        except socket.error:
+            pass
@@ -16,6 +16,8 @@ def test_resolve(webapp):
     payload = response.json
     ip_addr = payload['ip']
     del payload['ip']
+    for rdtype in ('aaaa', 'mx', 'ns'):
+        assert isinstance(payload.pop(rdtype), list)
 
     assert payload == {
         u'domain': u'dnstwister.report',
@@ -42,6 +44,8 @@ def test_unicode_resolve(webapp):
     payload = response.json
     ip_addr = payload['ip']
     del payload['ip']
+    for rdtype in ('aaaa', 'mx', 'ns'):
+        assert isinstance(payload.pop(rdtype), list)
 
     assert payload == {
         u'domain': u'xn--sterreich-z7a.icom.museum',
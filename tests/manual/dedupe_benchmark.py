@@ -0,0 +1,60 @@
+# Manual benchmark of the fuzz_iter() de-duplication backends.
+#
+# Streams a de-duplicated fuzz of a long domain with each backend, each in a
+# fresh process so the peak RSS is just that backend's, and reports peak RSS,
+# throughput and the candidates yielded (lower than exact means false
+# positives, higher means a full cuckoo filter let duplicates through).
+#
+# Usage (from the repository root):
+#           PYTHONPATH=. python tests/manual/dedupe_benchmark.py [error_rate] [capacity]
+#
+# Eg:
+#           PYTHONPATH=. python tests/manual/dedupe_benchmark.py 0.0001 100000
+#
+import datetime
+import resource
+import subprocess
+import sys
+
+import dnstwister.dnstwist.dedupe as dedupe
+import dnstwister.dnstwist.dnstwist as dnstwist
+
+
+DOMAIN = 'zzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzz.zzzzzzzzzzzzzzzzzzzzzzzzzppieo.com'
+
+
+def peak_rss_kb():
+    """Peak RSS of this process - kilobytes on Linux."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(backend, error_rate, capacity):
+    """Fuzz with one backend, printing the results."""
+    baseline = peak_rss_kb()
+    seen = dedupe.new_filter(backend, capacity, error_rate)
+
+    start = datetime.datetime.now()
+    count = 0
+    for _ in dnstwist.fuzz_domain(DOMAIN).fuzz_iter(de_dupe=seen):
+        count += 1
+    duration = (datetime.datetime.now() - start).total_seconds()
+
+    print '{:<8} {:>8} candidates {:>8.3f} secs {:>10.0f} candidates/sec {:>8} KB peak RSS increase'.format(
+        backend, count, duration, count / duration, peak_rss_kb() - baseline
+    )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--backend':
+        run(sys.argv[2], float(sys.argv[3]), int(sys.argv[4]))
+        sys.exit()
+
+    error_rate = sys.argv[1] if len(sys.argv) > 1 else str(dedupe.ERROR_RATE)
+    capacity = sys.argv[2] if len(sys.argv) > 2 else str(dedupe.CAPACITY)
+
+    print 'De-duplicating a fuzz of {}'.format(DOMAIN)
+    print 'error rate {}, capacity {}\n'.format(error_rate, capacity)
+    for backend in dedupe.BACKENDS:
+        subprocess.check_call([
+            sys.executable, __file__, '--backend', backend, error_rate, capacity
+        ])
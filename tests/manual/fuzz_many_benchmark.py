@@ -0,0 +1,76 @@
+# Manual benchmark of batch fuzzing vs. a fuzzer per domain.
+#
+# Simulates a deltas worker "cycle" of registered domains and reports the
+# throughput of the per-domain loop against dnstwist.fuzz_many().
+#
+# Usage (from the repository root):
+#           PYTHONPATH=. python tests/manual/fuzz_many_benchmark.py [domains]
+#
+# Eg:
+#           PYTHONPATH=. python tests/manual/fuzz_many_benchmark.py 500
+#
+import datetime
+import sys
+
+import dnstwister.dnstwist as dnstwist
+import dnstwister.dnstwist.validation as validation
+
+
+WORDS = ('example', 'dnstwister', 'paypal', 'amazon', 'bank', 'mail',
+         'login', 'secure', 'shop', 'news')
+TLDS = ('com', 'net', 'org', 'com.au', 'co.uk')
+
+
+def cycle(size):
+    """Return a cycle's worth of registered domains."""
+    domains = []
+    for i in range(size):
+        word = WORDS[i % len(WORDS)]
+        tld = TLDS[i % len(TLDS)]
+        domains.append('{}{}.{}'.format(word, i, tld))
+    return domains
+
+
+def per_domain(domains):
+    """The current approach - a fuzzer per domain."""
+    count = 0
+    for domain in domains:
+        for _ in dnstwist.DomainFuzzer(domain).fuzz_iter():
+            count += 1
+    return count
+
+
+def batched(domains):
+    """One fuzzer for all the domains."""
+    count = 0
+    for _ in dnstwist.fuzz_many(domains):
+        count += 1
+    return count
+
+
+def batched_de_duped(domains):
+    """One fuzzer for all the domains, de-duplicated across domains."""
+    count = 0
+    for _ in dnstwist.fuzz_many(domains, de_dupe=True):
+        count += 1
+    return count
+
+
+def bench(name, func, domains):
+    validation.STRICT.cache.clear()
+    start = datetime.datetime.now()
+    count = func(domains)
+    duration = (datetime.datetime.now() - start).total_seconds()
+    print '{:<20} {:>8} candidates {:>8.3f} secs {:>10.0f} candidates/sec'.format(
+        name, count, duration, count / duration
+    )
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    domains = cycle(size)
+
+    print 'Fuzzing a cycle of {} domains\n'.format(size)
+    bench('per-domain loop', per_domain, domains)
+    bench('fuzz_many', batched, domains)
+    bench('fuzz_many de-duped', batched_de_duped, domains)
@@ -0,0 +1,72 @@
+# Manual memory benchmark of FuzzResultSet vs. the old list of dicts.
+#
+# Fuzzes a domain, then reports the deep size of the results (including the
+# 'hex' column added by tools.analyse()) stored both ways.
+#
+# Usage (from the repository root):
+#           PYTHONPATH=. python tests/manual/fuzz_results_memory_benchmark.py [domain]
+#
+# Eg:
+#           PYTHONPATH=. python tests/manual/fuzz_results_memory_benchmark.py www.example.com
+#
+import sys
+
+import dnstwister.dnstwist as dnstwist
+import dnstwister.tools as tools
+
+
+def deep_size(obj, seen=None):
+    """Approximate the memory used by an object and everything it holds."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen)
+                    for (k, v) in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def list_of_dicts(results):
+    """The previous representation."""
+    dicts = []
+    for result in results:
+        entry = {'fuzzer': result['fuzzer'],
+                 'domain-name': result['domain-name']}
+        entry['hex'] = tools.encode_domain(entry['domain-name'])
+        dicts.append(entry)
+    return dicts
+
+
+def result_set(results):
+    """The FuzzResultSet representation, with every hex value read."""
+    results = dnstwist.FuzzResultSet(results)
+    results.add_column('hex', tools.encode_domain)
+    for result in results:
+        result['hex']
+    return results
+
+
+def report(name, obj, baseline=None):
+    size = deep_size(obj)
+    ratio = '' if baseline is None else '{:>6.1f}%'.format(100.0 * size / baseline)
+    print '{:<25} {:>12,} bytes {}'.format(name, size, ratio)
+    return size
+
+
+if __name__ == '__main__':
+    domain = sys.argv[1] if len(sys.argv) > 1 else 'www.example.com'
+
+    fuzzer = dnstwist.DomainFuzzer(domain)
+    fuzzer.fuzz()
+
+    print 'Storing {} results for {}\n'.format(len(fuzzer.domains), domain)
+    baseline = report('list of dicts', list_of_dicts(fuzzer.domains))
+    report('FuzzResultSet', result_set(fuzzer.domains), baseline)
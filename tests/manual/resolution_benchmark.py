@@ -0,0 +1,228 @@
+# Manual benchmark of domain resolution, against a local stub DNS server.
+#
+# Resolves the fuzzy domains of a set of report domains, from a fixture zone
+# with some NXDOMAINs, answered with some latency and packet loss, through:
+#
+#  * tools.resolve(), from N client threads.
+#  * tools.resolve_many() - the batch resolver - with N queries in flight.
+#  * The JSON and CSV exports, N at once.
+#  * workers.deltas.process_domain(), one report at a time as in the worker,
+#    with N queries in flight.
+#
+# and reports the domains resolved per second and the 50th, 95th and 99th
+# percentile latencies (per domain for tools.resolve() and resolve_many() -
+# from the domain's first query for resolve_many() - and per report for the
+# exports and deltas) at each concurrency N.
+#
+# The resolution cache is cleared before each run, and no real DNS is used -
+# the system resolver fallback always fails. Exports and deltas use the batch
+# resolver unless --no-batch is given. The deltas' retry passes aren't run.
+#
+# Usage (from the repository root):
+#           PYTHONPATH=. python tests/manual/resolution_benchmark.py [--latency MS] [--jitter MS] [--loss FRACTION] [--nxdomain FRACTION] [--reports N] [--concurrency N,N,...] [--no-batch]
+#
+# Eg:
+#           PYTHONPATH=. python tests/manual/resolution_benchmark.py
+#           PYTHONPATH=. python tests/manual/resolution_benchmark.py --latency 50 --loss 0.02 --concurrency 1,10,100
+#
+import argparse
+import binascii
+import os
+import Queue
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+os.environ.setdefault('GOOGLE_AUTH', 'false')
+
+import dns_stub
+import patches
+import dnstwister
+import dnstwister.tools as tools
+import dnstwister.workers.deltas as deltas
+from dnstwister.tools import resolution_cache
+from dnstwister.tools import upstreams
+
+
+WORDS = ('shop', 'bank', 'mail', 'login', 'news', 'cloud', 'pay', 'secure')
+
+
+def report_domains(count):
+    """Return the domains to build reports of."""
+    return ['{}{}.com'.format(WORDS[i % len(WORDS)], i) for i in range(count)]
+
+
+def no_gethostbyname(name):
+    raise socket.gaierror(socket.EAI_NONAME, 'Benchmarking without DNS')
+
+
+def use_server(server):
+    """Point the resolvers at the stub server, with a fresh cache."""
+    pool = upstreams.UpstreamPool(['127.0.0.1'], server.port)
+    tools.UPSTREAMS = pool
+    tools.RECORD_RESOLVER.upstream_pool = pool
+    tools.BATCH_RESOLVER.upstream_pool = pool
+    resolution_cache.CACHE.clear()
+
+
+def in_threads(func, items, threads):
+    """Call func(item) for each item from threads threads, returning the
+    latency of each call.
+    """
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    latencies = []
+
+    def work():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            start = time.time()
+            func(item)
+            latencies.append(time.time() - start)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies
+
+
+def bench_resolve(domains, concurrency):
+    return len(domains), in_threads(tools.resolve, domains, concurrency)
+
+
+def bench_resolve_many(domains, concurrency):
+    """Domains are timed from their first query being sent, not from the
+    start of the batch.
+    """
+    tools.RESOLVE_CONCURRENCY = concurrency
+    engine = tools.BATCH_RESOLVER
+    started = {}
+    start_query = engine._start
+
+    def timed_start(job, message, choices):
+        started.setdefault(job.domain, time.time())
+        return start_query(job, message, choices)
+
+    engine._start = timed_start
+    try:
+        latencies = [time.time() - started[domain]
+                     for (domain, _)
+                     in engine.resolve_many(domains, concurrency,
+                                            ordered=False)
+                     if domain in started]
+    finally:
+        del engine._start
+    return len(domains), latencies
+
+
+def export_bench(fmt):
+    def bench(reports, concurrency):
+        client = dnstwister.app.test_client()
+
+        def export(domain):
+            response = client.get('/search/{}/{}'.format(
+                binascii.hexlify(domain), fmt
+            ))
+            assert response.status_code == 200
+            response.get_data()
+
+        return (sum(len(tools.fuzzy_domains(domain)) for domain in reports),
+                in_threads(export, reports, concurrency))
+    return bench
+
+
+def bench_deltas(reports, concurrency):
+    tools.RESOLVE_CONCURRENCY = concurrency
+    dnstwister.repository.db = patches.SimpleKVDatabase()
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    try:
+        latencies = in_threads(deltas.process_domain, reports, 1)
+    finally:
+        sys.stdout = stdout
+    return (sum(len(tools.fuzzy_domains(domain)) for domain in reports),
+            latencies)
+
+
+def run(name, func, items, levels):
+    for concurrency in levels:
+        resolution_cache.CACHE.clear()
+        start = time.time()
+        resolved, latencies = func(items, concurrency)
+        duration = time.time() - start
+        print '{:<14} {:>5} {:>8} {:>10.0f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            name, concurrency, resolved, resolved / duration,
+            upstreams.percentile(latencies, 0.5) * 1000,
+            upstreams.percentile(latencies, 0.95) * 1000,
+            upstreams.percentile(latencies, 0.99) * 1000,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=20,
+                        help='milliseconds to delay answers by')
+    parser.add_argument('--jitter', type=float, default=10,
+                        help='milliseconds the latency varies by')
+    parser.add_argument('--loss', type=float, default=0.01,
+                        help='the fraction of queries dropped')
+    parser.add_argument('--nxdomain', type=float, default=0.8,
+                        help='the fraction of fuzzy domains not registered')
+    parser.add_argument('--reports', type=int, default=8,
+                        help='the number of reports to build')
+    parser.add_argument('--concurrency', default='1,10,50',
+                        help='the concurrency levels, comma-separated')
+    parser.add_argument('--no-batch', action='store_true',
+                        help='export and process deltas with resolve()')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    reports = report_domains(args.reports)
+    domains = sorted(set(
+        domain
+        for report in reports
+        for (_, domain) in tools.fuzzy_domains(report).pairs()
+        if tools.encode_domain(domain) is not None
+    ))
+    zone = dns_stub.fixture_zone(domains, nxdomain=args.nxdomain, mx=0.2)
+    latency = (max(args.latency - args.jitter, 0) / 1000.0,
+               (args.latency + args.jitter) / 1000.0)
+
+    socket.gethostbyname = no_gethostbyname
+    if not args.no_batch:
+        os.environ['feature.batch_resolve'] = 'true'
+
+    print 'Resolving {} domains ({} registered) of {} reports'.format(
+        len(domains), len(zone), len(reports)
+    )
+    print '{}-{}ms latency, {:.1%} loss\n'.format(
+        latency[0] * 1000, latency[1] * 1000, args.loss
+    )
+    print '{:<14} {:>5} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+        '', 'N', 'domains', 'domains/s', 'p50 ms', 'p95 ms', 'p99 ms'
+    )
+
+    with dns_stub.StubDNSServer(zone, latency=latency,
+                                loss=args.loss) as server:
+        use_server(server)
+        run('resolve', bench_resolve, domains, levels)
+        run('resolve_many', bench_resolve_many, domains, levels)
+        run('json export', export_bench('json'), reports, levels)
+        run('csv export', export_bench('csv'), reports, levels)
+        run('deltas', bench_deltas, reports, levels)
+
+    print '\n{} queries answered'.format(len(server.queries))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Manual benchmark of the NumPy bitsquatting and replacement fuzzers against
+# the pure Python ones, across label lengths - vectorized.MIN_LENGTH should be
+# about where NumPy starts to win.
+#
+# Usage (from the repository root):
+#           PYTHONPATH=. python tests/manual/vectorized_benchmark.py [repeats]
+#
+# Eg:
+#           PYTHONPATH=. python tests/manual/vectorized_benchmark.py 200
+#
+import random
+import sys
+import timeit
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.vectorized as vectorized
+
+
+LENGTHS = (8, 16, 32, 63, 128, 253)
+
+
+def best_time(func, repeats):
+    return min(timeit.repeat(func, number=repeats, repeat=3)) / repeats
+
+
+if __name__ == '__main__':
+    if not vectorized.AVAILABLE:
+        print 'NumPy is not installed.'
+        sys.exit(1)
+
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rand = random.Random(0)
+    fuzzer = dnstwist.fuzz_domain('a.com')
+
+    print '{:<14} {:>6} {:>12} {:>12} {:>8}'.format(
+        'fuzzer', 'length', 'python usec', 'numpy usec', 'speedup'
+    )
+    for name in ('bitsquatting', 'replacement'):
+        python = getattr(fuzzer, '_fuzz_domain__{}_python'.format(name))
+        numpy_ = getattr(vectorized, name)
+
+        for length in LENGTHS:
+            fuzzer.domain = ''.join(rand.choice('abcdefghijklmnopqrstuvwxyz')
+                                    for _ in range(length))
+
+            python_time = best_time(lambda: list(python()), repeats)
+            numpy_time = best_time(
+                lambda: numpy_(fuzzer.domain, dnstwist._STRIDE), repeats
+            )
+
+            print '{:<14} {:>6} {:>12.1f} {:>12.1f} {:>7.2f}x'.format(
+                name, length, python_time * 1e6, numpy_time * 1e6,
+                python_time / numpy_time
+            )
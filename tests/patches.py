@@ -52,6 +52,12 @@ class SimpleKVDatabase(object):
         except KeyError:
             pass
 
+    def incr(self, kind, key):
+        """Increment the integer value for a key, returning the new value."""
+        value = (self.get(kind, key) or 0) + 1
+        self.set(kind, key, value)
+        return value
+
     @staticmethod
     def to_db_datetime(datetime_obj):
         """Convert a datetime object to db datetime data.
@@ -77,6 +83,9 @@ class SimpleFuzzer(object):
     def fuzz(self):
         pass
 
+    def estimate(self, homoglyph_max=1000):
+        return {'Original*': 1, 'Pretend': 1}
+
     @property
     def domains(self):
         return [
@@ -94,6 +103,9 @@ class NoFuzzer(object):
     def fuzz(self):
         pass
 
+    def estimate(self, homoglyph_max=1000):
+        return {'Original*': 1}
+
     @property
     def domains(self):
         return [
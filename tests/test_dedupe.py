@@ -0,0 +1,81 @@
+"""Tests of the de-duplication filters."""
+import pytest
+
+import dnstwister.dnstwist.dedupe as dedupe
+import dnstwister.dnstwist.dnstwist as dnstwist
+
+
+def items(count, prefix='item'):
+    return ['{}{}.com'.format(prefix, i) for i in range(count)]
+
+
+@pytest.mark.parametrize('backend', dedupe.BACKENDS)
+def test_no_false_negatives(backend):
+    """Everything added is found again, up to capacity."""
+    seen = dedupe.new_filter(backend, capacity=5000, error_rate=0.001)
+
+    for item in items(5000):
+        seen.add(item)
+
+    assert all(item in seen for item in items(5000))
+
+
+@pytest.mark.parametrize('backend', (dedupe.BLOOM, dedupe.CUCKOO))
+def test_false_positive_rate(backend):
+    """The false positive rate is around the requested rate."""
+    seen = dedupe.new_filter(backend, capacity=5000, error_rate=0.01)
+    for item in items(5000):
+        seen.add(item)
+
+    false_positives = sum(1 for item in items(20000, 'other') if item in seen)
+    assert false_positives < 20000 * 0.01 * 2
+
+
+def test_filters_are_bounded():
+    """The probabilistic filters don't grow."""
+    bloom = dedupe.BloomFilter(capacity=1000, error_rate=0.01)
+    cuckoo = dedupe.CuckooFilter(capacity=1000, error_rate=0.01)
+    sizes = bloom.size, cuckoo.size
+
+    for item in items(10000):
+        bloom.add(item)
+        cuckoo.add(item)
+
+    assert (bloom.size, cuckoo.size) == sizes
+    assert cuckoo.overflows > 0
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        dedupe.new_filter('tree')
+
+
+@pytest.mark.parametrize('backend', dedupe.BACKENDS)
+def test_fuzz_iter_backends(backend):
+    """Each backend de-duplicates fuzz_iter() the same way, at a low enough
+    error rate.
+    """
+    domain = 'wwwmmmrn.example.com'
+    expected = [(r.fuzzer, r.domain)
+                for r
+                in dnstwist.fuzz_domain(domain).fuzz_iter(de_dupe=True)]
+    assert len(expected) == len(set(d for (_, d) in expected))
+
+    seen = dedupe.new_filter(backend, error_rate=0.000001)
+    results = [(r.fuzzer, r.domain)
+               for r
+               in dnstwist.fuzz_domain(domain).fuzz_iter(de_dupe=seen)]
+
+    assert results == expected
+
+
+def test_homoglyphs_share_the_filter():
+    """Homoglyphs that match another fuzzer's candidates are de-duplicated.
+    """
+    # 'n' is both a homoglyph of, and next to, 'm'.
+    fuzzer = dnstwist.fuzz_domain('mad.com')
+    assert [r.domain for r in fuzzer.fuzz_iter()].count('nad.com') == 2
+
+    results = [r.domain for r in fuzzer.fuzz_iter(de_dupe='exact')]
+    assert results.count('nad.com') == 1
+    assert len(results) == len(set(results))
@@ -1,5 +1,15 @@
 """Test of the basics of dnstwist."""
+import itertools
+import random
+import re
+
+import pytest
+
 import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.homoglyphs as homoglyphs
+import dnstwister.dnstwist.keywords as keywords
+import dnstwister.dnstwist.publicsuffix as publicsuffix
+import dnstwister.dnstwist.tlds as tlds
 
 
 def test_generator_is_same_as_original():
@@ -221,7 +231,7 @@ def test_unicode_fuzzing():
 
 def test_top_level_domains_db_is_loaded():
     """The TLD database should be loaded."""
-    assert dnstwist.DB_TLD
+    assert publicsuffix.RULES
 
 
 def test_basic_fuzz():
@@ -574,3 +584,275 @@ def test_basic_fuzz():
         {'domain-name': u'\u0561\u0561w.example.com', 'fuzzer': 'Homoglyph'},
         {'domain-name': u'\u0561\u0561\u0561.example.com', 'fuzzer': 'Homoglyph'}
     ]
+
+
+def test_fuzz_many_matches_fuzz_iter():
+    """Batch fuzzing yields the same as fuzzing each domain in turn."""
+    domains = ['abc.com', 'www.example.com', 'abc.com.au']
+
+    expected = []
+    for domain in domains:
+        for result in dnstwist.fuzz_domain(domain).fuzz_iter():
+            expected.append((domain, result.fuzzer, result.domain))
+
+    assert list(dnstwist.fuzz_many(domains)) == expected
+
+
+def test_fuzz_many_de_dupe():
+    """Batch fuzzing can de-duplicate across the source domains."""
+    results = list(dnstwist.fuzz_many(['abc.com', 'abd.com'], de_dupe=True))
+    candidates = [candidate for (_, _, candidate) in results]
+
+    assert len(candidates) == len(set(candidates))
+    assert ('abc.com', 'Original*', 'abc.com') in results
+
+    # 'abd.com' is a Replacement of 'abc.com', so isn't repeated as the
+    # original of the second domain.
+    assert ('abc.com', 'Replacement', 'abd.com') in results
+    assert ('abd.com', 'Original*', 'abd.com') not in results
+
+
+def test_fuzz_iter_order_is_deterministic():
+    """The fuzzers run in a fixed order, Original* first, Various last."""
+    results = list(dnstwist.fuzz_domain('abc.com').fuzz_iter())
+    tags = [r.fuzzer for r in results]
+
+    order = [tag for tag in dnstwist.fuzz_domain.STAGES if tag in tags]
+    assert sorted(set(tags), key=order.index) == order
+    assert tags == sorted(tags, key=order.index)
+    assert tags[0] == 'Original*'
+    assert tags[-1] == 'Various'
+
+
+def test_fuzz_iter_resumes_from_any_cursor():
+    """Resuming from a result's cursor gives the rest of the results."""
+    for domain in ('abc.com', 'wwwwaaab.com.au', u'\u0454xample.net'):
+        results = [(r.fuzzer, r.domain, r.cursor)
+                   for r
+                   in dnstwist.fuzz_domain(domain).fuzz_iter()]
+
+        for (i, (_, _, cursor)) in enumerate(results):
+            resumed = [(r.fuzzer, r.domain, r.cursor)
+                       for r
+                       in dnstwist.fuzz_domain(domain).fuzz_iter(cursor=cursor)]
+            assert resumed == results[i + 1:], (domain, i)
+
+
+def test_fuzz_iter_bad_cursors():
+    """Malformed cursors are rejected."""
+    fuzzer = dnstwist.fuzz_domain('abc.com')
+    for cursor in ('', 'zz', '00', 'ff00000000', '0000000000ff'):
+        with pytest.raises(dnstwist.InvalidCursor):
+            list(fuzzer.fuzz_iter(cursor=cursor))
+
+
+def _seen_set_reference(fuzzer, stage):
+    """The candidates a stage's fuzzer should produce, built naively and
+    de-duplicated with a set.
+    """
+    domain = fuzzer.domain
+    length = len(domain)
+    neighbours = fuzzer.neighbours
+
+    def edits():
+        if stage == 'Original*':
+            yield domain
+        elif stage == 'Addition':
+            for c in 'abcdefghijklmnopqrstuvwxyz':
+                yield domain + c
+        elif stage == 'Bitsquatting':
+            for (i, c) in enumerate(domain):
+                for mask in (1, 2, 4, 8, 16, 32, 64, 128):
+                    b = chr(ord(c) ^ mask)
+                    if b.isdigit() or b.islower() or b == '-':
+                        yield domain[:i] + b + domain[i+1:]
+        elif stage == 'Homoglyph':
+            for (char, glyphs) in homoglyphs.GLYPHS.items():
+                positions = [i for (i, c) in enumerate(domain) if c == char]
+                for (s, start) in enumerate(positions):
+                    for end in positions[s:]:
+                        if end - start + 1 >= length:
+                            continue
+                        window = domain[start:end + 1]
+                        for glyph in glyphs:
+                            yield (domain[:start] +
+                                   window.replace(char, glyph) +
+                                   domain[end + 1:])
+        elif stage == 'Hyphenation':
+            for i in range(1, length):
+                yield domain[:i] + '-' + domain[i:]
+        elif stage == 'Insertion':
+            for i in range(1, length - 1):
+                for c in neighbours.get(domain[i], ''):
+                    yield domain[:i] + c + domain[i:]
+                    yield domain[:i+1] + c + domain[i+1:]
+        elif stage == 'Omission':
+            for i in range(length):
+                yield domain[:i] + domain[i+1:]
+            yield re.sub(r'(.)\1+', r'\1', domain)
+        elif stage == 'Repetition':
+            for (i, c) in enumerate(domain):
+                if c.isalpha():
+                    yield domain[:i] + c + c + domain[i+1:]
+        elif stage == 'Replacement':
+            for (i, c) in enumerate(domain):
+                for n in neighbours.get(c, ''):
+                    yield domain[:i] + n + domain[i+1:]
+        elif stage == 'Subdomain':
+            for i in range(1, length):
+                if domain[i] not in '-.' and domain[i-1] not in '-.':
+                    yield domain[:i] + '.' + domain[i:]
+        elif stage == 'Transposition':
+            for i in range(length - 1):
+                yield domain[:i] + domain[i+1] + domain[i] + domain[i+2:]
+        elif stage == 'Vowel swap':
+            for (i, c) in enumerate(domain):
+                if c in 'aeiou':
+                    for vowel in 'aeiou':
+                        yield domain[:i] + vowel + domain[i+1:]
+        elif stage == 'Various':
+            for prefix in ('ww', 'www', 'www-'):
+                yield prefix + domain + '.com'
+            yield domain + 'com.com'
+        elif stage == 'TLD swap':
+            various = set(_seen_set_reference(fuzzer, 'Various'))
+            for tld in tlds.ranked('com', fuzzer.tld_ranking, fuzzer.tld_swap):
+                if domain + '.' + tld not in various:
+                    yield domain + '.' + tld
+        elif stage == 'Dictionary':
+            combinations = keywords.KEYWORDS.combinations(domain)
+            for (_, candidate) in itertools.islice(combinations,
+                                                   fuzzer.dictionary):
+                yield candidate
+
+    reference = set(edits())
+    if stage != 'Original*':
+        reference.discard(domain)
+    return reference
+
+
+@pytest.mark.parametrize('stage', dnstwist.fuzz_domain.STAGES)
+def test_fuzzers_need_no_seen_sets(stage):
+    """Property test: the structural de-duplication rules in the resumable
+    fuzzers skip exactly the duplicates a set of seen candidates would.
+    """
+    name = '_fuzz_domain__' + stage.lower().rstrip('*').replace(' ', '_')
+    fuzzer = dnstwist.fuzz_domain('a.com', tld_swap=20, dictionary=50)
+
+    rand = random.Random(1)
+    for _ in range(500):
+        alphabet = rand.choice(('aeiouu', 'aabbc-', 'abcdefghijklmnopqrstuvwxyz0-'))
+        domain = ''.join(rand.choice(alphabet) for _ in range(rand.randint(1, 12)))
+        fuzzer.domain = domain
+
+        candidates = [candidate
+                      for (_, candidate)
+                      in getattr(fuzzer, name)()]
+
+        assert len(candidates) == len(set(candidates)), domain
+        assert set(candidates) == _seen_set_reference(fuzzer, stage), domain
+
+
+def test_estimate_is_an_upper_bound():
+    """Property test: each fuzzer's estimate is at least as many candidates
+    as it generates.
+    """
+    rand = random.Random(2)
+    for _ in range(300):
+        alphabet = rand.choice(('aeiouu', 'aabbc-', 'abcdefghijklmnopqrstuvwxyz0-', u'\u0454\u00fcab'))
+        domain = ''.join(rand.choice(alphabet) for _ in range(rand.randint(1, 20)))
+        tld = rand.choice(('com', 'co.uk', 'net'))
+
+        fuzzer = dnstwist.fuzz_domain(domain + '.' + tld)
+        estimate = fuzzer.estimate(None)
+        assert estimate.keys() == list(dnstwist.fuzz_domain.STAGES)
+
+        for tag in dnstwist.fuzz_domain.STAGES:
+            name = '_fuzz_domain__' + tag.lower().rstrip('*').replace(' ', '_')
+            count = sum(1 for _ in getattr(fuzzer, name)())
+            assert count <= estimate[tag], (tag, domain, tld)
+
+
+def test_estimate_caps_homoglyphs():
+    """The homoglyph estimate is capped as for fuzz()."""
+    fuzzer = dnstwist.fuzz_domain('z' * 60 + '.com')
+
+    assert fuzzer.estimate()['Homoglyph'] == 1000
+    assert fuzzer.estimate(None)['Homoglyph'] > 1000
+    assert fuzzer.estimate(500)['Homoglyph'] == 500
+
+
+def test_second_order_is_opt_in():
+    """Second-order candidates follow the usual results, only on request."""
+    first_order = [(r.fuzzer, r.domain)
+                   for r
+                   in dnstwist.fuzz_domain('abc.com').fuzz_iter(de_dupe=True)]
+    results = [(r.fuzzer, r.domain)
+               for r
+               in dnstwist.fuzz_domain('abc.com').fuzz_iter(second_order=True)]
+
+    assert all('+' not in tag for (tag, _) in first_order)
+    assert results[:len(first_order)] == first_order
+
+    second_order = results[len(first_order):]
+    assert second_order
+    assert all('+' in tag for (tag, _) in second_order)
+
+    # Most plausible first.
+    assert second_order[0][0] == 'Replacement+Replacement'
+
+
+def test_second_order_de_duplication_and_budget():
+    """Second-order candidates are unique across the whole iteration, and
+    capped by the budget.
+    """
+    fuzzer = dnstwist.fuzz_domain('abc.com')
+    domains = [r.domain for r in fuzzer.fuzz_iter(second_order=True, budget=20000)]
+    assert len(domains) == len(set(domains))
+    assert 'abc.com' not in domains[1:]
+
+    results = list(fuzzer.fuzz_iter(second_order=True, budget=50))
+    assert 0 < sum(1 for r in results if '+' in r.fuzzer) <= 50
+    assert all(r.cursor is None for r in results if '+' in r.fuzzer)
+
+
+def test_second_order_budget_bounds_the_candidates_examined():
+    """Duplicate candidates count against the budget, so a fuzz with nothing
+    new to yield still stops after examining budget candidates.
+    """
+    class CountingSet(set):
+        lookups = 0
+
+        def __contains__(self, item):
+            CountingSet.lookups += 1
+            return set.__contains__(self, item)
+
+    fuzzer = dnstwist.fuzz_domain('abc.com')
+    everything = set()
+    list(fuzzer.fuzz_iter(de_dupe=everything, second_order=True, budget=10 ** 6))
+
+    list(fuzzer.fuzz_iter(de_dupe=CountingSet(everything)))
+    first_order, CountingSet.lookups = CountingSet.lookups, 0
+
+    results = list(fuzzer.fuzz_iter(de_dupe=CountingSet(everything),
+                                    second_order=True, budget=50))
+    assert not [r for r in results if '+' in r.fuzzer]
+    assert CountingSet.lookups - first_order <= 50
+
+
+def test_second_order_candidates_are_two_edits_away():
+    """Each second-order candidate is its second fuzzer applied to one of its
+    first fuzzer's candidates.
+    """
+    fuzzer = dnstwist.fuzz_domain('abc.com')
+    first_order = set(r.domain for r in fuzzer.fuzz_iter())
+    results = [r for r in fuzzer.fuzz_iter(second_order=True, budget=100)
+               if r.fuzzer == 'Replacement+Replacement']
+    assert results
+
+    # Replacing the same character twice moves two keys away from it.
+    for result in results:
+        label = result.domain[:-len('.com')]
+        assert len(label) == 3
+        assert sum(1 for (a, b) in zip(label, 'abc') if a != b) in (1, 2)
+        assert result.domain not in first_order
@@ -0,0 +1,139 @@
+"""Tests of the fuzz results cache."""
+import zlib
+
+import fakeredis
+import mock
+
+import dnstwister.dnstwist as dnstwist
+import dnstwister.tools as tools
+import dnstwister.tools.fuzz_cache as fuzz_cache
+import patches
+
+
+def test_fuzzy_domains_are_cached(monkeypatch):
+    """Fuzzing the same domain twice only runs the fuzzer once."""
+    fuzzers = []
+
+    class CountingFuzzer(patches.SimpleFuzzer):
+        def __init__(self, domain):
+            super(CountingFuzzer, self).__init__(domain)
+            fuzzers.append(domain)
+
+    monkeypatch.setattr('dnstwister.tools.dnstwist.DomainFuzzer', CountingFuzzer)
+
+    first = tools.fuzzy_domains('a.com')
+    second = tools.fuzzy_domains('a.com')
+
+    assert first == second
+    assert fuzzers == ['a.com']
+    assert fuzz_cache.CACHE.stats()['hits'] == 1
+    assert fuzz_cache.CACHE.stats()['misses'] == 1
+
+
+def test_callers_get_their_own_copy():
+    """Adding columns to the results doesn't touch the cached copy."""
+    results = tools.analyse('a.com')[1]['fuzzy_domains']
+    assert 'hex' in results[0]
+
+    assert 'hex' not in tools.fuzzy_domains('a.com')[0]
+
+
+def test_iterator_is_cached_once_complete():
+    """An iteration that's abandoned part-way isn't cached."""
+    iterator = tools.fuzzy_domains_iter('abc.com')
+    next(iterator)
+    assert fuzz_cache.CACHE.get('iter', 'abc.com') is None
+
+    expected = [(r.fuzzer, r.domain) for r in tools.fuzzy_domains_iter('abc.com')]
+    assert fuzz_cache.CACHE.get('iter', 'abc.com') is not None
+
+    cached = [(r.fuzzer, r.domain) for r in tools.fuzzy_domains_iter('abc.com')]
+    assert cached == expected
+
+
+def test_bounded_by_candidates_not_entries():
+    """Eviction is by total stored candidates."""
+    cache = fuzz_cache.FuzzCache(max_candidates=5)
+
+    cache.set('fuzz', 'a.com', dnstwist.FuzzResultSet([('Original*', 'a.com')] * 3))
+    cache.set('fuzz', 'b.com', dnstwist.FuzzResultSet([('Original*', 'b.com')] * 3))
+
+    assert cache.get('fuzz', 'a.com') is None
+    assert len(cache.get('fuzz', 'b.com')) == 3
+    assert cache.stats()['evictions'] == 1
+
+
+@mock.patch('redis.from_url', fakeredis.FakeStrictRedis)
+def test_fuzzer_version_is_part_of_the_key(monkeypatch):
+    """A new fuzzer version doesn't see the previous version's results."""
+    monkeypatch.setenv('feature.fuzz_cache_redis', 'true')
+    monkeypatch.setenv('REDIS_URL', 'redis://')
+    fakeredis.FakeStrictRedis().flushall()
+
+    fuzz_cache.FuzzCache(version='old').set(
+        'fuzz', 'a.com', dnstwist.FuzzResultSet([('Original*', 'a.com')])
+    )
+
+    assert fuzz_cache.FuzzCache(version='new').get('fuzz', 'a.com') is None
+    assert fuzz_cache.FuzzCache(version='old').get('fuzz', 'a.com') == [
+        {'fuzzer': 'Original*', 'domain-name': 'a.com'}
+    ]
+
+
+def test_version_is_a_hash_of_the_fuzzer(tmpdir):
+    """Changing any of the fuzzer's files changes the version."""
+    tmpdir.join('fuzzer.py').write('one')
+    before = fuzz_cache.fuzzer_version(str(tmpdir))
+
+    tmpdir.join('fuzzer.py').write('two')
+    assert fuzz_cache.fuzzer_version(str(tmpdir)) != before
+
+    assert len(fuzz_cache.VERSION) == 12
+
+
+@mock.patch('redis.from_url', fakeredis.FakeStrictRedis)
+def test_shared_tier(monkeypatch):
+    """Results are shared between processes via redis, if enabled."""
+    monkeypatch.setenv('feature.fuzz_cache_redis', 'true')
+    monkeypatch.setenv('REDIS_URL', 'redis://')
+    fakeredis.FakeStrictRedis().flushall()
+
+    domain = u'\u0454xample.com'
+    fuzzer = dnstwist.DomainFuzzer(domain)
+    fuzzer.fuzz()
+
+    fuzz_cache.FuzzCache().set('fuzz', domain, fuzzer.domains)
+
+    other_process = fuzz_cache.FuzzCache()
+    assert other_process.get('fuzz', domain) == fuzzer.domains
+    assert other_process.shared_hits == 1
+
+
+@mock.patch('redis.from_url', fakeredis.FakeStrictRedis)
+def test_corrupt_shared_results_are_misses(monkeypatch):
+    """Results that can't be decoded are fuzzed again, not fatal."""
+    monkeypatch.setenv('feature.fuzz_cache_redis', 'true')
+    monkeypatch.setenv('REDIS_URL', 'redis://')
+    fakeredis.FakeStrictRedis().flushall()
+
+    cache = fuzz_cache.FuzzCache()
+    cache.r_conn.set(cache._key('fuzz', 'a.com'), 'garbage')
+    cache.r_conn.set(cache._key('fuzz', 'b.com'), zlib.compress('not json'))
+
+    assert cache.get('fuzz', 'a.com') is None
+    assert cache.get('fuzz', 'b.com') is None
+    assert cache.shared_misses == 2
+    assert cache.shared_hits == 0
+
+
+def test_shared_tier_errors_are_not_fatal(monkeypatch):
+    """The cache is an optimisation, redis failing shouldn't stop fuzzing."""
+    monkeypatch.setenv('feature.fuzz_cache_redis', 'true')
+    monkeypatch.delenv('REDIS_URL', raising=False)
+
+    cache = fuzz_cache.FuzzCache()
+    cache.set('fuzz', 'a.com', dnstwist.FuzzResultSet([('Original*', 'a.com')]))
+
+    assert len(cache.get('fuzz', 'a.com')) == 1
+    assert cache.get('fuzz', 'b.com') is None
+    assert cache.shared_errors == 2
@@ -0,0 +1,86 @@
+"""Tests of the homoglyph generator."""
+import random
+import time
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.homoglyphs as homoglyphs
+
+
+def reference_homoglyphs(domain, MAX=None):
+    """The original (roughly cubic) dnstwist homoglyph algorithm."""
+    glyphs = homoglyphs._GLYPHS
+
+    yielded = 0
+    seen = set()
+
+    for ws in range(0, len(domain)):
+        for i in range(0, (len(domain)-ws)+1):
+            win = domain[i:i+ws]
+
+            j = 0
+            while j < ws:
+                c = win[j]
+                if c in glyphs:
+                    win_copy = win
+                    for g in glyphs[c]:
+                        win = win.replace(c, g)
+                        candidate = domain[:i] + win + domain[i+ws:]
+                        if candidate not in seen:
+                            seen.add(candidate)
+                            yield candidate
+                            yielded += 1
+                        win = win_copy
+
+                        if MAX is not None and yielded >= MAX:
+                            return
+                j += 1
+
+
+def random_domains(count, seed=1):
+    """Random domains, heavy on repeated and glyph-able characters."""
+    rand = random.Random(seed)
+    alphabets = ('abdilmnorw.-', 'zzzzo.', 'mnrrb', 'abcdefghijklmnopqrstuvwxyz0-')
+    for _ in range(count):
+        alphabet = rand.choice(alphabets)
+        length = rand.randint(1, 16)
+        yield ''.join(rand.choice(alphabet) for _ in range(length))
+
+
+def test_same_set_as_original_algorithm():
+    """Property test: same candidate set as the original, on random domains.
+    """
+    for domain in random_domains(500):
+        expected = set(reference_homoglyphs(domain))
+        assert set(homoglyphs.homoglyphs(domain)) == expected, domain
+
+
+def test_same_order_as_original_algorithm():
+    """The order is the same too, so budgeted output is unchanged."""
+    for domain in random_domains(200, seed=2):
+        expected = list(reference_homoglyphs(domain))
+        assert list(homoglyphs.homoglyphs(domain)) == expected, domain
+
+        budget = len(expected) // 2
+        assert (list(homoglyphs.homoglyphs(domain, budget=budget)) ==
+                list(reference_homoglyphs(domain, MAX=budget))), domain
+
+
+def test_no_glyph_is_its_own_character():
+    """The single-character de-duplication shortcut relies on this."""
+    for (char, glyphs) in homoglyphs.GLYPHS.items():
+        assert char not in glyphs
+
+
+def test_long_domains_are_fast_to_fuzz():
+    """The bot domain used to take seconds to fuzz via fuzz_iter()."""
+    domain = 'zzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzz.zzzzzzzzzzzzzzzzzzzzzzzzzppieo'
+
+    start = time.time()
+    candidates = list(homoglyphs.homoglyphs(domain))
+
+    assert len(candidates) == len(set(candidates))
+    assert len(candidates) == 15717
+
+    fuzzer = dnstwist.fuzz_domain(domain + '.com')
+    assert len(list(fuzzer.fuzz_iter())) > 0
+    assert time.time() - start < 2
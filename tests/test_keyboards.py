@@ -0,0 +1,81 @@
+"""Tests of the keyboard layout tables."""
+import random
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.keyboards as keyboards
+
+
+LAYOUTS = [keyboards.LAYOUTS[name] for name in keyboards.DEFAULT_LAYOUTS]
+
+
+def reference_replacement(domain):
+    """The original, per-layout, replacement algorithm."""
+    seen = set()
+    for i in range(0, len(domain)):
+        for keys in LAYOUTS:
+            if domain[i] in keys:
+                for c in keys[domain[i]]:
+                    candidate = domain[:i] + c + domain[i+1:]
+                    if candidate not in seen:
+                        seen.add(candidate)
+                        yield candidate
+
+
+def reference_insertion(domain):
+    """The original, per-layout, insertion algorithm."""
+    seen = set()
+    for i in range(1, len(domain)-1):
+        for keys in LAYOUTS:
+            if domain[i] in keys:
+                for c in keys[domain[i]]:
+                    for candidate in (domain[:i] + c + domain[i:],
+                                      domain[:i+1] + c + domain[i+1:]):
+                        if candidate not in seen:
+                            seen.add(candidate)
+                            yield candidate
+
+
+def random_domains(count, seed=1):
+    """Random domains, heavy on keys that differ between layouts."""
+    rand = random.Random(seed)
+    alphabets = ('azqwymp12-', 'aaqqzz', 'abcdefghijklmnopqrstuvwxyz0123456789-')
+    for _ in range(count):
+        alphabet = rand.choice(alphabets)
+        length = rand.randint(1, 16)
+        yield ''.join(rand.choice(alphabet) for _ in range(length))
+
+
+def test_merged_table_has_no_duplicates():
+    """Each character's neighbours are distinct and exclude itself."""
+    for (char, neighbours) in keyboards.NEIGHBOURS.items():
+        assert len(set(neighbours)) == len(neighbours)
+        assert char not in neighbours
+
+
+def test_same_output_as_per_layout_algorithm():
+    """Property test: same candidates, in the same order, as probing each
+    layout in turn.
+    """
+    for domain in random_domains(500):
+        fuzzer = dnstwist.fuzz_domain(domain + '.com')
+        fuzzer.domain = domain
+
+        replacement = [c for (_, c) in fuzzer._fuzz_domain__replacement()]
+        assert replacement == list(reference_replacement(domain)), domain
+
+        insertion = [c for (_, c) in fuzzer._fuzz_domain__insertion()]
+        assert insertion == list(reference_insertion(domain)), domain
+
+
+def test_layouts_are_data():
+    """Extra layouts can be merged in without changing the fuzzer."""
+    table = keyboards.neighbours(keyboards.DEFAULT_LAYOUTS + ('dvorak',))
+
+    assert table['a'].startswith(keyboards.NEIGHBOURS['a'])
+    assert 'o' in table['a']
+    assert 'o' not in keyboards.NEIGHBOURS['a']
+
+    fuzzer = dnstwist.fuzz_domain('a.com')
+    fuzzer.neighbours = table
+    fuzzer.fuzz()
+    assert {'domain-name': 'o.com', 'fuzzer': 'Replacement'} in list(fuzzer.domains)
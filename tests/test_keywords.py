@@ -0,0 +1,91 @@
+"""Tests of the keyword index and dictionary fuzzer."""
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.keywords as keywords
+import dnstwister.tools as tools
+
+
+def test_keywords_are_loaded_once():
+    """The keyword list is de-duplicated, in rank order."""
+    assert keywords.KEYWORDS.keywords[:3] == ('login', 'secure', 'account')
+    assert len(set(keywords.KEYWORDS.keywords)) == len(keywords.KEYWORDS)
+
+
+def test_affixes():
+    """Keywords a label already starts or ends with are stripped off."""
+    index = keywords.KeywordIndex(('login', 'my', 'secure'))
+
+    assert index.affixes('example') == []
+    assert index.affixes('example-login') == ['example']
+    assert index.affixes('myexample') == ['example']
+    assert index.affixes('login') == []
+
+
+def test_combinations():
+    index = keywords.KeywordIndex(('login', 'secure'))
+
+    assert [c for (_, c) in index.combinations('paypal-login')] == [
+        'paypal-loginlogin', 'paypal-login-login', 'loginpaypal-login', 'login-paypal-login',
+        'paypallogin', 'paypal-login', 'loginpaypal', 'login-paypal',
+        'paypal-loginsecure', 'paypal-login-secure', 'securepaypal-login', 'secure-paypal-login',
+        'paypalsecure', 'paypal-secure', 'securepaypal', 'secure-paypal',
+    ]
+
+
+def test_affix_bases_are_within_the_default_max():
+    """The affix bases are combined with the top keywords, rather than
+    after every keyword is combined with the label.
+    """
+    fuzzer = dnstwist.fuzz_domain('paypal-login.com', dictionary=keywords.MAX)
+    results = [r.domain for r in fuzzer.fuzz_iter() if r.fuzzer == 'Dictionary']
+
+    assert 'paypallogin.com' in results[:10]
+    assert 'paypal-secure.com' in results
+    assert 'account-paypal.com' in results
+
+
+def test_dictionary_fuzzer_is_opt_in_and_capped():
+    tags = [r.fuzzer for r in dnstwist.fuzz_domain('example.com').fuzz_iter()]
+    assert 'Dictionary' not in tags
+
+    fuzzer = dnstwist.fuzz_domain('www.example-login.com', dictionary=10)
+    results = [r.domain for r in fuzzer.fuzz_iter() if r.fuzzer == 'Dictionary']
+
+    assert results == [
+        'www.example-loginlogin.com',
+        'www.example-login-login.com',
+        'www.loginexample-login.com',
+        'www.login-example-login.com',
+        'www.examplelogin.com',
+        'www.loginexample.com',
+        'www.login-example.com',
+        'www.example-loginsecure.com',
+        'www.example-login-secure.com',
+    ]
+    assert fuzzer.estimate()['Dictionary'] == 10
+
+    # fuzz() de-duplicates, and omission got to www.examplelogin.com first.
+    fuzzer.fuzz()
+    assert [d['domain-name'] for d in fuzzer.domains if d['fuzzer'] == 'Dictionary'] == [
+        domain for domain in results if domain != 'www.examplelogin.com'
+    ]
+
+
+def test_dictionary_fuzzer_resumes():
+    """The dictionary results can be resumed from a cursor, like the rest."""
+    fuzzer = dnstwist.fuzz_domain('example-login.com', dictionary=20)
+    results = [(r.domain, r.cursor) for r in fuzzer.fuzz_iter()]
+
+    for (i, (_, cursor)) in enumerate(results[-25:], len(results) - 25):
+        resumed = [(r.domain, r.cursor) for r in fuzzer.fuzz_iter(cursor=cursor)]
+        assert resumed == results[i + 1:]
+
+
+def test_dictionary_feature_flag(monkeypatch):
+    """The dictionary fuzzer is enabled by feature flag in the tools."""
+    monkeypatch.setenv('feature.dictionary', 'true')
+    results = tools.fuzzy_domains('a.com')
+    candidates = [r['domain-name'] for r in results if r['fuzzer'] == 'Dictionary']
+
+    # A few are also other fuzzers' candidates.
+    assert tools.DICTIONARY_MAX - 10 < len(candidates) <= tools.DICTIONARY_MAX
+    assert candidates[:2] == ['alogin.com', 'a-login.com']
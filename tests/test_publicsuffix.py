@@ -0,0 +1,62 @@
+"""Tests of the public suffix index."""
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.publicsuffix as publicsuffix
+
+
+def test_simple_suffixes():
+    """Plain rules match, the longest rule wins."""
+    psl = publicsuffix.PSL
+
+    assert psl.public_suffix('www.example.com') == 'com'
+    assert psl.public_suffix('www.example.com.au') == 'com.au'
+    assert psl.split('www.example.co.uk') == ('www.example', 'co.uk')
+
+
+def test_default_rule():
+    """The implicit '*' rule applies unless we are strict about it."""
+    psl = publicsuffix.PSL
+
+    assert psl.public_suffix('example.notarealtld') == 'notarealtld'
+    assert psl.public_suffix('example.notarealtld', strict=True) is None
+
+
+def test_wildcard_and_exception_rules():
+    """Wildcards consume an extra label, exceptions give one back."""
+    psl = publicsuffix.PSL
+
+    assert psl.public_suffix('www.example.ck') == 'example.ck'
+    assert psl.public_suffix('www.ck') == 'ck'
+    assert psl.split('www.ck') == ('www', 'ck')
+
+    assert psl.public_suffix('a.b.kawasaki.jp') == 'b.kawasaki.jp'
+    assert psl.public_suffix('a.city.kawasaki.jp') == 'kawasaki.jp'
+
+
+def test_custom_rules():
+    """The trie can be built from any set of rules."""
+    psl = publicsuffix.PublicSuffixList(['uk', 'co.uk', '*.sch.uk', '!x.sch.uk'])
+
+    assert psl.public_suffix('a.b.co.uk') == 'co.uk'
+    assert psl.public_suffix('a.b.sch.uk') == 'b.sch.uk'
+    assert psl.public_suffix('a.x.sch.uk') == 'sch.uk'
+    assert psl.split('co.uk') is None
+
+
+def test_unicode_rules_match_both_forms():
+    """Unicode rules are also indexed in their IDNA form."""
+    psl = publicsuffix.PSL
+
+    assert psl.public_suffix(u'example.\u516c\u53f8.cn') == u'\u516c\u53f8.cn'
+    assert psl.public_suffix('example.xn--55qx5d.cn') == 'xn--55qx5d.cn'
+
+
+def test_fuzzer_uses_public_suffixes():
+    """The fuzzer splits the domain on the public suffix."""
+    fuzzer = dnstwist.fuzz_domain('www.example.co.uk')
+    assert (fuzzer.domain, fuzzer.tld) == ('www.example', 'co.uk')
+
+    fuzzer = dnstwist.fuzz_domain('example.com')
+    assert (fuzzer.domain, fuzzer.tld) == ('example', 'com')
+
+    fuzzer = dnstwist.fuzz_domain('co.uk')
+    assert (fuzzer.domain, fuzzer.tld) == ('co', 'uk')
@@ -0,0 +1,264 @@
+"""Tests of the resolution cache."""
+import socket
+import threading
+import time
+
+import fakeredis
+import mock
+
+import dnstwister.tools as tools
+import dnstwister.tools.resolution_cache as resolution_cache
+import dns_stub
+from dnstwister.tools import resolver
+from dnstwister.tools import upstreams
+
+
+class Clock(object):
+    """A clock that only moves when told to."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def resolved(ip_addr, ttl=60):
+    return resolver.Resolution(resolver.RESOLVED, ip_addr, ttl)
+
+
+def no_gethostbyname(domain):
+    raise socket.gaierror()
+
+
+def stub_resolver(monkeypatch, server):
+    """Point tools.resolve() at a stub server, with a fresh cache."""
+    monkeypatch.setattr(
+        'dnstwister.tools.RECORD_RESOLVER.upstream_pool',
+        upstreams.UpstreamPool(['127.0.0.1'], server.port)
+    )
+    monkeypatch.setattr('dnstwister.tools.socket.gethostbyname',
+                        no_gethostbyname)
+    cache = resolution_cache.ResolutionCache()
+    monkeypatch.setattr('dnstwister.tools.resolution_cache.CACHE', cache)
+    return cache
+
+
+def test_entries_expire_on_their_ttl():
+    """Entries last for their (clamped) DNS TTL."""
+    clock = Clock()
+    cache = resolution_cache.ResolutionCache(clock=clock)
+
+    cache.set('a.com', resolved('1.2.3.4', 120))
+    cache.set('b.com', resolved('1.2.3.5', 1))
+    cache.set('c.com', resolver.Resolution(resolver.ERROR, ttl=3600))
+
+    clock.now += resolution_cache.MIN_TTL - 1
+    assert cache.get('b.com') == ('1.2.3.5', False)
+
+    clock.now += 1
+    assert cache.get('a.com') == ('1.2.3.4', False)
+    assert cache.get('b.com') is None
+
+    clock.now += resolution_cache.RETRY_AFTER[resolver.ERROR]
+    assert cache.get('c.com') is None
+
+    clock.now += 120
+    assert cache.get('a.com') is None
+    assert cache.stats()['expirations'] == 3
+
+
+def test_failures_are_cached_briefly():
+    """Each class of failure has its own, short, lifetime."""
+    clock = Clock()
+    cache = resolution_cache.ResolutionCache(clock=clock)
+
+    cache.set('a.com', resolver.Resolution(resolver.TIMEOUT))
+    cache.set('b.com', resolver.Resolution(resolver.SERVFAIL))
+    cache.set('c.com', resolver.Resolution(resolver.NXDOMAIN, ttl=900))
+    cache.set('d.com', resolver.Resolution(resolver.NODATA))
+
+    clock.now += resolution_cache.RETRY_AFTER[resolver.TIMEOUT]
+    assert cache.get('a.com') is None
+    assert cache.get('b.com').status == resolver.SERVFAIL
+
+    clock.now += resolution_cache.RETRY_AFTER[resolver.SERVFAIL]
+    assert cache.get('b.com') is None
+    assert cache.get('c.com').status == resolver.NXDOMAIN
+
+    clock.now += resolution_cache.DEFAULT_TTL
+    assert cache.get('c.com').status == resolver.NXDOMAIN
+    assert cache.get('d.com') is None
+
+    clock.now += 900
+    assert cache.get('c.com') is None
+
+
+def test_resolve_caches_for_the_record_ttl(monkeypatch):
+    """tools.resolve() caches answers for their TTL."""
+    with dns_stub.StubDNSServer({'a.com': '1.2.3.4'}, ttl=300) as server:
+        cache = stub_resolver(monkeypatch, server)
+
+        assert tools.resolve('a.com') == ('1.2.3.4', False)
+        assert tools.resolve('a.com') == ('1.2.3.4', False)
+
+    assert server.queries == ['a.com'] * len(resolver.RECORD_TYPES)
+    (_, expires) = cache._local.get('resolve:a.com')
+    assert 295 < expires - time.time() <= 300
+
+
+def test_nxdomain_is_cached_for_the_soa_minimum(monkeypatch):
+    """NXDOMAINs are cached for the SOA minimum, if given."""
+    with dns_stub.StubDNSServer({}, soa_minimum=900) as server:
+        cache = stub_resolver(monkeypatch, server)
+
+        assert tools.resolve('missing.com') == (False, False)
+
+    (_, expires) = cache._local.get('resolve:missing.com')
+    assert 895 < expires - time.time() <= 900
+
+
+def test_batch_resolver_shares_the_cache(monkeypatch):
+    """The batch resolver reads and fills the same cache."""
+    cache = resolution_cache.ResolutionCache()
+    cache.set('b.com', resolved('9.9.9.9'))
+
+    with dns_stub.StubDNSServer({'a.com': '1.2.3.4'},
+                                soa_minimum=120) as server:
+        engine = resolver.BatchResolver(['127.0.0.1'], server.port,
+                                        cache=cache)
+        results = list(engine.resolve_many(['a.com', 'b.com', 'missing.com']))
+
+    assert results == [
+        ('a.com', ('1.2.3.4', False)),
+        ('b.com', ('9.9.9.9', False)),
+        ('missing.com', (False, False)),
+    ]
+    assert server.queries == ['a.com', 'missing.com']
+    assert cache.get('a.com') == ('1.2.3.4', False)
+    (_, expires) = cache._local.get('resolve:missing.com')
+    assert 115 < expires - time.time() <= 120
+
+
+def test_bounded_by_bytes():
+    """Eviction is by the approximate bytes stored."""
+    cache = resolution_cache.ResolutionCache(
+        max_bytes=resolution_cache.ENTRY_BYTES * 3
+    )
+
+    for i in range(5):
+        cache.set('{}.com'.format(i), resolved('1.2.3.4'))
+
+    assert cache.get('0.com') is None
+    assert cache.get('4.com') == ('1.2.3.4', False)
+    assert cache.stats()['evictions'] == 3
+    assert cache.stats()['bytes'] <= cache.stats()['max_bytes']
+
+
+def test_concurrent_misses_are_collapsed():
+    """Only one resolution is made for simultaneous misses."""
+    cache = resolution_cache.ResolutionCache()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_resolve(domain):
+        calls.append(domain)
+        started.set()
+        release.wait()
+        return resolved('1.2.3.4')
+
+    results = []
+
+    def fetch():
+        results.append(cache.fetch('a.com', slow_resolve))
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while cache.collapsed < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['a.com']
+    assert results == [('1.2.3.4', False)] * 5
+    assert cache.stats()['collapsed'] == 4
+
+
+def test_counters_are_thread_safe():
+    """Lookups from many threads are all counted."""
+    cache = resolution_cache.ResolutionCache()
+    cache.set('a.com', resolved('1.2.3.4'))
+
+    def lookup():
+        for _ in range(2000):
+            cache.get('a.com')
+            cache.get('b.com')
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats()['hits'] == 16000
+    assert cache.stats()['misses'] == 16000
+    assert cache.stats()['hit_ratio'] == 0.5
+
+
+def test_failed_resolutions_are_not_shared():
+    """Waiting callers retry if the resolution they waited for failed."""
+    cache = resolution_cache.ResolutionCache()
+
+    def broken_resolve(domain):
+        raise Exception('Oops')
+
+    try:
+        cache.fetch('a.com', broken_resolve)
+    except Exception:
+        pass
+
+    assert cache.fetch(
+        'a.com', lambda domain: resolved('1.2.3.4')
+    ) == ('1.2.3.4', False)
+
+
+@mock.patch('redis.from_url', fakeredis.FakeStrictRedis)
+def test_shared_tier(monkeypatch):
+    """Resolutions are shared between processes via redis, if enabled."""
+    monkeypatch.setenv('feature.resolution_cache_redis', 'true')
+    monkeypatch.setenv('REDIS_URL', 'redis://')
+    fakeredis.FakeStrictRedis().flushall()
+
+    resolution_cache.ResolutionCache().set(
+        u'\u0454xample.com',
+        resolver.Resolution(resolver.RESOLVED, '1.2.3.4', 60,
+                            {'a': ['1.2.3.4'], 'mx': ['mx.example.com']})
+    )
+
+    other_process = resolution_cache.ResolutionCache()
+    resolution = other_process.get(u'\u0454xample.com')
+    assert resolution == ('1.2.3.4', False)
+    assert resolution.status == resolver.RESOLVED
+    assert resolution.records == {'a': ['1.2.3.4'], 'mx': ['mx.example.com']}
+    assert other_process.shared_hits == 1
+    assert other_process.r_conn.ttl('resolve:\xd1\x94xample.com') == 60
+
+
+def test_stats_endpoint(webapp, monkeypatch):
+    """The cache counters are available from the API."""
+    cache = resolution_cache.ResolutionCache()
+    monkeypatch.setattr('dnstwister.tools.resolution_cache.CACHE', cache)
+
+    cache.set('a.com', resolved('1.2.3.4'))
+    cache.get('a.com')
+    cache.get('b.com')
+
+    stats = webapp.get('/api/stats/resolution').json['cache']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == 0.5
+    assert stats['entries'] == 1
@@ -0,0 +1,318 @@
+"""Test the batch resolver, against a local stub DNS server."""
+import binascii
+import time
+
+import dnstwister
+import dnstwister.tools as tools
+import dns_stub
+import patches
+import workers.deltas
+from dnstwister.tools import resolver
+
+
+ZONE = {
+    'a.com': '1.2.3.4',
+    'a.co': '5.6.7.8',
+    'b.com': '127.0.0.1',
+    'slow.com': '2.2.2.2',
+    'xn--xample-9uf.com': '3.3.3.3',
+}
+
+
+def batch_resolver(server, **kwargs):
+    return resolver.BatchResolver(['127.0.0.1'], server.port, **kwargs)
+
+
+def test_resolve_many():
+    """Results follow the tools.resolve() convention, in order."""
+    domains = ['a.com', 'missing.com', 'b.com', ',saoi9w3k490q2k4',
+               u'\u0454xample.com']
+
+    with dns_stub.StubDNSServer(ZONE) as server:
+        results = list(batch_resolver(server).resolve_many(domains))
+
+    assert results == [
+        ('a.com', ('1.2.3.4', False)),
+        ('missing.com', (False, False)),
+        ('b.com', (False, True)),
+        (',saoi9w3k490q2k4', (False, True)),
+        (u'\u0454xample.com', ('3.3.3.3', False)),
+    ]
+    assert ',saoi9w3k490q2k4' not in server.queries
+
+
+def test_resolutions_are_typed():
+    """Results carry their status, and TTL where DNS gives one."""
+    zone = {'a.com': '1.2.3.4', 'empty.com': None}
+    with dns_stub.StubDNSServer(zone, soa_minimum=120, servfail=['bad.com'],
+                                silent=['slow.com']) as server:
+        engine = batch_resolver(server, timeout=0.05, retries=0)
+        results = dict(engine.resolve_many(
+            ['a.com', 'missing.com', 'empty.com', 'bad.com', 'slow.com',
+             ',saoi9w3k490q2k4']
+        ))
+
+    assert dict((domain, (result.status, result.ttl))
+                for (domain, result) in results.items()) == {
+        'a.com': (resolver.RESOLVED, 60),
+        'missing.com': (resolver.NXDOMAIN, 120),
+        'empty.com': (resolver.NODATA, 120),
+        'bad.com': (resolver.SERVFAIL, None),
+        'slow.com': (resolver.TIMEOUT, None),
+        ',saoi9w3k490q2k4': (resolver.ERROR, None),
+    }
+    assert results['empty.com'] == (False, False)
+    assert results['bad.com'] == (False, True)
+    assert results['bad.com'].transient
+    assert results['slow.com'].transient
+    assert not results['missing.com'].transient
+
+
+def test_untyped_results_are_inferred():
+    """Plain (ip, error) tuples can be typed."""
+    assert resolver.Resolution.of(('1.2.3.4', False)).status == 'resolved'
+    assert resolver.Resolution.of((False, False)).status == 'nxdomain'
+    assert resolver.Resolution.of((False, True)).status == 'error'
+
+
+def test_unordered_results_stream_as_they_complete():
+    """A slow reply doesn't hold up the rest when unordered."""
+    domains = ['slow.com', 'a.com', 'a.co']
+
+    with dns_stub.StubDNSServer(ZONE, delays={'slow.com': 0.2}) as server:
+        engine = batch_resolver(server)
+        unordered = [domain for (domain, _)
+                     in engine.resolve_many(domains, ordered=False)]
+        ordered = [domain for (domain, _)
+                   in engine.resolve_many(domains)]
+
+    assert sorted(unordered[:2]) == ['a.co', 'a.com']
+    assert unordered[2] == 'slow.com'
+    assert ordered == domains
+
+
+def test_timeouts_are_retried_then_errors():
+    """Unanswered queries are retried, then are errors."""
+    with dns_stub.StubDNSServer(ZONE, silent=['a.co']) as server:
+        engine = batch_resolver(server, timeout=0.05, retries=2)
+        results = dict(engine.resolve_many(['a.co', 'a.com']))
+
+    assert results == {'a.co': (False, True), 'a.com': ('1.2.3.4', False)}
+    assert server.queries.count('a.co') == 3
+
+
+def test_late_replies_are_not_taken_for_retries():
+    """A reply to an attempt that timed out doesn't answer the retry."""
+    with dns_stub.StubDNSServer(ZONE, delays={'a.com': 0.5}) as server:
+        engine = batch_resolver(server, timeout=0.2, retries=1)
+        results = dict(engine.resolve_many(['a.com']))
+
+    assert results['a.com'].status == resolver.TIMEOUT
+    assert server.queries.count('a.com') == 2
+    assert engine.upstream_pool.stats()[0]['p50'] >= 0.2
+
+
+def test_concurrency_is_bounded_and_sockets_reused():
+    """No more queries are in flight than the concurrency, and sockets are
+    reused between queries and batches.
+    """
+    domains = ['a.com', 'a.co', 'slow.com', 'missing.com'] * 5
+    delays = dict((domain, 0.05) for domain in domains)
+
+    with dns_stub.StubDNSServer(ZONE, delays=delays) as server:
+        engine = batch_resolver(server)
+
+        start = time.time()
+        assert len(list(engine.resolve_many(domains, concurrency=20))) == 20
+        assert time.time() - start < 0.5
+
+        start = time.time()
+        assert len(list(engine.resolve_many(domains, concurrency=2))) == 20
+        assert time.time() - start >= 0.4
+
+    assert len(engine._idle.values()[0]) == 20
+    engine.close()
+
+
+def test_abandoned_batches_return_their_sockets():
+    """Stopping early leaves no sockets behind."""
+    with dns_stub.StubDNSServer(ZONE, silent=['a.co']) as server:
+        engine = batch_resolver(server)
+        results = engine.resolve_many(['a.com', 'a.co'], ordered=False)
+        assert next(results) == ('a.com', ('1.2.3.4', False))
+        results.close()
+
+    assert len(engine._idle.values()[0]) == 2
+    engine.close()
+
+
+def test_tools_use_batch_resolver_if_enabled(monkeypatch):
+    """tools.resolve_many() uses resolve() unless the feature is on."""
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+    )
+
+    with dns_stub.StubDNSServer(ZONE) as server:
+        monkeypatch.setattr(
+            'dnstwister.tools.BATCH_RESOLVER', batch_resolver(server)
+        )
+
+        assert list(tools.resolve_many(['a.com'])) == [
+            ('a.com', ('999.999.999.999', False))
+        ]
+
+        monkeypatch.setenv('feature.batch_resolve', 'true')
+
+        assert list(tools.resolve_many(['a.com'])) == [
+            ('a.com', ('1.2.3.4', False))
+        ]
+
+
+def test_exports_api_and_deltas_use_batch_resolver(webapp, monkeypatch):
+    """The exports, API and deltas worker resolve via the batch resolver."""
+    monkeypatch.setenv('feature.batch_resolve', 'true')
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    hexdomain = binascii.hexlify('a.com')
+
+    with dns_stub.StubDNSServer(ZONE) as server:
+        monkeypatch.setattr(
+            'dnstwister.tools.BATCH_RESOLVER', batch_resolver(server)
+        )
+
+        csv = webapp.get('/search/{}/csv'.format(hexdomain)).body
+        assert csv.strip().split('\n')[1:] == [
+            'a.com,Original*,a.com,1.2.3.4,False',
+            'a.com,Pretend,a.co,5.6.7.8,False',
+        ]
+
+        json = webapp.get('/search/{}/json'.format(hexdomain)).json
+        assert [entry['resolution']['ip']
+                for entry
+                in json['a.com']['fuzzy_domains']] == ['1.2.3.4', '5.6.7.8']
+
+        api = webapp.get('/api/ip/{}'.format(hexdomain)).json
+        assert api['ip'] == '1.2.3.4'
+
+        workers.deltas.process_domain('a.com')
+
+    assert dnstwister.repository.get_resolution_report('a.com') == {
+        'a.co': {'ip': '5.6.7.8', 'tweak': 'Pretend'},
+    }
+
+
+def test_records_are_resolved_together():
+    """A domain's A, AAAA, MX and NS records come back as one result."""
+    zone = {
+        'a.com': {
+            'A': ['1.2.3.5', '1.2.3.4'],
+            'AAAA': '2001:db8::1',
+            'MX': ['20 mx2.a.com.', '10 mx1.a.com.'],
+            'NS': ['ns2.a.com.', 'ns1.a.com.'],
+        },
+        'mail.com': {'MX': '10 mx.mail.com.'},
+    }
+    with dns_stub.StubDNSServer(zone, soa_minimum=120) as server:
+        engine = batch_resolver(server, rdtypes=resolver.RECORD_TYPES)
+        results = dict(engine.resolve_many(['a.com', 'mail.com', 'b.com']))
+
+    assert results['a.com'] == ('1.2.3.4', False)
+    assert results['a.com'].ttl == 60
+    assert results['a.com'].records == {
+        'a': ['1.2.3.4', '1.2.3.5'],
+        'aaaa': ['2001:db8::1'],
+        'mx': ['mx1.a.com', 'mx2.a.com'],
+        'ns': ['ns1.a.com', 'ns2.a.com'],
+    }
+
+    assert results['mail.com'] == (False, False)
+    assert results['mail.com'].status == resolver.NODATA
+    assert results['mail.com'].records == {'mx': ['mx.mail.com']}
+
+    assert results['b.com'].status == resolver.NXDOMAIN
+    assert results['b.com'].records == {}
+
+    # The other types aren't queried for domains that don't exist.
+    assert sorted(server.queries) == sorted(
+        ['a.com', 'mail.com'] * len(resolver.RECORD_TYPES) + ['b.com']
+    )
+
+
+def test_concurrency_counts_domains():
+    """A domain's follow-up queries are sent together, and don't count
+    against the concurrency.
+    """
+    zone = {'a.com': '1.2.3.4', 'a.co': '5.6.7.8'}
+    delays = {'a.com': 0.1, 'a.co': 0.1}
+    with dns_stub.StubDNSServer(zone, delays=delays) as server:
+        engine = batch_resolver(server, rdtypes=resolver.RECORD_TYPES)
+
+        start = time.time()
+        results = dict(engine.resolve_many(['a.com', 'a.co'], concurrency=1))
+        duration = time.time() - start
+
+    assert results == {'a.com': ('1.2.3.4', False), 'a.co': ('5.6.7.8', False)}
+
+    # Each domain's 'A' query, then its other queries at once.
+    assert 0.4 <= duration < 0.6
+    engine.close()
+
+
+def test_max_concurrency():
+    """A full batch at the most concurrency waits on more sockets than
+    select() can (FD_SETSIZE).
+    """
+    domains = ['{}.com'.format(i) for i in range(resolver.MAX_CONCURRENCY)]
+    zone = dns_stub.fixture_zone(domains, mx=1.0)
+    with dns_stub.StubDNSServer(zone, latency=0.3) as server:
+        engine = batch_resolver(server, rdtypes=resolver.RECORD_TYPES,
+                                timeout=5)
+        results = dict(engine.resolve_many(
+            domains, concurrency=resolver.MAX_CONCURRENCY
+        ))
+        engine.close()
+
+    assert len(results) == len(domains)
+    assert all(result.status == resolver.RESOLVED
+               for result in results.values())
+    assert len(server.queries) == len(domains) * len(resolver.RECORD_TYPES)
+
+
+def test_api_returns_all_records(webapp, monkeypatch):
+    """The IP API carries the AAAA, MX and NS records too."""
+    monkeypatch.setenv('feature.batch_resolve', 'true')
+    zone = {'a.com': {'A': '1.2.3.4', 'MX': '10 mx.a.com.'}}
+
+    with dns_stub.StubDNSServer(zone) as server:
+        monkeypatch.setattr(
+            'dnstwister.tools.BATCH_RESOLVER',
+            batch_resolver(server, rdtypes=resolver.RECORD_TYPES)
+        )
+        api = webapp.get('/api/ip/{}'.format(binascii.hexlify('a.com'))).json
+
+    assert api['ip'] == '1.2.3.4'
+    assert api['aaaa'] == []
+    assert api['mx'] == ['mx.a.com']
+    assert api['ns'] == []
+
+
+def test_stub_fixture_zone_latency_and_loss():
+    """The stub server can stand in for a slow, lossy, nameserver."""
+    domains = ['{}.com'.format(i) for i in range(100)]
+    zone = dns_stub.fixture_zone(domains, nxdomain=0.5)
+    assert 30 < len(zone) < 70
+
+    with dns_stub.StubDNSServer(zone, latency=(0.05, 0.1)) as server:
+        start = time.time()
+        results = dict(batch_resolver(server).resolve_many(domains))
+        assert 0.05 <= time.time() - start < 0.5
+
+    assert set(domain for (domain, result) in results.items()
+               if result[0]) == set(zone)
+
+    with dns_stub.StubDNSServer(zone, loss=1.0) as server:
+        engine = batch_resolver(server, timeout=0.05, retries=0)
+        assert all(result.status == resolver.TIMEOUT
+                   for (_, result) in engine.resolve_many(domains[:5]))
@@ -0,0 +1,74 @@
+"""Tests of the compact fuzz result set."""
+import json
+
+import pytest
+
+import dnstwister.dnstwist as dnstwist
+import dnstwister.tools as tools
+
+
+def test_result_set_behaves_like_a_list_of_dicts():
+    """Existing callers treat the results as a list of dicts."""
+    expected = [
+        {'domain-name': 'a.com', 'fuzzer': 'Original*'},
+        {'domain-name': 'b.com', 'fuzzer': 'Replacement'},
+        {'domain-name': 'c.com', 'fuzzer': 'Replacement'},
+    ]
+    results = dnstwist.FuzzResultSet(expected)
+
+    assert len(results) == 3
+    assert results == expected
+    assert list(results) == expected
+    assert sorted(results, reverse=True) == sorted(expected, reverse=True)
+
+    assert results[-1]['domain-name'] == 'c.com'
+    assert results[1].fuzzer == 'Replacement'
+    assert results[0].get('hex') is None
+    assert dict(results[0].items()) == expected[0]
+    assert json.loads(json.dumps(dict(results[0]))) == expected[0]
+
+    with pytest.raises(KeyError):
+        results[0]['hex']
+
+    with pytest.raises(IndexError):
+        results[3]
+
+
+def test_fuzzer_tags_are_interned():
+    """Each fuzzer tag is only stored once."""
+    fuzzer = dnstwist.DomainFuzzer('www.example.com')
+    fuzzer.fuzz()
+
+    results = fuzzer.domains
+    assert len(results._tag_names) == len(set(d['fuzzer'] for d in results))
+    assert results._tags.itemsize == 1
+
+
+def test_derived_columns_are_lazy():
+    """Derived columns are only computed for the results that are read."""
+    calls = []
+
+    def upper(domain):
+        calls.append(domain)
+        return domain.upper()
+
+    results = dnstwist.FuzzResultSet([('Original*', 'a.com'), ('Pretend', 'b.com')])
+    results.add_column('upper', upper)
+    assert calls == []
+
+    assert results[1]['upper'] == 'B.COM'
+    assert results[1]['upper'] == 'B.COM'
+    assert calls == ['b.com']
+
+    assert sorted(results[0].keys()) == ['domain-name', 'fuzzer', 'upper']
+
+
+def test_slicing_keeps_columns():
+    """Slices are result sets too, with the same derived columns."""
+    results = tools.analyse('a.com')[1]['fuzzy_domains']
+
+    tail = results[1:]
+    assert isinstance(tail, dnstwist.FuzzResultSet)
+    assert len(tail) == len(results) - 1
+    assert tail[0] == results[1]
+    assert tail[0]['hex'] == tools.encode_domain(tail[0]['domain-name'])
@@ -0,0 +1,114 @@
+"""Tests of the similarity scoring and ranking of fuzz results."""
+import random
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.scoring as scoring
+import dnstwister.tools as tools
+
+
+def reference_distance(first, second):
+    """Textbook optimal string alignment distance."""
+    rows = [[0] * (len(second) + 1) for _ in range(len(first) + 1)]
+    for i in range(len(first) + 1):
+        rows[i][0] = i
+    for j in range(len(second) + 1):
+        rows[0][j] = j
+    for i in range(1, len(first) + 1):
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i-1] == second[j-1] else 1
+            rows[i][j] = min(rows[i-1][j] + 1,
+                             rows[i][j-1] + 1,
+                             rows[i-1][j-1] + cost)
+            if (i > 1 and j > 1 and first[i-1] == second[j-2] and
+                    first[i-2] == second[j-1]):
+                rows[i][j] = min(rows[i][j], rows[i-2][j-2] + cost)
+    return rows[-1][-1]
+
+
+def test_distance():
+    """Property test: the prefix/suffix stripping doesn't change the
+    distance.
+    """
+    assert scoring.distance('kitten', 'sitting') == 3
+    assert scoring.distance('example', 'exmaple') == 1
+
+    rand = random.Random(4)
+    for _ in range(1000):
+        first = ''.join(rand.choice('abc') for _ in range(rand.randint(0, 8)))
+        second = ''.join(rand.choice('abc') for _ in range(rand.randint(0, 8)))
+        assert scoring.distance(first, second) == reference_distance(first, second)
+
+
+def test_skeleton():
+    """Confusable characters share a skeleton."""
+    assert scoring.skeleton('example') == scoring.skeleton(u'\u0435xample')
+    assert scoring.skeleton('modern') == scoring.skeleton('rnodern')
+    assert scoring.skeleton('example') != scoring.skeleton('exbmple')
+
+
+def test_scores():
+    scorer = scoring.Scorer('example.com')
+
+    assert scorer.score('example.com') == 1.0
+
+    # Homoglyphs and neighbouring keys score higher than arbitrary edits.
+    assert scorer.score(u'\u0435xample.com') > scorer.score('ezample.com')
+    assert scorer.score('ezample.com') > scorer.score('e7ample.com')
+    assert scorer.score('e7ample.com') > scorer.score('e77ample.com')
+    assert scorer.scores(['example.com', 'e7ample.com']) == [
+        1.0, scorer.score('e7ample.com')
+    ]
+
+
+def test_scores_share_distances(monkeypatch):
+    """A batch computes each distinct difference's distance once."""
+    computed = []
+    stripped_distance = scoring._stripped_distance
+
+    def counting_distance(first, second):
+        computed.append((first, second))
+        return stripped_distance(first, second)
+    monkeypatch.setattr(scoring, '_stripped_distance', counting_distance)
+
+    scorer = scoring.Scorer('example.com')
+    candidates = ['ezample.com', 'examplz.com', 'ezample.com', 'exampze.com']
+    scores = scorer.scores(candidates)
+
+    assert len(set(computed)) == len(computed) < 2 * len(candidates)
+    assert scores == [scorer.score(candidate) for candidate in candidates]
+
+
+def test_fuzz_iter_ranked():
+    """fuzz_iter() can yield best first, or just the top K."""
+    fuzzer = dnstwist.fuzz_domain('example.com')
+
+    ranked = list(fuzzer.fuzz_iter(ranked=True))
+    scores = [result.score for result in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert ranked[0].domain == 'example.com'
+    assert len(ranked) == len(list(fuzzer.fuzz_iter()))
+
+    top = list(fuzzer.fuzz_iter(top_k=10))
+    assert [(r.fuzzer, r.domain) for r in top] == [(r.fuzzer, r.domain) for r in ranked[:10]]
+    assert all(r.cursor is None for r in top)
+
+
+def test_ranked_fuzzy_domains():
+    ranked = tools.ranked_fuzzy_domains('example.com', top_k=5)
+
+    assert len(ranked) == 5
+    assert ranked[0]['domain-name'] == 'example.com'
+    assert ranked[0]['score'] == 1.0
+    scores = [result['score'] for result in ranked]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_analyse_ranking_feature_flag(monkeypatch):
+    results = tools.analyse('example.com')[1]['fuzzy_domains']
+    assert 'score' not in results[0]
+
+    monkeypatch.setenv('feature.score_ranking', 'true')
+    results = tools.analyse('example.com')[1]['fuzzy_domains']
+    scores = [result['score'] for result in results]
+    assert scores == sorted(scores, reverse=True)
+    assert results[0]['domain-name'] == 'example.com'
@@ -138,3 +138,21 @@ def test_post_unicode(webapp):
     assert unicode_domain in response.body
 
     assert 'höt.com (xn--ht-fka.com)' in response.body
+
+
+def test_over_budget_search_is_streamed(webapp, monkeypatch):
+    """Searches estimated to be over the fuzz budget are downgraded to the
+    streamed search, and can't be exported.
+    """
+    monkeypatch.setattr('dnstwister.tools.FUZZ_BUDGET', 100)
+    hexdomain = binascii.hexlify('abc.com')
+
+    response = webapp.get('/search/{}'.format(hexdomain))
+    assert response.status_code == 302
+    assert response.headers['location'] == 'http://localhost:80/search?ed=' + hexdomain
+
+    for fmt in ('json', 'csv'):
+        response = webapp.get(
+            '/search/{}/{}'.format(hexdomain, fmt), expect_errors=True
+        )
+        assert response.status_code == 400
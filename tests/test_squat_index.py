@@ -0,0 +1,142 @@
+"""Tests of the candidate to registered domain (squat) index."""
+import binascii
+
+import dnstwister
+import dnstwister.repository.postings as postings
+import patches
+import workers.deltas
+
+
+def test_packed_ids_round_trip():
+    for ids in ([], [0], [1, 2, 3], [5, 127, 128, 300, 16384, 2 ** 31]):
+        assert postings.unpack_ids(postings.pack_ids(ids)) == ids
+
+    # Sorted, and de-duplicated.
+    assert postings.unpack_ids(postings.pack_ids([3, 1, 3])) == [1, 3]
+
+    # Dense ids pack to a byte each.
+    assert len(postings.pack_ids(range(300))) == 400
+
+
+def test_packed_hashes_round_trip():
+    hashes = set(postings.candidate_hash(d) for d in ('a.com', u'\u0454.com', 'b.com'))
+    assert postings.unpack_hashes(postings.pack_hashes(hashes)) == hashes
+    assert postings.unpack_hashes(None) == set()
+    assert postings.candidate_hash('A.com') == postings.candidate_hash('a.com')
+
+
+def test_index_is_incremental(monkeypatch):
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    repository = dnstwister.repository
+
+    repository.update_squat_index('example.com', ['example.com', 'examp1e.com', 'exampl.com'])
+    repository.update_squat_index('exampl.com', ['exampl.com', 'exampl1.com', 'examp1e.com'])
+
+    assert repository.squatted_domains('examp1e.com') == ['example.com', 'exampl.com']
+    assert repository.squatted_domains('exampl.com') == ['example.com']
+    assert repository.squatted_domains('example.com') == []
+    assert repository.squatted_domains('nope.com') == []
+
+    # Candidates that are no longer generated are removed.
+    repository.update_squat_index('example.com', ['exampel.com'])
+    assert repository.squatted_domains('examp1e.com') == ['exampl.com']
+    assert repository.squatted_domains('exampel.com') == ['example.com']
+
+    # As are unregistered domains.
+    repository.unregister_domain('exampl.com')
+    assert repository.squatted_domains('examp1e.com') == []
+    assert repository.squatted_domains('exampl1.com') == []
+    assert not [key for key in repository.db.data if key.startswith('squat_posting:')
+                and repository.db.data[key] is None]
+
+
+def test_subscriptions_fan_out(monkeypatch):
+    """A candidate finds every subscription to the domains it squats."""
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    repository = dnstwister.repository
+
+    repository.subscribe_email('1', 'a@example.com', 'example.com', False)
+    repository.subscribe_email('2', 'b@example.com', 'example.com', False)
+    repository.subscribe_email('3', 'c@example.com', 'other.com', False)
+    repository.update_squat_index('example.com', ['examp1e.com'])
+    repository.update_squat_index('other.com', ['0ther.com'])
+
+    subs = sorted(sub_id for (sub_id, _) in repository.isubscriptions_for_candidate('examp1e.com'))
+    assert subs == ['1', '2']
+    assert list(repository.isubscriptions_for_candidate('nope.com')) == []
+
+    # Unsubscribing removes the subscription from the index.
+    repository.unsubscribe('1')
+    subs = [sub_id for (sub_id, _) in repository.isubscriptions_for_candidate('examp1e.com')]
+    assert subs == ['2']
+    repository.unsubscribe('2')
+    assert repository.db.get('email_sub_by_domain', 'example.com') is None
+
+
+def test_subscriptions_are_found_by_index(monkeypatch):
+    """Candidates find subscriptions without scanning them all."""
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    repository = dnstwister.repository
+
+    repository.subscribe_email('1', 'a@example.com', 'example.com', False)
+    repository.update_squat_index('example.com', ['examp1e.com'])
+
+    def no_scan():
+        raise AssertionError('Subscriptions were scanned')
+    monkeypatch.setattr(repository, 'isubscriptions', no_scan)
+
+    assert [sub_id for (sub_id, _) in repository.isubscriptions_for_candidate('examp1e.com')] == ['1']
+
+    # Re-indexing is idempotent.
+    repository.index_subscription('1', 'example.com')
+    assert repository.db.get('email_sub_by_domain', 'example.com') == ['1']
+
+
+def test_source_ids_are_allocated_by_increment(monkeypatch):
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    repository = dnstwister.repository
+
+    repository.update_squat_index('a.com', ['a.co'])
+    repository.update_squat_index('b.com', ['b.co'])
+    repository.update_squat_index('a.com', ['a.cm'])
+
+    assert repository.db.get('squat_source_id', 'a.com') == 0
+    assert repository.db.get('squat_source_id', 'b.com') == 1
+    assert repository.db.get('squat_meta', 'next_id') == 2
+
+
+def test_deltas_worker_maintains_index(capsys, monkeypatch):
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+    )
+    repository = dnstwister.repository
+
+    fuzzed = []
+    fuzzy_domains = dnstwister.tools.fuzzy_domains
+
+    def counting_fuzzy_domains(domain):
+        fuzzed.append(domain)
+        return fuzzy_domains(domain)
+    monkeypatch.setattr('dnstwister.tools.fuzzy_domains', counting_fuzzy_domains)
+
+    workers.deltas.process_domain('example.com')
+
+    assert repository.squatted_domains('example.co') == ['example.com']
+
+    # The index and the report share one fuzz.
+    assert fuzzed == ['example.com']
+
+
+def test_squats_api(webapp, monkeypatch):
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    dnstwister.repository.update_squat_index(u'\u0454xample.com', ['examp1e.com'])
+
+    hexdomain = binascii.hexlify('examp1e.com')
+    response = webapp.get('/api/squats/{}'.format(hexdomain)).json
+
+    assert response['domain'] == 'examp1e.com'
+    assert response['registered_domains'] == [u'\u0454xample.com'.encode('idna')]
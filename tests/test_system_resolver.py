@@ -0,0 +1,142 @@
+"""Tests of the bounded system resolver pool."""
+import socket
+import threading
+import time
+
+import pytest
+
+import dnstwister.tools as tools
+import dns_stub
+from dnstwister.tools import resolution_cache
+from dnstwister.tools import resolver
+from dnstwister.tools import system_resolver
+from dnstwister.tools import upstreams
+
+
+def test_lookups_are_passed_through(monkeypatch):
+    """Results and errors come back to the caller."""
+    def gethostbyname(name):
+        if name == 'missing.com':
+            raise socket.gaierror(socket.EAI_NONAME, 'Unknown')
+        return '1.2.3.4'
+
+    monkeypatch.setattr('socket.gethostbyname', gethostbyname)
+    pool = system_resolver.SystemResolver(workers=2)
+
+    assert pool.gethostbyname('a.com') == '1.2.3.4'
+    with pytest.raises(socket.gaierror):
+        pool.gethostbyname('missing.com')
+
+    stats = pool.stats()
+    assert stats['submitted'] == 2
+    assert stats['completed'] == 2
+
+
+def test_slow_lookups_time_out_and_fill_the_queue(monkeypatch):
+    """Callers don't wait on a slow system resolver, and lookups are refused
+    once the queue is full.
+    """
+    release = threading.Event()
+
+    def slow_gethostbyname(name):
+        release.wait()
+        return '1.2.3.4'
+
+    monkeypatch.setattr('socket.gethostbyname', slow_gethostbyname)
+    pool = system_resolver.SystemResolver(workers=1, max_queue=1,
+                                          timeout=0.05)
+
+    # Ties up the only worker.
+    with pytest.raises(system_resolver.Timeout):
+        pool.gethostbyname('a.com')
+
+    # Waits in the queue.
+    with pytest.raises(system_resolver.Timeout):
+        pool.gethostbyname('b.com')
+
+    start = time.time()
+    with pytest.raises(system_resolver.Overloaded):
+        pool.gethostbyname('c.com')
+    assert time.time() - start < 0.05
+
+    stats = pool.stats()
+    assert stats['busy'] == 1
+    assert stats['queue_depth'] == 1
+    assert stats['max_queue_depth'] == 1
+    assert stats['timeouts'] == 2
+    assert stats['rejected'] == 1
+
+    # The abandoned, queued, lookup is dropped rather than run.
+    release.set()
+    while pool.stats()['dropped'] == 0:
+        time.sleep(0.01)
+    assert pool.stats()['completed'] == 1
+
+
+def test_resolve_does_not_wait_on_the_system_resolver(monkeypatch):
+    """tools.resolve() gives up on a slow fallback."""
+    release = threading.Event()
+
+    def slow_gethostbyname(name):
+        release.wait()
+        return '1.2.3.4'
+
+    monkeypatch.setattr('socket.gethostbyname', slow_gethostbyname)
+    monkeypatch.setattr('dnstwister.tools.resolution_cache.CACHE',
+                        resolution_cache.ResolutionCache())
+    monkeypatch.setattr('dnstwister.tools.SYSTEM_RESOLVER',
+                        system_resolver.SystemResolver(timeout=0.05))
+
+    with dns_stub.StubDNSServer({}, silent=['a.com']) as server:
+        monkeypatch.setattr(
+            'dnstwister.tools.RECORD_RESOLVER.upstream_pool',
+            upstreams.UpstreamPool(['127.0.0.1'], server.port,
+                                   default_timeout=0.05)
+        )
+
+        start = time.time()
+        resolution = tools.resolve('a.com')
+        assert time.time() - start < 0.5
+
+    release.set()
+    assert resolution == (False, True)
+    assert resolution.status == resolver.TIMEOUT
+
+
+def test_negative_answers_skip_the_system_resolver(monkeypatch):
+    """NXDOMAIN and no data answers are final, only failures fall back."""
+    lookups = []
+
+    class RecordingResolver(object):
+        def gethostbyname(self, name):
+            lookups.append(name)
+            raise socket.gaierror(socket.EAI_NONAME, 'Unknown')
+
+    monkeypatch.setattr('dnstwister.tools.resolution_cache.CACHE',
+                        resolution_cache.ResolutionCache())
+    monkeypatch.setattr('dnstwister.tools.SYSTEM_RESOLVER',
+                        RecordingResolver())
+
+    zone = {'nodata.com': None}
+    with dns_stub.StubDNSServer(zone, servfail=['broken.com']) as server:
+        monkeypatch.setattr(
+            'dnstwister.tools.RECORD_RESOLVER.upstream_pool',
+            upstreams.UpstreamPool(['127.0.0.1'], server.port)
+        )
+
+        assert tools.resolve('missing.com').status == resolver.NXDOMAIN
+        assert tools.resolve('nodata.com').status == resolver.NODATA
+        assert lookups == []
+
+        assert tools.resolve('broken.com') == (False, False)
+        assert lookups == ['broken.com']
+
+
+def test_stats_endpoint(webapp, monkeypatch):
+    """The pool's queue is visible from the API."""
+    monkeypatch.setattr('dnstwister.tools.SYSTEM_RESOLVER',
+                        system_resolver.SystemResolver(workers=3))
+
+    stats = webapp.get('/api/stats/resolution').json['system_resolver']
+    assert stats['workers'] == 3
+    assert stats['queue_depth'] == 0
@@ -0,0 +1,70 @@
+"""Tests of the ranked TLD index."""
+import pytest
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.tlds as tlds
+import dnstwister.tools as tools
+
+
+def test_index_is_icann_only():
+    """Private suffixes (blogspot.com etc) are never swapped in."""
+    assert 'com' in tlds.TOP_LEVEL
+    assert 'org.uk' in tlds.SIBLINGS['uk']
+    assert 'github.io' not in tlds.SIBLINGS.get('io', ())
+
+
+def test_rankings():
+    """Each ranking puts its preferred TLDs first."""
+    assert tlds.ranked('com', tlds.POPULARITY, 3) == ['cn', 'de', 'net']
+    assert tlds.ranked('com', tlds.ABUSE, 3) == ['tk', 'ml', 'ga']
+
+    # The same country first, then typos of the TLD.
+    assert tlds.ranked('co.uk', top_n=3) == ['uk', 'ac.uk', 'gov.uk']
+    assert tlds.ranked('com', top_n=1) == ['co']
+
+
+@pytest.mark.parametrize('ranking', tlds.RANKINGS)
+def test_ranked_is_capped_and_unique(ranking):
+    for tld in ('com', 'co.uk', 'de', 'notatld'):
+        swaps = tlds.ranked(tld, ranking, top_n=200)
+        assert len(swaps) == 200
+        assert len(set(swaps)) == 200
+        assert tld not in swaps
+
+
+def test_unknown_ranking():
+    with pytest.raises(ValueError):
+        tlds.ranked('com', 'alphabetical')
+
+
+def test_tld_swap_is_opt_in():
+    """The TLD-swap fuzzer only runs when asked for."""
+    tags = [r.fuzzer for r in dnstwist.fuzz_domain('example.com').fuzz_iter()]
+    assert 'TLD swap' not in tags
+
+    fuzzer = dnstwist.fuzz_domain('example.co.uk', tld_swap=5)
+    results = [(r.fuzzer, r.domain) for r in fuzzer.fuzz_iter()]
+
+    # example.uk is already a "Various" result.
+    assert results[-4:] == [
+        ('TLD swap', 'example.ac.uk'),
+        ('TLD swap', 'example.gov.uk'),
+        ('TLD swap', 'example.ltd.uk'),
+        ('TLD swap', 'example.me.uk'),
+    ]
+    assert ('Various', 'example.uk') in results
+
+    fuzzer.fuzz()
+    assert list(fuzzer.domains.pairs())[-4:] == results[-4:]
+    assert fuzzer.estimate()['TLD swap'] == 5
+
+
+def test_tld_swap_feature_flag(monkeypatch):
+    """The TLD-swap fuzzer is enabled by feature flag in the tools."""
+    assert 'TLD swap' not in [r['fuzzer'] for r in tools.fuzzy_domains('a.com')]
+
+    monkeypatch.setenv('feature.tld_swap', 'true')
+    results = tools.fuzzy_domains('a.com')
+    swapped = [r['domain-name'] for r in results if r['fuzzer'] == 'TLD swap']
+    assert len(swapped) == tools.TLD_SWAP_TOP_N
+    assert swapped[0] == 'a.co'
@@ -0,0 +1,182 @@
+"""Tests of upstream nameserver health and latency tracking."""
+import socket
+
+import dnstwister.tools as tools
+import dns_stub
+from dnstwister.tools import resolution_cache
+from dnstwister.tools import resolver
+from dnstwister.tools import upstreams
+
+
+class Clock(object):
+    """A clock that only moves when told to."""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def no_gethostbyname(domain):
+    raise socket.gaierror()
+
+
+def test_timeout_is_derived_from_p95():
+    """Timeouts follow the observed latency, within limits."""
+    upstream = upstreams.Upstream('127.0.0.1', default_timeout=0.5)
+
+    for _ in range(upstreams.MIN_SAMPLES - 1):
+        upstream.success(0.01)
+    assert upstream.timeout == 0.5
+
+    upstream.success(0.04)
+    assert upstream.p95 == 0.04
+    assert upstream.timeout == 0.04 * upstreams.TIMEOUT_MULTIPLIER
+
+    for _ in range(upstreams.WINDOW):
+        upstream.success(0.001)
+    assert upstream.timeout == upstreams.MIN_TIMEOUT
+
+    for _ in range(upstreams.WINDOW):
+        upstream.success(10)
+    assert upstream.timeout == upstreams.MAX_TIMEOUT
+
+
+def test_timeouts_back_off():
+    """Timeouts count as latencies, so frequent ones raise the timeout."""
+    upstream = upstreams.Upstream('127.0.0.1')
+    for _ in range(19):
+        upstream.success(0.1)
+    assert upstream.timeout == 0.2
+
+    upstream.failure(upstream.timeout)
+    upstream.failure(upstream.timeout)
+    assert upstream.timeout == 0.4
+    assert upstream.stats()['samples'] == 21
+
+
+def test_circuit_breaker():
+    """Consecutive failures open the breaker, which is tried again after
+    the cool-down.
+    """
+    clock = Clock()
+    upstream = upstreams.Upstream('127.0.0.1', clock=clock)
+
+    for _ in range(upstreams.FAILURE_THRESHOLD - 1):
+        upstream.failure()
+    assert upstream.available
+
+    upstream.failure()
+    assert upstream.state == upstreams.OPEN
+    assert not upstream.available
+
+    clock.now += upstreams.COOLDOWN
+    assert upstream.available
+    assert upstream.state == upstreams.HALF_OPEN
+
+    upstream.failure()
+    assert not upstream.available
+
+    clock.now += upstreams.COOLDOWN
+    assert upstream.available
+    upstream.success(0.01)
+    assert upstream.state == upstreams.CLOSED
+
+
+def test_high_failure_rates_open_the_breaker():
+    """Intermittent failures open the breaker too, if frequent enough."""
+    upstream = upstreams.Upstream('127.0.0.1')
+    for _ in range(upstreams.MIN_SAMPLES):
+        upstream.success(0.01)
+        upstream.failure()
+    assert upstream.available
+
+    upstream.failure()
+    assert upstream.state == upstreams.OPEN
+
+
+def test_pool_prefers_healthy_fast_upstreams():
+    """Open upstreams are skipped, the rest are tried fastest first."""
+    clock = Clock()
+    pool = upstreams.UpstreamPool(['10.0.0.1', '10.0.0.2', '10.0.0.3'],
+                                  clock=clock)
+    slow, fast, broken = pool.upstreams
+    for _ in range(upstreams.MIN_SAMPLES):
+        slow.success(0.2)
+        fast.success(0.02)
+    for _ in range(upstreams.FAILURE_THRESHOLD):
+        broken.failure()
+
+    assert pool.choose() == [fast, slow]
+
+    for _ in range(upstreams.FAILURE_THRESHOLD):
+        slow.failure()
+        clock.now += 1
+        fast.failure()
+    assert pool.choose() == [broken, slow, fast]
+
+
+def test_resolve_routes_around_an_unresponsive_upstream(monkeypatch):
+    """tools.resolve() fails over, and stops trying a dead nameserver."""
+    monkeypatch.setattr('dnstwister.tools.socket.gethostbyname',
+                        no_gethostbyname)
+    monkeypatch.setattr('dnstwister.tools.resolution_cache.CACHE',
+                        resolution_cache.ResolutionCache())
+    zone = dict(('{}.com'.format(i), '1.2.3.4') for i in range(10))
+
+    with dns_stub.StubDNSServer(zone, silent=zone.keys()) as dead:
+        with dns_stub.StubDNSServer(zone, host='127.0.0.2',
+                                    port=dead.port) as alive:
+            pool = upstreams.UpstreamPool(['127.0.0.1', '127.0.0.2'],
+                                          dead.port, default_timeout=0.05)
+            monkeypatch.setattr(
+                'dnstwister.tools.RECORD_RESOLVER.upstream_pool', pool
+            )
+
+            for domain in sorted(zone):
+                assert tools.resolve(domain) == ('1.2.3.4', False)
+
+    # Each domain's queries are sent together, so the breaker opens during
+    # the second domain.
+    assert set(dead.queries) == set(sorted(zone)[:2])
+    assert set(alive.queries) == set(zone)
+    assert pool.upstreams[0].state == upstreams.OPEN
+
+
+def test_batch_resolver_records_latency_and_failures():
+    """The batch resolver feeds the upstream stats."""
+    zone = {'a.com': '1.2.3.4'}
+    with dns_stub.StubDNSServer(zone, silent=['b.com']) as server:
+        pool = upstreams.UpstreamPool(['127.0.0.1'], server.port,
+                                      default_timeout=0.05)
+        engine = resolver.BatchResolver(upstream_pool=pool, retries=0)
+        assert dict(engine.resolve_many(['a.com', 'b.com'])) == {
+            'a.com': ('1.2.3.4', False),
+            'b.com': (False, True),
+        }
+
+    stats = pool.stats()[0]
+    assert stats['queries'] == 2
+    assert stats['failures'] == 1
+    assert stats['p50'] < 0.05
+
+
+def test_stats_endpoint(webapp, monkeypatch):
+    """Upstream state is available from the API."""
+    pool = upstreams.UpstreamPool(['10.0.0.1'])
+    pool.upstreams[0].success(0.01)
+    monkeypatch.setattr('dnstwister.tools.UPSTREAMS', pool)
+
+    stats = webapp.get('/api/stats/resolution').json['upstreams']
+    assert stats == [{
+        'address': '10.0.0.1',
+        'consecutive_failures': 0,
+        'failure_rate': 0.0,
+        'failures': 0,
+        'p50': 0.01,
+        'p95': 0.01,
+        'queries': 1,
+        'samples': 1,
+        'state': 'closed',
+        'timeout': upstreams.DEFAULT_TIMEOUT,
+    }]
@@ -0,0 +1,88 @@
+"""Tests of the domain validation engine."""
+import idna
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.lru as lru
+import dnstwister.dnstwist.validation as validation
+
+
+def test_ascii_fast_path_skips_idna(monkeypatch):
+    """Plain ASCII domains never need IDNA encoding."""
+    def fail(*args, **kwargs):
+        raise AssertionError('IDNA encoding used')
+
+    validator = validation.DomainValidator()
+    monkeypatch.setattr(validator, '_encode', fail)
+
+    assert validator.is_valid('www.example.com')
+    assert not validator.is_valid('-www.example.com')
+    assert len(validator.cache) == 0
+
+
+def test_ascii_a_labels_still_checked():
+    """ASCII domains that (might) hold A-labels take the IDNA path."""
+    assert validation.is_valid_domain('xn--sterreich-z7a.icom.museum')
+    assert not validation.is_valid_domain('xn--zz.com')
+
+    # Hyphens in the 3rd and 4th positions are reserved by IDNA...
+    assert not validation.is_valid_domain('ab--cd.com')
+
+    # ...but are fine if we're relaxed about it.
+    assert validation.is_valid_domain('ab--cd.com', relaxed=True)
+
+
+def test_unicode_encodings_are_cached():
+    """Non-ASCII domains are only IDNA-encoded once."""
+    validator = validation.DomainValidator(cache_size=2)
+    domain = u'www.\u0454xample.com'
+
+    assert validator.is_valid(domain)
+    assert validator.is_valid(domain)
+    assert validator.cache.hits == 1
+    assert validator.cache.misses == 1
+
+    assert validator.encode(domain) == idna.encode(domain)
+
+
+def test_relaxed_mode_skips_label_checks():
+    """Relaxed validation skips the IDNA codepoint checks, without patching
+    the idna module.
+    """
+    domain = u'amaz\u039fn.net'
+
+    assert not validation.is_valid_domain(domain)
+    assert validation.is_valid_domain(domain, relaxed=True)
+
+    original = idna.core.check_label
+    fuzzer = dnstwist.fuzz_domain('amazon.net')
+    fuzzer.fuzz()
+    assert idna.core.check_label is original
+    assert domain in [d['domain-name'] for d in fuzzer.domains]
+
+
+def test_bad_input():
+    """Garbage is invalid, not an exception."""
+    assert not validation.is_valid_domain(None)
+    assert not validation.is_valid_domain(5)
+    assert not validation.is_valid_domain('')
+    assert not validation.is_valid_domain('\xc3\xa9.com')
+    assert not validation.is_valid_domain('a' * 64 + '.com')
+    assert not validation.is_valid_domain('a' * 64 + '.com', relaxed=True)
+
+
+def test_lru_is_bounded_by_weight():
+    """The LRU evicts the least-recently-used entries by total weight."""
+    cache = lru.LRUCache(5, weigh=lambda key, value: len(value))
+
+    cache.set('a', [1, 2])
+    cache.set('b', [1, 2])
+    assert cache.get('a') == [1, 2]
+
+    cache.set('c', [1, 2])
+    assert cache.get('b') is lru.MISSING
+    assert cache.get('a') == [1, 2]
+    assert cache.weight == 4
+    assert cache.evictions == 1
+
+    cache.set('d', [1, 2, 3, 4, 5, 6])
+    assert 'd' not in cache
@@ -0,0 +1,68 @@
+"""Tests of the NumPy bitsquatting and replacement fuzzers."""
+import random
+
+import pytest
+
+import dnstwister.dnstwist.dnstwist as dnstwist
+import dnstwister.dnstwist.vectorized as vectorized
+
+
+needs_numpy = pytest.mark.skipif(
+    not vectorized.AVAILABLE, reason='NumPy is not installed'
+)
+
+
+@needs_numpy
+@pytest.mark.parametrize('name', ('bitsquatting', 'replacement'))
+def test_vectorized_matches_python(name):
+    """Property test: the vectorized fuzzers' output, including resuming
+    part-way through, is identical to the Python fuzzers'.
+    """
+    rand = random.Random(3)
+    fuzzer = dnstwist.fuzz_domain('a.com')
+    python = getattr(fuzzer, '_fuzz_domain__{}_python'.format(name))
+    numpy_ = getattr(vectorized, name)
+
+    for _ in range(200):
+        length = rand.randint(1, 100)
+        label = ''.join(rand.choice('abcdefghijklmnopqrstuvwxyz0123456789-.')
+                        for _ in range(length))
+        fuzzer.domain = label
+
+        for start in (0, 1, 300, rand.randint(0, length * dnstwist._STRIDE)):
+            expected = list(python(start))
+            assert numpy_(label, dnstwist._STRIDE, start) == expected
+            assert numpy_(unicode(label), dnstwist._STRIDE, start) == expected
+
+
+@needs_numpy
+def test_vectorized_keeps_unicode():
+    """Unicode labels give Unicode candidates, as for the Python fuzzers."""
+    candidates = vectorized.bitsquatting(u'a' * 20, dnstwist._STRIDE)
+    assert all(isinstance(c, unicode) for (_, c) in candidates)
+
+
+def test_usable(monkeypatch):
+    """Short and non-ASCII labels, and missing NumPy, use the Python
+    fuzzers.
+    """
+    long_label = 'a' * vectorized.MIN_LENGTH
+    assert not vectorized.usable(long_label[1:])
+    assert not vectorized.usable(u'\u0454' + long_label)
+    assert vectorized.usable(long_label) == vectorized.AVAILABLE
+
+    monkeypatch.setattr(vectorized, 'AVAILABLE', False)
+    assert not vectorized.usable(long_label)
+
+
+def test_fuzz_is_the_same_without_numpy(monkeypatch):
+    domain = 'thisisaveryveryverylongdomainnameforbenchmarking.com'
+    fuzzer = dnstwist.fuzz_domain(domain)
+    fuzzer.fuzz()
+    expected = list(fuzzer.domains.pairs())
+
+    monkeypatch.setattr(vectorized, 'AVAILABLE', False)
+    fuzzer = dnstwist.fuzz_domain(domain)
+    fuzzer.fuzz()
+
+    assert list(fuzzer.domains.pairs()) == expected
@@ -5,6 +5,7 @@ import time
 import dnstwister
 import patches
 import workers.deltas
+from dnstwister.tools import resolver
 
 
 def test_invalid_domain_is_unregistered(capsys, monkeypatch):
@@ -238,3 +239,162 @@ def test_domains_iter_lists_all_domains(capsys, monkeypatch):
     repository.register_domain(domain)
 
     assert list(repository.iregistered_domains()) == [domain]
+
+
+def reprocess(domain):
+    """Mark a domain's delta report as old, and process it again."""
+    old_date = datetime.datetime.now() - datetime.timedelta(days=10)
+    db_key = u'delta_report_updated:{}'.format(domain)
+    dnstwister.repository.db._data[db_key] = old_date.strftime(
+        '%Y-%m-%dT%H:%M:%SZ'
+    )
+    return workers.deltas.process_domain(domain)
+
+
+def test_transient_failures_are_retried_not_deleted(capsys, monkeypatch):
+    """Timeouts are retried after the pass over the domains, and don't
+    delete previous resolutions.
+    """
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    sleeps = []
+    monkeypatch.setattr('workers.deltas.time.sleep', sleeps.append)
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve', lambda domain: ('999.999.999.999', False)
+    )
+    repository = dnstwister.repository
+
+    domain = u'www.\u0454xample.com'
+    other_domain = u'www.example.net'
+    assert workers.deltas.process_domain(domain) == {}
+
+    calls = []
+
+    def timing_out(domain):
+        calls.append(domain)
+        return resolver.Resolution(resolver.TIMEOUT)
+
+    monkeypatch.setattr('dnstwister.tools.resolve', timing_out)
+    retries = {
+        domain: reprocess(domain),
+        other_domain: workers.deltas.process_domain(other_domain),
+    }
+    assert retries == {
+        domain: {u'www.\u0454xample.co': 'Pretend'},
+        other_domain: {u'www.example.ne': 'Pretend'},
+    }
+    assert len(calls) == 2
+
+    # The retries are one pass at a time, across the domains.
+    workers.deltas.retry_transient_failures(retries)
+    assert len(calls) == 2 * (workers.deltas.RETRIES + 1)
+    assert sleeps == [workers.deltas.RETRY_DELAY] * workers.deltas.RETRIES
+
+    assert repository.get_resolution_report(domain) == {
+        u'www.\u0454xample.co': {'ip': '999.999.999.999', 'tweak': 'Pretend'}
+    }
+    assert repository.get_delta_report(domain) == {
+        'deleted': [],
+        'new': [],
+        'updated': []
+    }
+
+    results = [resolver.Resolution(resolver.SERVFAIL),
+               resolver.Resolution(resolver.RESOLVED, '000.999.999.999')]
+    monkeypatch.setattr('dnstwister.tools.resolve',
+                        lambda domain: results.pop(0))
+    retries = {domain: reprocess(domain)}
+    assert repository.get_delta_report(domain)['updated'] == []
+
+    workers.deltas.retry_transient_failures(retries)
+    assert repository.get_delta_report(domain)['updated'] == [
+        (u'www.\u0454xample.co', '999.999.999.999', '000.999.999.999')
+    ]
+    assert repository.get_resolution_report(domain) == {
+        u'www.\u0454xample.co': {'ip': '000.999.999.999', 'tweak': 'Pretend'}
+    }
+
+
+def test_stable_nxdomains_are_skipped(capsys, monkeypatch):
+    """Fuzzy domains that are NXDOMAIN twice running aren't re-resolved for
+    their negative TTL, but are by the next day's pass.
+    """
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    calls = []
+
+    def nxdomain(domain):
+        calls.append(domain)
+        return resolver.Resolution(resolver.NXDOMAIN, ttl=ttl[0])
+
+    ttl = [86400]
+    monkeypatch.setattr('dnstwister.tools.resolve', nxdomain)
+
+    domain = u'www.\u0454xample.com'
+    workers.deltas.process_domain(domain)
+    reprocess(domain)
+    assert len(calls) == 2
+
+    reprocess(domain)
+    assert len(calls) == 2
+
+    recheck = dnstwister.repository.get_nxdomains(domain)[
+        u'www.\u0454xample.co'
+    ]
+    assert recheck > datetime.datetime.now() + datetime.timedelta(hours=11)
+    assert recheck < datetime.datetime.now() + datetime.timedelta(
+        seconds=workers.deltas.PERIOD
+    )
+    assert dnstwister.repository.get_resolution_report(domain) == {}
+
+    # Without a negative TTL, they're always re-resolved.
+    ttl[0] = None
+    dnstwister.repository.update_nxdomains(domain, {
+        u'www.\u0454xample.co': datetime.datetime.now()
+    })
+    reprocess(domain)
+    reprocess(domain)
+    assert len(calls) == 4
+
+
+def test_mail_and_ipv6_records_are_reported(capsys, monkeypatch):
+    """MX and AAAA records are kept in the resolution report, and domains
+    with only those are reported too.
+    """
+    monkeypatch.setattr('dnstwister.repository.db', patches.SimpleKVDatabase())
+    monkeypatch.setattr(
+        'dnstwister.tools.dnstwist.DomainFuzzer', patches.SimpleFuzzer
+    )
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve',
+        lambda domain: resolver.Resolution(
+            resolver.NODATA, records={'mx': ['mx.example.co']}
+        )
+    )
+
+    domain = u'www.\u0454xample.com'
+    workers.deltas.process_domain(domain)
+
+    assert dnstwister.repository.get_resolution_report(domain) == {
+        u'www.\u0454xample.co': {
+            'ip': 'MX mx.example.co',
+            'tweak': 'Pretend',
+            'mx': ['mx.example.co'],
+        }
+    }
+
+    monkeypatch.setattr(
+        'dnstwister.tools.resolve',
+        lambda domain: resolver.Resolution(
+            resolver.NODATA, records={'aaaa': ['2001:db8::1']}
+        )
+    )
+    reprocess(domain)
+
+    assert dnstwister.repository.get_delta_report(domain)['updated'] == [
+        (u'www.\u0454xample.co', 'MX mx.example.co', '2001:db8::1')
+    ]